@@ -0,0 +1,118 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import security_monitor_v2 as monitor
+from audit_feed import follow_audit_logs
+from database import get_audit_logs, reset_user_credentials
+from executors import run_db
+
+# A single worker scores sessions in the order they complete and keeps the
+# model's CPU work off the event loop and the DB executor
+detector_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="anomaly-detector")
+
+# How often completed sessions waiting on a busy detector are checked for,
+# when no new logs arrive to wake the loop
+TICK_INTERVAL = 0.1
+
+# Seconds to wait before restarting after a crash, doubling per consecutive
+# crash up to the max; a run that lasted longer than the max resets it
+RESTART_BACKOFF_MIN = 1
+RESTART_BACKOFF_MAX = 60
+
+# Read by GET /monitor/status. state is "stopped", "starting", "running"
+# or "restarting"; last_error is the most recent crash, if any
+detector_status = {
+    'state': 'stopped',
+    'restarts': 0,
+    'last_error': None,
+    'last_error_at': None
+}
+
+
+def report_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Error scoring sessions: {future.exception()}")
+
+
+async def run_anomaly_detector():
+    """
+    In-process equivalent of security_monitor_v2.main: every committed audit
+    log is folded into its user's session, and completed sessions are scored
+    in batches as soon as the detector is free, with no HTTP login, polling
+    or second SQLite connection.
+
+    A crash is recorded in ``detector_status`` and the detector is restarted
+    with exponential backoff, so the monitor never stops silently.
+    """
+    backoff = RESTART_BACKOFF_MIN
+    # Shared with each run so a restart resumes after the last log it saw
+    progress = {'last_id': None}
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                await detect_anomalies(progress)
+                raise RuntimeError("audit log feed ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if time.monotonic() - started > RESTART_BACKOFF_MAX:
+                    backoff = RESTART_BACKOFF_MIN
+                print(f"Error in in-process anomaly detector, restarting in {backoff}s: {e}")
+                detector_status.update(
+                    state='restarting',
+                    last_error=str(e) or type(e).__name__,
+                    last_error_at=time.time()
+                )
+                await asyncio.sleep(backoff)
+                detector_status['restarts'] += 1
+                backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+    finally:
+        detector_status['state'] = 'stopped'
+
+
+async def detect_anomalies(progress):
+    """
+    One run of the detector, resuming after ``progress['last_id']`` and
+    keeping it up to date. Returns only if the audit log feed ends.
+    """
+    loop = asyncio.get_running_loop()
+    detector_status['state'] = 'starting'
+    if progress['last_id'] is None:
+        # Start from the newest log; anything committed while the model loads
+        # is replayed from the database before the live feed takes over
+        latest, _ = await run_db(get_audit_logs, limit=1)
+        progress['last_id'] = latest[0]["id"] if latest else 0
+
+    model, scaler = await loop.run_in_executor(detector_executor, monitor.load_or_train_model)
+    print("In-process anomaly detector started")
+    detector_status['state'] = 'running'
+
+    sessions = {}
+    ready = []     # completed (username, session) pairs not yet scored
+    scoring = None
+    async for log in follow_audit_logs(progress['last_id'], idle_timeout=TICK_INTERVAL):
+        if log is not None:
+            progress['last_id'] = log["id"]
+            session = sessions.get(log["username"])
+            if session is None:
+                session = sessions[log["username"]] = monitor.SessionAccumulator()
+            session.add(log)
+            if len(session) >= monitor.SESSION_SIZE:
+                ready.append((log["username"], session))
+                sessions[log["username"]] = monitor.SessionAccumulator()
+
+        # Everything that completed while the last batch was being scored
+        # goes into the next one, so one model call covers many users
+        if ready and (scoring is None or scoring.done()):
+            batch, ready = ready, []
+            scoring = loop.run_in_executor(
+                detector_executor,
+                partial(
+                    monitor.score_sessions, model, scaler, batch,
+                    reset_credentials=reset_user_credentials
+                )
+            )
+            scoring.add_done_callback(report_failure)
@@ -0,0 +1,56 @@
+import asyncio
+
+from database import audit_events, get_audit_logs
+from executors import run_db
+
+# Rows fetched per database round trip while replaying missed logs
+REPLAY_PAGE_SIZE = 1000
+
+
+async def follow_audit_logs(last_id=None, idle_timeout=None):
+    """
+    Async generator of committed audit logs, in id order.
+
+    Logs after ``last_id`` are replayed from the database first, then new
+    ones are pushed from ``audit_events`` as the audit writer commits them.
+    The subscription is taken before the replay so nothing committed in
+    between is missed; ids already yielded are skipped. If the subscriber
+    falls behind, or a pushed id is not the next one (rows committed by
+    another process, e.g. a second worker, are never pushed here), it
+    resubscribes and replays from the last id it yielded.
+
+    With ``idle_timeout`` set, None is yielded after that many seconds
+    without a log, so callers can send keep-alives.
+    """
+    while True:
+        subscription = audit_events.subscribe()
+        try:
+            if last_id is not None:
+                while True:
+                    logs, next_id = await run_db(
+                        get_audit_logs, limit=REPLAY_PAGE_SIZE, after_id=last_id
+                    )
+                    for log in logs:
+                        last_id = log["id"]
+                        yield log
+                    if next_id is None:
+                        break
+
+            while True:
+                try:
+                    log = await asyncio.wait_for(subscription.get(), idle_timeout)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if log is None:
+                    # Fell behind; resubscribe and catch up from the database
+                    break
+                if last_id is not None and log["id"] <= last_id:
+                    continue
+                if last_id is not None and log["id"] != last_id + 1:
+                    # Gap; the missing rows are in the database
+                    break
+                last_id = log["id"]
+                yield log
+        finally:
+            audit_events.unsubscribe(subscription)
@@ -29,10 +29,11 @@ def loginuser(username, password, totp_code):
     user = get_user_by_username(username)
     if not user or user['password_hash'] != hashed_password:
         return {"msg": "bad creds"}
-    from database import conn
-    cursor = conn.cursor()
-    cursor.execute("SELECT totp_secret FROM users WHERE username = ?", (username,))
-    row = cursor.fetchone()
+    from database import get_connection
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT totp_secret FROM users WHERE username = ?", (username,))
+        row = cursor.fetchone()
     if not row:
         return {"msg": "bad creds"}
     totp_secret = row[0]
@@ -0,0 +1,76 @@
+"""
+Per-request latency of audit logging: commit-per-row vs the batched writer.
+
+Each simulated request does one read (get_agents) and three audit writes,
+the most main.py does on one path. The commit-per-row side is the old
+log_activity: an INSERT and a commit on a pooled connection. The batched
+side is log_activity as it is now, handing the row to AuditLogWriter. Runs
+against a fresh database in a temporary directory, from 1 and 4 worker
+threads, and prints mean, p50 and p99 request latency and the writer's stats.
+
+    python bench_audit_writer.py [requests] [workers ...]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+AUDIT_WRITES_PER_REQUEST = 3
+
+
+def commit_per_row(database, username, role, action, stuff_accessed=None, session_duration=None):
+    """The old log_activity: one INSERT and one commit per call."""
+    with database.get_connection() as conn:
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        conn.execute(database.AUDIT_INSERT, (username, role, timestamp, session_duration, stuff_accessed, action))
+        conn.commit()
+
+
+def run(database, log, requests, workers):
+    def request(i):
+        start = time.perf_counter()
+        database.get_agents('admin')
+        for n in range(AUDIT_WRITES_PER_REQUEST):
+            log('admin', 'admin', 'bench', f"request {i} write {n}")
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(workers) as executor:
+        latencies = sorted(executor.map(request, range(requests)))
+    mean = sum(latencies) / len(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    return mean * 1e6, p50 * 1e6, p99 * 1e6
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = [int(w) for w in sys.argv[2:]] or [1, 4]
+
+    # database.py creates secure.db in the working directory on import
+    os.chdir(tempfile.mkdtemp())
+    sys.path.insert(0, BACKEND_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import database
+
+    print(f"{'workers':>7} {'path':>15} {'mean':>9} {'p50':>9} {'p99':>9}")
+    for count in workers:
+        for name, log in (
+            ("commit-per-row", lambda *args: commit_per_row(database, *args)),
+            ("batched", database.log_activity),
+        ):
+            mean, p50, p99 = run(database, log, requests, count)
+            print(f"{count:7d} {name:>15} {mean:6.0f} us {p50:6.0f} us {p99:6.0f} us")
+        database.audit_writer.flush()
+
+    database.audit_writer.stop()
+    print(f"writer: {database.audit_writer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of the auth dependency, with and without a second JWT decode.
+
+Times main.get_current_user for a valid, cached session token, alone and
+followed by the decode, expiry and claims check the /operations handlers
+used to repeat on every call. Runs against a fresh database in a temporary
+directory and prints the cost per call.
+
+    python bench_auth.py [calls]
+"""
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    # database.py creates secure.db in the working directory on import
+    os.chdir(tempfile.mkdtemp())
+    sys.path.insert(0, BACKEND_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import database
+        import main as app
+
+    token = app.jwt.encode(
+        {"username": "admin", "role": "admin", "exp": datetime.utcnow() + timedelta(hours=1)},
+        app.SECRET_KEY,
+        algorithm="HS256"
+    )
+    database.update_auth_token("admin", token)
+    authorization = f"Bearer {token}"
+
+    async def dependency_only():
+        await app.get_current_user(authorization)
+
+    async def with_second_decode():
+        current_user = await app.get_current_user(authorization)
+        # What get_operation_list / get_operation_details did before user-005
+        payload = app.jwt.decode(authorization.split(" ")[1], app.SECRET_KEY, algorithms=["HS256"])
+        if datetime.utcnow() > datetime.fromtimestamp(payload["exp"]):
+            raise RuntimeError("token expired")
+        if payload["username"] != current_user["username"] or payload["role"] != current_user["role"]:
+            raise RuntimeError("token mismatch")
+
+    async def timed(func):
+        await func()
+        start = time.perf_counter()
+        for _ in range(calls):
+            await func()
+        return (time.perf_counter() - start) / calls * 1e6
+
+    async def run():
+        return await timed(with_second_decode), await timed(dependency_only)
+
+    twice, once = asyncio.run(run())
+    print(f"decode twice: {twice:6.1f} us per call")
+    print(f"decode once:  {once:6.1f} us per call")
+
+    database.audit_writer.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Load benchmark for the database.py connection pool.
+
+Runs a mixed request (get_agents + get_locations + log_activity) from a
+growing number of worker threads against a fresh database in a temporary
+directory and prints requests per second for each worker count.
+
+    python bench_db_pool.py [requests] [workers ...]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    workers = [int(w) for w in sys.argv[2:]] or [1, 2, 4, 8]
+
+    # database.py creates secure.db in the working directory on import
+    os.chdir(tempfile.mkdtemp())
+    sys.path.insert(0, BACKEND_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import database
+
+    def request(i):
+        database.get_agents('admin')
+        database.get_locations('admin')
+        database.log_activity('admin', 'admin', 'bench', f"request {i}")
+
+    for count in workers:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(count) as executor:
+            list(executor.map(request, range(requests)))
+        elapsed = time.perf_counter() - start
+        print(f"{count:3d} workers: {requests / elapsed:8.0f} req/s")
+
+    database.audit_writer.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark for database.get_operation_by_id with 1, 10 and 100 agents.
+
+Seeds operations with the given numbers of involved agents into a fresh
+database in a temporary directory, then times get_operation_by_id against
+the old per-agent lookup (one query per agent plus one for the location)
+and checks both return the same agents. Times are per call, admin role.
+
+    python bench_operations.py [calls] [agents ...]
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def per_agent_lookup(database, operation_id, user_role):
+    """
+    The old N+1 shape: an access check query, the operation, one query per
+    involved agent and one for the location, then the view_operation audit entry.
+    """
+    with database.get_connection() as conn:
+        database.verify_operation_access('bench', user_role, operation_id)
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM operations WHERE operation_id = ?", (operation_id,))
+        op = cur.fetchone()
+        agent_details = []
+        for agent_id in json.loads(op[8]):
+            cur.execute("SELECT name, rank, clearance_level FROM agents WHERE agent_number = ?", (agent_id,))
+            agent = cur.fetchone()
+            if agent and (user_role == 'admin' or agent[2] in ['standard', user_role]):
+                agent_details.append({'id': agent_id, 'name': agent[0], 'rank': agent[1]})
+        if op[9]:
+            cur.execute("SELECT name, type, security_level FROM locations WHERE location_id = ?", (op[9],))
+            cur.fetchone()
+        database.log_audit('bench', "view_operation", f"Accessed operation {operation_id}")
+        return agent_details
+
+
+def timed(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    sizes = [int(n) for n in sys.argv[2:]] or [1, 10, 100]
+
+    # database.py creates secure.db in the working directory on import
+    os.chdir(tempfile.mkdtemp())
+    sys.path.insert(0, BACKEND_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import database
+
+    with database.get_connection() as conn:
+        cur = conn.cursor()
+        for i in range(max(sizes)):
+            cur.execute("""
+                INSERT INTO agents (agent_number, name, rank, status, clearance_level)
+                VALUES (?, ?, ?, 'Active', ?)
+            """, (f"B{i:03d}", f"Bench Agent {i}", "Field Agent", ['admin', 'file_manager', 'standard'][i % 3]))
+        for n in sizes:
+            cur.execute("""
+                INSERT INTO operations (operation_id, code_name, status, priority, start_date,
+                                        description, involved_agents, target_location, classified_level)
+                VALUES (?, ?, 'Active', 'High', '2025-10-01 08:00:00', 'bench', ?, 'LOC002', 'standard')
+            """, (f"BENCH{n}", f"Bench {n}", json.dumps([f"B{i:03d}" for i in range(n)])))
+        database.sync_operation_agents(cur)
+        conn.commit()
+
+    print(f"{'agents':>6} {'per-agent':>10} {'batched':>10}")
+    for n in sizes:
+        operation_id = f"BENCH{n}"
+        for role in ('admin', 'file_manager'):
+            expected = per_agent_lookup(database, operation_id, role)
+            actual = database.get_operation_by_id(operation_id, 'bench', role)['involved_agents']
+            assert actual == expected, f"{operation_id} differs for {role}"
+
+        old = timed(lambda: per_agent_lookup(database, operation_id, 'admin'), calls)
+        new = timed(lambda: database.get_operation_by_id(operation_id, 'bench', 'admin'), calls)
+        print(f"{n:6d} {old:8.0f} us {new:7.0f} us")
+
+    database.audit_writer.stop()
+
+
+if __name__ == "__main__":
+    main()
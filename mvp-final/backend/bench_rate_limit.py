@@ -0,0 +1,93 @@
+"""
+Benchmark of the rate limiter against the list scan it replaced.
+
+Replays the same request stream through both: one random client out of
+10k distinct IPs per request (plus a single hot IP run), with a /login
+request every tenth request and the production budgets from main.py.
+Prints the cost per request and how many per-IP entries each keeps.
+
+    python bench_rate_limit.py [requests] [distinct_ips]
+"""
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from rate_limit import SlidingWindowLimiter
+
+RATE_LIMIT_DURATION = timedelta(minutes=15)
+MAX_REQUESTS = 100
+MAX_FAILED_LOGIN = 50
+
+
+class ListScanLimiter:
+    """The pre-user-006 rate_limit_middleware logic, minus the HTTP parts."""
+
+    def __init__(self):
+        self.store = defaultdict(list)
+
+    def hit(self, client_ip, path):
+        now = datetime.utcnow()
+        self.store[client_ip] = [
+            hit for hit in self.store[client_ip]
+            if now - hit[0] < RATE_LIMIT_DURATION
+        ]
+        if len(self.store[client_ip]) >= MAX_REQUESTS:
+            return False
+        if path == "/login":
+            failed_attempts = sum(
+                1 for hit in self.store[client_ip]
+                if hit[1] == "/login" and now - hit[0] < RATE_LIMIT_DURATION
+            )
+            if failed_attempts >= MAX_FAILED_LOGIN:
+                return False
+        self.store[client_ip].append((now, path))
+        return True
+
+
+class SlidingWindow:
+    """The limiter pair main.py uses now."""
+
+    def __init__(self):
+        window = RATE_LIMIT_DURATION.total_seconds()
+        self.requests = SlidingWindowLimiter(MAX_REQUESTS, window, scope="requests")
+        self.logins = SlidingWindowLimiter(MAX_FAILED_LOGIN, window, scope="login")
+
+    def hit(self, client_ip, path):
+        if not self.requests.hit(client_ip):
+            return False
+        if path == "/login" and not self.logins.hit(client_ip):
+            return False
+        return True
+
+
+def run(limiter, stream):
+    start = time.perf_counter()
+    for client_ip, path in stream:
+        limiter.hit(client_ip, path)
+    return (time.perf_counter() - start) / len(stream) * 1e6
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    distinct_ips = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    rng = random.Random(0)
+    paths = ["/login" if i % 10 == 0 else "/files" for i in range(requests)]
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(distinct_ips)]
+
+    streams = {
+        f"{distinct_ips} distinct IPs": [(rng.choice(ips), path) for path in paths],
+        "1 hot IP": [("10.0.0.1", path) for path in paths],
+    }
+    for name, stream in streams.items():
+        old, new = ListScanLimiter(), SlidingWindow()
+        old_us, new_us = run(old, stream), run(new, stream)
+        print(f"{name:>20}: list scan {old_us:6.2f} us/request, "
+              f"sliding window {new_us:6.2f} us/request "
+              f"({sum(map(len, old.store.values()))} stored hits vs "
+              f"{len(new.requests.backend) + len(new.logins.backend)} counters)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark for the security_monitor_v2 session features.
+
+Times the original per-session DataFrame implementation (the reference in
+test_session_features.py) against extract_batch_features and against
+feeding every event through a SessionAccumulator, for many concurrent
+sessions of a fixed length, and checks all three agree.
+
+    python bench_session_features.py [sessions] [events]
+
+The reference takes several milliseconds per session, so it is timed on
+a sample of REFERENCE_SAMPLE sessions and scaled up.
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+REFERENCE_SAMPLE = 500
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    events = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    sys.path.insert(0, BACKEND_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import security_monitor_v2 as monitor
+        from test_session_features import assert_features_match, random_sessions, reference_session_features
+
+    sessions = random_sessions(count, events=(events, events))
+    sample = sessions[:REFERENCE_SAMPLE]
+
+    start = time.perf_counter()
+    expected = [reference_session_features(session) for session in sample]
+    reference = (time.perf_counter() - start) * len(sessions) / len(sample)
+
+    start = time.perf_counter()
+    batch = monitor.extract_batch_features(monitor.sessions_to_frame(sessions))
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    accumulators = []
+    for session in sessions:
+        accumulator = monitor.SessionAccumulator()
+        for event in session:
+            accumulator.add(event)
+        accumulators.append(accumulator.features())
+    accumulated = time.perf_counter() - start
+
+    for i, features in enumerate(expected):
+        assert_features_match(batch.loc[i], features)
+        assert_features_match(accumulators[i], features)
+
+    print(f"{count} sessions x {events} events")
+    print(f"  per-session reference: {reference:8.3f} s (from {len(sample)} sessions)")
+    print(f"  extract_batch_features: {batched:7.3f} s")
+    print(f"  SessionAccumulator:     {accumulated:7.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# test_logs.py is a manual client script for a running server and test.txt a
+# sample upload; neither is a test
+collect_ignore = ["test_logs.py", "test.txt"]
+
+# database.py opens secure.db (and the file store) relative to the working
+# directory as soon as it is imported, so every test session gets a fresh
+# copy in a temporary directory instead of touching the checked-in one
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(tempfile.mkdtemp(prefix="threat-neutralizer-tests-"))
+
+
+@pytest.fixture
+def client_for(monkeypatch):
+    """client_for(username, role): an API client holding a session token, without the TOTP login."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        import jwt
+        from fastapi.testclient import TestClient
+        import database
+        import main
+        from rate_limit import MemoryRateLimitBackend
+
+    # Each test gets its own request budget so the suite never trips the limiter
+    monkeypatch.setattr(main.request_limiter, 'backend', MemoryRateLimitBackend())
+
+    def make(username, role):
+        token = jwt.encode(
+            {'username': username, 'role': role, 'exp': datetime.utcnow() + timedelta(hours=1)},
+            main.SECRET_KEY,
+            algorithm='HS256'
+        )
+        database.update_auth_token(username, token)
+        # Not used as a context manager: shutdown would stop the shared executors
+        client = TestClient(main.app)
+        client.headers['Authorization'] = f"Bearer {token}"
+        return client
+
+    return make
@@ -0,0 +1,33 @@
+import os
+import tempfile
+import uuid
+
+# Replaced by any process that changes a user's auth token. API processes
+# compare it on every session cache lookup and drop their cached sessions
+# when it has changed, so a token revoked elsewhere (e.g. by the security
+# monitor) stops working on the next request.
+STAMP_PATH = "secure.db.credentials"
+
+
+def read_stamp(path=STAMP_PATH):
+    """Identity of the current stamp file, or None if there isn't one."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def touch_stamp(path=STAMP_PATH):
+    """Record that credentials changed. Always yields a new read_stamp()."""
+    # A new file renamed over the old one gets a fresh inode, so two changes
+    # within the filesystem's timestamp granularity still differ
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".credentials-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -1,6 +1,22 @@
-import sqlite3, uuid, time, json
+import sqlite3, uuid, time
+import asyncio
+import atexit
+import hashlib
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
+import credentials_stamp
+import file_store
+from event_bus import EventBus
+
+DB_PATH = "secure.db"
+POOL_SIZE = 8        # Max open SQLite connections
+POOL_TIMEOUT = 30    # Seconds to wait for a free connection / a lock
+
 def calculate_threat_level(priority):
     priority_levels = {
         'High': 'Critical',
@@ -10,244 +26,698 @@ def calculate_threat_level(priority):
     return priority_levels.get(priority, 'Unknown')
 
 
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections running in WAL mode.
+
+    A connection is checked out for the duration of a ``with`` block and
+    returned afterwards, so concurrent requests never share a cursor. A thread
+    that already holds a connection gets the same one back, which lets helpers
+    call other helpers without taking a second slot from the pool.
+    """
+
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=self.timeout)
+        # WAL lets readers run alongside the single writer instead of blocking on it
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+
+    def _checkin(self, conn):
+        # Never hand the next caller a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._checkout()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._checkin(conn)
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+pool = ConnectionPool(DB_PATH)
+
+def get_connection():
+    """Check a connection out of the shared pool. Use as a context manager."""
+    return pool.connection()
+
+
+def _create_base_tables(cursor):
+    """v1: the original application tables."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS regtokentable (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        regtoken TEXT UNIQUE NOT NULL,
+        role TEXT NOT NULL
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        role TEXT NOT NULL,
+        totp_secret TEXT NOT NULL,
+        current_auth_token TEXT,
+        otp TEXT,
+        otp_expiry TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_login TIMESTAMP,
+        failed_login_attempts INTEGER DEFAULT 0,
+        account_locked BOOLEAN DEFAULT 0,
+        lock_until TIMESTAMP
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS audit_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        role TEXT NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        session_duration INTEGER,
+        stuff_accessed TEXT,
+        action TEXT NOT NULL
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS classified_files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        file_id TEXT UNIQUE NOT NULL,
+        filename TEXT NOT NULL,
+        file_data BLOB,
+        access_level TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS agents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        agent_number TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        rank TEXT NOT NULL,
+        status TEXT NOT NULL,
+        clearance_level TEXT NOT NULL,
+        last_mission TEXT,
+        photo_url TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS locations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        location_id TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        type TEXT NOT NULL,
+        access_level TEXT NOT NULL,
+        geolocation TEXT NOT NULL,
+        contents TEXT NOT NULL,
+        status TEXT NOT NULL,
+        last_accessed TIMESTAMP,
+        security_level TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS operations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        operation_id TEXT UNIQUE NOT NULL,
+        code_name TEXT NOT NULL,
+        status TEXT NOT NULL,
+        priority TEXT NOT NULL,
+        start_date TIMESTAMP NOT NULL,
+        end_date TIMESTAMP,
+        description TEXT NOT NULL,
+        involved_agents TEXT NOT NULL,
+        target_location TEXT,
+        classified_level TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
 
-conn = sqlite3.connect("secure.db", check_same_thread=False)
-cursor=conn.cursor()
-
-# Drop existing tables to recreate with new schema
-cursor.execute("DROP TABLE IF EXISTS classified_files")
-cursor.execute("DROP TABLE IF EXISTS regtokentable")
-cursor.execute("DROP TABLE IF EXISTS users")
-cursor.execute("DROP TABLE IF EXISTS audit_logs")
-
-cursor.execute("""
-CREATE TABLE regtokentable (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    regtoken TEXT UNIQUE NOT NULL,
-    role TEXT NOT NULL
-)
-""")
-
-cursor.execute("""
-CREATE TABLE users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT UNIQUE NOT NULL,
-    password_hash TEXT NOT NULL,
-    role TEXT NOT NULL,
-    totp_secret TEXT NOT NULL,
-    current_auth_token TEXT,
-    otp TEXT,
-    otp_expiry TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    last_login TIMESTAMP,
-    failed_login_attempts INTEGER DEFAULT 0,
-    account_locked BOOLEAN DEFAULT 0,
-    lock_until TIMESTAMP
-)
-""")
-
-cursor.execute("""
-CREATE TABLE audit_logs (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT NOT NULL,
-    role TEXT NOT NULL,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    session_duration INTEGER,
-    stuff_accessed TEXT,
-    action TEXT NOT NULL
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS classified_files (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    file_id TEXT UNIQUE NOT NULL,
-    filename TEXT NOT NULL,
-    file_data BLOB,
-    access_level TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS agents (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    agent_number TEXT UNIQUE NOT NULL,
-    name TEXT NOT NULL,
-    rank TEXT NOT NULL,
-    status TEXT NOT NULL,
-    clearance_level TEXT NOT NULL,
-    last_mission TEXT,
-    photo_url TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS locations (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    location_id TEXT UNIQUE NOT NULL,
-    name TEXT NOT NULL,
-    type TEXT NOT NULL,
-    access_level TEXT NOT NULL,
-    geolocation TEXT NOT NULL,
-    contents TEXT NOT NULL,
-    status TEXT NOT NULL,
-    last_accessed TIMESTAMP,
-    security_level TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS operations (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    operation_id TEXT UNIQUE NOT NULL,
-    code_name TEXT NOT NULL,
-    status TEXT NOT NULL,
-    priority TEXT NOT NULL,
-    start_date TIMESTAMP NOT NULL,
-    end_date TIMESTAMP,
-    description TEXT NOT NULL,
-    involved_agents TEXT NOT NULL,
-    target_location TEXT,
-    classified_level TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS audit_log (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id TEXT NOT NULL,
-    action TEXT NOT NULL,
-    details TEXT NOT NULL,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-conn.commit()
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS audit_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        action TEXT NOT NULL,
+        details TEXT NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+def _add_lookup_indexes(cursor):
+    """v2: indexes for the per-request token lookup and the audit log filters."""
+    # Covers get_user_by_token without touching the table rows
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_users_auth_token
+    ON users (current_auth_token, id, username, role)
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_timestamp ON audit_logs (timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_username_timestamp ON audit_logs (username, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_operations_classified_level ON operations (classified_level)")
+
+def _add_file_content_hash(cursor):
+    """v3: classified file bodies move to the content-addressed file_store."""
+    cursor.execute("ALTER TABLE classified_files ADD COLUMN content_hash TEXT")
+    cursor.execute("ALTER TABLE classified_files ADD COLUMN size INTEGER")
+    cursor.execute("ALTER TABLE classified_files ADD COLUMN modified_at TIMESTAMP")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_classified_files_content_hash ON classified_files (content_hash)")
+
+def sync_operation_agents(cursor):
+    """Copy involved_agents JSON into operation_agents for operations not yet linked."""
+    cursor.execute("""
+        INSERT OR IGNORE INTO operation_agents (operation_id, agent_number, position)
+        SELECT o.operation_id, j.value, j.key
+        FROM operations o, json_each(o.involved_agents) j
+        WHERE NOT EXISTS (
+            SELECT 1 FROM operation_agents oa WHERE oa.operation_id = o.operation_id
+        )
+    """)
+
+def _add_operation_agents(cursor):
+    """v4: operation membership moves out of the involved_agents JSON into a join table."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS operation_agents (
+            operation_id TEXT NOT NULL,
+            agent_number TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (operation_id, agent_number)
+        ) WITHOUT ROWID
+    """)
+    # The primary key serves operation -> agents; this one serves agent -> operations
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_operation_agents_agent ON operation_agents (agent_number, operation_id)")
+    sync_operation_agents(cursor)
+
+def _add_list_indexes(cursor):
+    """v5: (visibility level, key) indexes so role-filtered list pages come back in key order."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_agents_clearance_number ON agents (clearance_level, agent_number)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_locations_security_id ON locations (security_level, location_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_classified_files_access_id ON classified_files (access_level, file_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_operations_classified_id ON operations (classified_level, operation_id)")
+
+def _add_operation_agents_position(cursor):
+    """v6: an operation's agents in position order, without a sort per lookup."""
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_operation_agents_position
+        ON operation_agents (operation_id, position, agent_number)
+    """)
+
+# Schema migrations in order; a migration's version is its position in the list
+# (starting at 1). Only ever append new entries - never edit or reorder old ones.
+MIGRATIONS = [
+    _create_base_tables,
+    _add_lookup_indexes,
+    _add_file_content_hash,
+    _add_operation_agents,
+    _add_list_indexes,
+    _add_operation_agents_position,
+]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate():
+    """Apply any pending schema migrations, each in its own transaction."""
+    with get_connection() as conn:
+        version = get_schema_version(conn)
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            try:
+                conn.execute("BEGIN")
+                migration(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                print(f"Schema migration {number} ({migration.__name__}) failed")
+                raise
+
+migrate()
 
 
 
 def get_user_by_username(username):
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT id, username, password_hash, role FROM users WHERE username = ?", (username,))
-        user = cur.fetchone()
-        if user:
+    with get_connection() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT id, username, password_hash, role FROM users WHERE username = ?", (username,))
+            user = cur.fetchone()
+            if user:
+                return {
+                    'id': user[0],
+                    'username': user[1],
+                    'password_hash': user[2],
+                    'role': user[3]
+                }
+            return None
+        except Exception as e:
+            print(f"Database error: {e}")
+            return None
+
+SESSION_CACHE_SIZE = 1024   # Max authenticated tokens kept in memory
+SESSION_CACHE_TTL = 30      # Seconds before a cached token is re-checked against the DB
+
+class SessionCache:
+    """
+    TTL + LRU cache of resolved users for get_user_by_token, keyed by the
+    SHA-256 of the token so raw tokens are never held as dict keys.
+
+    Entries are dropped when update_auth_token or reset_user_credentials change
+    a user's token. Token changes made by any other process (other API
+    workers, the security monitor) touch the credentials stamp file, and every
+    lookup drops all entries once the stamp has changed.
+
+    A user read from the DB is only cached if nothing was invalidated since
+    ``generation()`` was taken before the read, so a lookup racing with a
+    reset cannot put the revoked token back.
+    """
+
+    def __init__(self, max_size=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, user)
+        self._lock = threading.Lock()
+        self._stamp = credentials_stamp.read_stamp()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _check_stamp(self):
+        # Called with self._lock held
+        stamp = credentials_stamp.read_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._entries.clear()
+            self._generation += 1
+
+    def generation(self):
+        with self._lock:
+            self._check_stamp()
+            return self._generation
+
+    def get(self, token):
+        key = self._key(token)
+        now = time.monotonic()
+        with self._lock:
+            self._check_stamp()
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, token, user, generation=None):
+        key = self._key(token)
+        with self._lock:
+            self._check_stamp()
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, dict(user))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, username):
+        with self._lock:
+            stale = [key for key, (_, user) in self._entries.items() if user['username'] == username]
+            for key in stale:
+                del self._entries[key]
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
             return {
-                'id': user[0],
-                'username': user[1],
-                'password_hash': user[2],
-                'role': user[3]
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses
             }
-        return None
-    except Exception as e:
-        print(f"Database error: {e}")
-        return None
+
+
+session_cache = SessionCache()
 
 def get_user_by_token(token):
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT id, username, role FROM users WHERE current_auth_token = ?", (token,))
-        user = cur.fetchone()
-        if user:
-            return {
-                'id': user[0],
-                'username': user[1],
-                'role': user[2]
-            }
-        return None
-    except Exception as e:
-        print(f"Database error: {e}")
+    user = session_cache.get(token)
+    if user:
+        return user
+    return load_user_by_token(token)
+
+def load_user_by_token(token):
+    """The user for ``token`` from the database, cached on success. Skips the cache lookup."""
+    generation = session_cache.generation()
+    with get_connection() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT id, username, role FROM users WHERE current_auth_token = ?", (token,))
+            user = cur.fetchone()
+            if user:
+                user = {
+                    'id': user[0],
+                    'username': user[1],
+                    'role': user[2]
+                }
+                session_cache.put(token, user, generation)
+                return user
+            return None
+        except Exception as e:
+            print(f"Database error: {e}")
+            return None
+
+MAX_PAGE_SIZE = 500
+
+def page_size(limit):
+    """
+    Clamp a requested page size to 1..MAX_PAGE_SIZE. No limit stays None: the
+    frontend does not follow next_after, so an unpaged request gets every row.
+    """
+    if limit is None:
         return None
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
 
-def get_classified_files(role):
-    try:
+def fetch_page(cur, table, key, columns, default_fields, fields=None,
+               conditions=(), params=(), limit=None, after=None):
+    """
+    Fetch one keyset page of ``table`` in order of its unique ``key`` column.
+
+    ``columns`` maps each selectable field name to its SQL expression and
+    ``fields`` picks which of them to return (``default_fields`` if None); the
+    key is always included. ``after`` is the key of the last row of the
+    previous page. Returns (rows as dicts, cursor for the next page or None).
+    Raises ValueError for an unknown field name.
+    """
+    names = list(fields) if fields else list(default_fields)
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    key_name = next(name for name, expr in columns.items() if expr == key)
+    names = [key_name] + [name for name in dict.fromkeys(names) if name != key_name]
+
+    conditions, params = list(conditions), list(params)
+    if after is not None:
+        conditions.append(f"{key} > ?")
+        params.append(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    limit = page_size(limit)
+    if limit is not None:
+        # One extra row tells us whether there is a next page
+        params.append(limit + 1)
+
+    cur.execute(f"""
+        SELECT {', '.join(columns[name] for name in names)}
+        FROM {table}
+        {where}
+        ORDER BY {key}
+        {"LIMIT ?" if limit is not None else ""}
+    """, params)
+    rows = cur.fetchall()
+    if limit is None:
+        return [dict(zip(names, row)) for row in rows], None
+    next_after = rows[limit - 1][0] if len(rows) > limit else None
+    return [dict(zip(names, row)) for row in rows[:limit]], next_after
+
+FILE_LIST_COLUMNS = {
+    'file_id': 'file_id',
+    'filename': 'filename',
+    'access_level': 'access_level',
+    'size': 'size',
+    'modified_at': 'modified_at',
+}
+
+def get_classified_files(role, limit=None, after=None, fields=None):
+    with get_connection() as conn:
+        try:
+            cur = conn.cursor()
+            if role == 'admin':
+                # Admin can see all files
+                conditions = []
+            elif role == 'file_manager':
+                # File manager can see files marked for file_manager access and below
+                conditions = ["access_level = 'file_manager'"]
+            else:
+                # Other roles can't see any files
+                return [], None
+                
+            return fetch_page(
+                cur, "classified_files", "file_id", FILE_LIST_COLUMNS, ('file_id', 'filename'),
+                fields=fields, conditions=conditions, limit=limit, after=after
+            )
+        except ValueError:
+            raise
+        except Exception as e:
+            print(f"Database error: {e}")
+            return [], None
+
+FILE_CHUNK_SIZE = 64 * 1024  # Bytes read from a file BLOB per streamed chunk
+
+def get_classified_file_info(file_id):
+    """
+    Return a file's metadata (row_id, filename, access_level, size,
+    content_hash, modified_at), or None. The contents are not loaded: stream
+    them from file_store when content_hash is set, else with
+    read_classified_file_chunk.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, filename, access_level, COALESCE(size, length(file_data), 0),
+                   content_hash, COALESCE(modified_at, created_at)
+            FROM classified_files 
+            WHERE file_id = ?
+        """, (file_id,))
+        file = cur.fetchone()
+        if file is None:
+            return None
+        return {
+            'row_id': file[0],
+            'filename': file[1],
+            'access_level': file[2],
+            'size': file[3],
+            'content_hash': file[4],
+            'modified_at': file[5]
+        }
+
+def read_classified_file_chunk(row_id, offset, size):
+    """Read up to ``size`` bytes of a file's contents starting at ``offset``."""
+    with get_connection() as conn:
+        if hasattr(conn, 'blobopen'):
+            # Incremental BLOB I/O (Python 3.11+) reads just these pages
+            with conn.blobopen('classified_files', 'file_data', row_id, readonly=True) as blob:
+                blob.seek(offset)
+                return blob.read(size)
         cur = conn.cursor()
-        if role == 'admin':
-            # Admin can see all files
-            cur.execute("SELECT file_id, filename FROM classified_files")
-        elif role == 'file_manager':
-            # File manager can see files marked for file_manager access and below
+        cur.execute("SELECT substr(file_data, ?, ?) FROM classified_files WHERE id = ?", (offset + 1, size, row_id))
+        chunk = cur.fetchone()
+        return chunk[0] if chunk and chunk[0] else b''
+
+def store_classified_file(file_id, filename, content, access_level):
+    """
+    Save a file's contents (bytes, or an iterable of byte chunks) to the
+    content-addressed store and point the classified_files row at it.
+    Identical contents are stored on disk only once.
+    """
+    chunks = [content] if isinstance(content, (bytes, bytearray)) else content
+    content_hash, size = file_store.put_chunks(chunks)
+    with get_connection() as conn:
+        try:
+            cur = conn.cursor()
             cur.execute("""
-                SELECT file_id, filename
-                FROM classified_files 
-                WHERE access_level = 'file_manager'
-            """)
-        else:
-            # Other roles can't see any files
-            return []
-            
-        files = cur.fetchall()
-        return [{'file_id': file[0], 'filename': file[1]} for file in files]
-    except Exception as e:
-        print(f"Database error: {e}")
-        return []
+                INSERT INTO classified_files
+                (file_id, filename, file_data, access_level, content_hash, size, modified_at)
+                VALUES (?, ?, NULL, ?, ?, ?, datetime('now'))
+                ON CONFLICT (file_id) DO UPDATE SET
+                    filename = excluded.filename,
+                    file_data = NULL,
+                    access_level = excluded.access_level,
+                    content_hash = excluded.content_hash,
+                    size = excluded.size,
+                    modified_at = excluded.modified_at
+            """, (file_id, filename, access_level, content_hash, size))
+            conn.commit()
+            return content_hash
+        except Exception as e:
+            print(f"Error storing file: {e}")
+            return None
+
+def move_blobs_to_store():
+    """Move file BLOBs still held in classified_files into the file store."""
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT id, length(file_data) FROM classified_files
+            WHERE content_hash IS NULL AND file_data IS NOT NULL
+        """).fetchall()
+
+    for row_id, size in rows:
+        try:
+            chunks = (
+                read_classified_file_chunk(row_id, offset, FILE_CHUNK_SIZE)
+                for offset in range(0, size, FILE_CHUNK_SIZE)
+            )
+            content_hash, size = file_store.put_chunks(chunks)
+            with get_connection() as conn:
+                conn.execute("""
+                    UPDATE classified_files
+                    SET content_hash = ?, size = ?, file_data = NULL,
+                        modified_at = COALESCE(modified_at, created_at)
+                    WHERE id = ?
+                """, (content_hash, size, row_id))
+                conn.commit()
+        except Exception as e:
+            print(f"Error moving file {row_id} to the file store: {e}")
 
 def update_auth_token(username, token):
-    try:
-        cur = conn.cursor()
-        cur.execute("UPDATE users SET current_auth_token = ? WHERE username = ?", (token, username))
-        conn.commit()
-        return True
-    except Exception as e:
-        print(f"Database error: {e}")
-        return False
+    with get_connection() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute("UPDATE users SET current_auth_token = ? WHERE username = ?", (token, username))
+            conn.commit()
+            session_cache.invalidate_user(username)
+            credentials_stamp.touch_stamp()
+            return True
+        except Exception as e:
+            print(f"Database error: {e}")
+            return False
+
+def reset_user_credentials(username):
+    """Reset user's credentials and invalidate their token"""
+    with get_connection() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE users 
+                SET password_hash = 'password',
+                    current_auth_token = NULL,
+                    failed_login_attempts = 0,
+                    account_locked = 0,
+                    lock_until = NULL
+                WHERE username = ?
+            """, (username,))
+            conn.commit()
+            session_cache.invalidate_user(username)
+            credentials_stamp.touch_stamp()
+            return True
+        except Exception as e:
+            print(f"Error resetting credentials: {e}")
+            return False
 
 def verify_auth_token(token, username, role):
     """Verify auth token with additional security checks."""
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT current_auth_token, account_locked, lock_until, last_login 
-            FROM users 
-            WHERE username = ? AND role = ?
-        """, (username, role))
-        result = cur.fetchone()
-        
-        if not result:
-            return False
+    with get_connection() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT current_auth_token, account_locked, lock_until, last_login 
+                FROM users 
+                WHERE username = ? AND role = ?
+            """, (username, role))
+            result = cur.fetchone()
             
-        stored_token, account_locked, lock_until, last_login = result
-        
-        # Check for account lockout
-        if account_locked:
-            if lock_until and datetime.fromisoformat(lock_until) > datetime.utcnow():
+            if not result:
                 return False
-            else:
-                # If lock period has expired, unlock the account
-                cur.execute("""
-                    UPDATE users 
-                    SET account_locked = 0, lock_until = NULL 
-                    WHERE username = ?
-                """, (username,))
-                conn.commit()
-        
-        # Check if token matches
-        if stored_token != token:
-            return False
+                
+            stored_token, account_locked, lock_until, last_login = result
             
-        # Check token expiry (if last_login was more than 1 hour ago)
-        if last_login:
-            login_time = datetime.fromisoformat(last_login)
-            if datetime.utcnow() - login_time > timedelta(hours=1):
+            # Check for account lockout
+            if account_locked:
+                if lock_until and datetime.fromisoformat(lock_until) > datetime.utcnow():
+                    return False
+                else:
+                    # If lock period has expired, unlock the account
+                    cur.execute("""
+                        UPDATE users 
+                        SET account_locked = 0, lock_until = NULL 
+                        WHERE username = ?
+                    """, (username,))
+                    conn.commit()
+            
+            # Check if token matches
+            if stored_token != token:
                 return False
                 
-        # Token is valid, update last activity
-        cur.execute("""
-            UPDATE users 
-            SET last_login = ?
-            WHERE username = ?
-        """, (datetime.utcnow().isoformat(), username))
-        conn.commit()
-        
-        return True
-        
-    except Exception as e:
-        print(f"Auth token verification error: {e}")
-        return False
+            # Check token expiry (if last_login was more than 1 hour ago)
+            if last_login:
+                login_time = datetime.fromisoformat(last_login)
+                if datetime.utcnow() - login_time > timedelta(hours=1):
+                    return False
+                    
+            # Token is valid, update last activity
+            cur.execute("""
+                UPDATE users 
+                SET last_login = ?
+                WHERE username = ?
+            """, (datetime.utcnow().isoformat(), username))
+            conn.commit()
+            
+            return True
+            
+        except Exception as e:
+            print(f"Auth token verification error: {e}")
+            return False
 
 # Password hashing
 from passlib.hash import pbkdf2_sha256
@@ -259,489 +729,752 @@ def verify_password(password, password_hash):
     return pbkdf2_sha256.verify(password, password_hash)
 
 def create_user(username, password, role, totp_secret):
-    try:
-        cursor = conn.cursor()
-        password_hash = hash_password(password)
-        cursor.execute("""
-            INSERT INTO users (username, password_hash, role, totp_secret)
-            VALUES (?, ?, ?, ?)
-        """, (username, password_hash, role, totp_secret))
-        conn.commit()
-        return True
-    except Exception as e:
-        print(f"Error creating user: {e}")
-        return False
+    with get_connection() as conn:
+        try:
+            cursor = conn.cursor()
+            password_hash = hash_password(password)
+            cursor.execute("""
+                INSERT INTO users (username, password_hash, role, totp_secret)
+                VALUES (?, ?, ?, ?)
+            """, (username, password_hash, role, totp_secret))
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error creating user: {e}")
+            return False
 
-def authenticate_user(username, password):
-    """Authenticate a user with enhanced security measures."""
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, username, password_hash, role, totp_secret, 
-                   failed_login_attempts, account_locked, lock_until
-            FROM users 
-            WHERE username = ?
-        """, (username,))
-        user = cursor.fetchone()
-        
-        if not user:
-            # Don't give away that the username doesn't exist
-            return None
-            
-        # Check if account is locked
-        if user[6]:  # account_locked
-            if user[7] and datetime.fromisoformat(user[7]) > datetime.utcnow():
-                return None
-            else:
-                # If lock period has expired, unlock the account
-                cursor.execute("""
-                    UPDATE users 
-                    SET account_locked = 0, lock_until = NULL, failed_login_attempts = 0 
-                    WHERE username = ?
-                """, (username,))
-                conn.commit()
-        
-        # Verify password
-        if verify_password(password, user[2]):
-            # Reset failed attempts on successful login
+def get_login_candidate(username):
+    """
+    First half of authenticate_user: load the credentials to check a login
+    against. Returns None if the user doesn't exist or is still locked out.
+    """
+    with get_connection() as conn:
+        try:
+            cursor = conn.cursor()
             cursor.execute("""
-                UPDATE users 
-                SET failed_login_attempts = 0,
-                    last_login = ?,
-                    account_locked = 0,
-                    lock_until = NULL
+                SELECT id, username, password_hash, role, totp_secret, 
+                       failed_login_attempts, account_locked, lock_until
+                FROM users 
                 WHERE username = ?
-            """, (datetime.utcnow().isoformat(), username))
-            conn.commit()
+            """, (username,))
+            user = cursor.fetchone()
             
+            if not user:
+                # Don't give away that the username doesn't exist
+                return None
+                
+            # Check if account is locked
+            if user[6]:  # account_locked
+                if user[7] and datetime.fromisoformat(user[7]) > datetime.utcnow():
+                    return None
+                else:
+                    # If lock period has expired, unlock the account
+                    cursor.execute("""
+                        UPDATE users 
+                        SET account_locked = 0, lock_until = NULL, failed_login_attempts = 0 
+                        WHERE username = ?
+                    """, (username,))
+                    conn.commit()
+
             return {
                 'id': user[0],
                 'username': user[1],
+                'password_hash': user[2],
                 'role': user[3],
-                'totp_secret': user[4]
+                'totp_secret': user[4],
+                'failed_login_attempts': user[5]
             }
-        else:
-            # Increment failed attempts
-            new_attempts = user[5] + 1
-            lock_account = new_attempts >= 5
-            lock_until = (datetime.utcnow() + timedelta(minutes=30)).isoformat() if lock_account else None
-            
-            cursor.execute("""
-                UPDATE users 
-                SET failed_login_attempts = ?,
-                    account_locked = ?,
-                    lock_until = ?
-                WHERE username = ?
-            """, (new_attempts, lock_account, lock_until, username))
-            conn.commit()
-            
+        except Exception as e:
+            print(f"Authentication error: {e}")
             return None
-            
+
+def record_login_attempt(candidate, password_ok):
+    """
+    Second half of authenticate_user: reset or bump the failed-attempt counter
+    for a candidate from get_login_candidate. Returns the user on success.
+    """
+    username = candidate['username']
+    with get_connection() as conn:
+        try:
+            cursor = conn.cursor()
+            if password_ok:
+                # Reset failed attempts on successful login
+                cursor.execute("""
+                    UPDATE users 
+                    SET failed_login_attempts = 0,
+                        last_login = ?,
+                        account_locked = 0,
+                        lock_until = NULL
+                    WHERE username = ?
+                """, (datetime.utcnow().isoformat(), username))
+                conn.commit()
+                
+                return {
+                    'id': candidate['id'],
+                    'username': username,
+                    'role': candidate['role'],
+                    'totp_secret': candidate['totp_secret']
+                }
+            else:
+                # Increment failed attempts
+                new_attempts = candidate['failed_login_attempts'] + 1
+                lock_account = new_attempts >= 5
+                lock_until = (datetime.utcnow() + timedelta(minutes=30)).isoformat() if lock_account else None
+                
+                cursor.execute("""
+                    UPDATE users 
+                    SET failed_login_attempts = ?,
+                        account_locked = ?,
+                        lock_until = ?
+                    WHERE username = ?
+                """, (new_attempts, lock_account, lock_until, username))
+                conn.commit()
+                
+                return None
+                
+        except Exception as e:
+            print(f"Authentication error: {e}")
+            return None
+
+def authenticate_user(username, password):
+    """
+    Authenticate a user with enhanced security measures.
+
+    The password hash is checked between the two database steps so no pooled
+    connection is held while pbkdf2 runs.
+    """
+    candidate = get_login_candidate(username)
+    if not candidate:
+        return None
+    try:
+        password_ok = verify_password(password, candidate['password_hash'])
     except Exception as e:
         print(f"Authentication error: {e}")
         return None
+    return record_login_attempt(candidate, password_ok)
 
 # Initialize some test data
 def init_test_data():
-    try:
-        import pyotp
-        # Use fixed TOTP secrets for testing
-        admin_totp_secret = "JBSWY3DPEHPK3PXP"  # Fixed test secret
-        user_totp_secret = "JBSWY3DPEHPK3PXQ"   # Fixed test secret
-        
-        # Add test users with proper password hashing
-        create_user('admin', 'admin123', 'admin', admin_totp_secret)
-        create_user('user', 'user123', 'file_manager', user_totp_secret)
-        
-        # Print TOTP secrets for initial setup (in production, these would be securely transmitted to users)
-        print("\nTOTP Setup Information:")
-        print(f"Admin TOTP Secret: {admin_totp_secret}")
-        print(f"User TOTP Secret: {user_totp_secret}")
-        
-        # Add test files one by one with their content
-        test_files = [
-            ('DOC001', 'Top Secret Report 2025.txt', b"This is a top secret report. For admin eyes only.", 'admin'),
-            ('DOC002', 'Security Protocol Delta.txt', b"Security protocol documentation for file managers.", 'file_manager'),
-            ('DOC003', 'Operation Nightwatch.txt', b"Operation Nightwatch details and procedures.", 'file_manager'),
-            ('DOC004', 'Personnel Records.txt', b"Confidential personnel records and data.", 'file_manager')
-        ]
-        
-        for file_id, filename, file_data, access_level in test_files:
-            cursor.execute("""
-                INSERT OR IGNORE INTO classified_files 
-                (file_id, filename, file_data, access_level)
-                VALUES (?, ?, ?, ?)
-            """, (file_id, filename, file_data, access_level))
-        conn.commit()
-    except Exception as e:
-        print(f"Error initializing test data: {e}")
+    with get_connection() as conn:
+        try:
+            import pyotp
+            cursor = conn.cursor()
+            # Use fixed TOTP secrets for testing
+            admin_totp_secret = "JBSWY3DPEHPK3PXP"  # Fixed test secret
+            user_totp_secret = "JBSWY3DPEHPK3PXQ"   # Fixed test secret
+            
+            # Add test users with proper password hashing
+            create_user('admin', 'admin123', 'admin', admin_totp_secret)
+            create_user('user', 'user123', 'file_manager', user_totp_secret)
+            
+            # Print TOTP secrets for initial setup (in production, these would be securely transmitted to users)
+            print("\nTOTP Setup Information:")
+            print(f"Admin TOTP Secret: {admin_totp_secret}")
+            print(f"User TOTP Secret: {user_totp_secret}")
+            
+            # Add test files one by one with their content
+            test_files = [
+                ('DOC001', 'Top Secret Report 2025.txt', b"This is a top secret report. For admin eyes only.", 'admin'),
+                ('DOC002', 'Security Protocol Delta.txt', b"Security protocol documentation for file managers.", 'file_manager'),
+                ('DOC003', 'Operation Nightwatch.txt', b"Operation Nightwatch details and procedures.", 'file_manager'),
+                ('DOC004', 'Personnel Records.txt', b"Confidential personnel records and data.", 'file_manager')
+            ]
+            
+            for file_id, filename, file_data, access_level in test_files:
+                cursor.execute("""
+                    INSERT OR IGNORE INTO classified_files 
+                    (file_id, filename, file_data, access_level)
+                    VALUES (?, ?, ?, ?)
+                """, (file_id, filename, file_data, access_level))
+            conn.commit()
+        except Exception as e:
+            print(f"Error initializing test data: {e}")
 
 def verify_totp(username, totp_code):
-    try:
-        import pyotp
-        cur = conn.cursor()
-        cur.execute("SELECT totp_secret FROM users WHERE username = ?", (username,))
-        result = cur.fetchone()
-        
-        if result and result[0]:
-            totp = pyotp.TOTP(result[0])
-            # Allow a window of 1 interval before and after for time sync issues
-            return totp.verify(totp_code, valid_window=1)
-        return False
-    except Exception as e:
-        print(f"TOTP verification error: {e}")
-        print(f"Debug - Username: {username}, Code: {totp_code}")
-        if result and result[0]:
-            print(f"Debug - Current expected code: {pyotp.TOTP(result[0]).now()}")
-        return False
+    with get_connection() as conn:
+        try:
+            import pyotp
+            cur = conn.cursor()
+            cur.execute("SELECT totp_secret FROM users WHERE username = ?", (username,))
+            result = cur.fetchone()
+            
+            if result and result[0]:
+                totp = pyotp.TOTP(result[0])
+                # Allow a window of 1 interval before and after for time sync issues
+                return totp.verify(totp_code, valid_window=1)
+            return False
+        except Exception as e:
+            print(f"TOTP verification error: {e}")
+            print(f"Debug - Username: {username}, Code: {totp_code}")
+            if result and result[0]:
+                print(f"Debug - Current expected code: {pyotp.TOTP(result[0]).now()}")
+            return False
 
 def get_agent_by_id(agent_id, requesting_user_role):
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM agents WHERE agent_number = ?", (agent_id,))
-        agent = cur.fetchone()
-        
-        if not agent:
-            return None
+    with get_connection() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT * FROM agents WHERE agent_number = ?", (agent_id,))
+            agent = cur.fetchone()
             
-        # Role-based access control
-        if requesting_user_role == 'admin':
-            # Admin can see all agent details
-            pass
-        elif requesting_user_role == 'file_manager':
-            # File manager can only see agents with file_manager clearance
-            if agent[5] != 'file_manager':  # agent[5] is clearance_level
+            if not agent:
                 return None
-        else:
-            return None
-            
-        return {
-            'agent_number': agent[1],
-            'name': agent[2],
-            'rank': agent[3],
-            'status': agent[4],
-            'clearance_level': agent[5],
-            'last_mission': agent[6],
-            'photo_url': agent[7],
-            'personal_info': {
-                'contact': '+1 (XXX) XXX-XXXX',  # Masked for security
-                'location': 'Classified',
-                'specialization': 'Information Security',
-                'years_of_service': '5+',
-                'certifications': ['Level 3 Clearance', 'Advanced Combat Training'],
-                'current_assignment': 'Project DEEPWATCH'
+                
+            # Role-based access control
+            if requesting_user_role == 'admin':
+                # Admin can see all agent details
+                pass
+            elif requesting_user_role == 'file_manager':
+                # File manager can only see agents with file_manager clearance
+                if agent[5] != 'file_manager':  # agent[5] is clearance_level
+                    return None
+            else:
+                return None
+                
+            return {
+                'agent_number': agent[1],
+                'name': agent[2],
+                'rank': agent[3],
+                'status': agent[4],
+                'clearance_level': agent[5],
+                'last_mission': agent[6],
+                'photo_url': agent[7],
+                'personal_info': {
+                    'contact': '+1 (XXX) XXX-XXXX',  # Masked for security
+                    'location': 'Classified',
+                    'specialization': 'Information Security',
+                    'years_of_service': '5+',
+                    'certifications': ['Level 3 Clearance', 'Advanced Combat Training'],
+                    'current_assignment': 'Project DEEPWATCH'
+                }
             }
-        }
-    except Exception as e:
-        print(f"Database error: {e}")
-        return None
+        except Exception as e:
+            print(f"Database error: {e}")
+            return None
+
+LOCATION_LIST_COLUMNS = {
+    'location_id': 'location_id',
+    'name': 'name',
+    'type': 'type',
+    'access_level': 'access_level',
+    'geolocation': 'geolocation',
+    'contents': 'contents',
+    'status': 'status',
+    'last_accessed': 'last_accessed',
+    'security_level': 'security_level',
+}
+# contents is only sent when asked for; the detail view has it
+LOCATION_LIST_FIELDS = tuple(name for name in LOCATION_LIST_COLUMNS if name != 'contents')
+
+def get_locations(role, limit=None, after=None, fields=None, status=None):
+    with get_connection() as conn:
+        try:
+            cur = conn.cursor()
+            if role == 'admin':
+                # Admin can see all locations
+                conditions = []
+            elif role == 'file_manager':
+                # File manager can only see standard security level locations
+                conditions = ["security_level = 'standard'"]
+            else:
+                return [], None
+
+            params = []
+            if status is not None:
+                conditions.append("status = ?")
+                params.append(status)
+                
+            return fetch_page(
+                cur, "locations", "location_id", LOCATION_LIST_COLUMNS, LOCATION_LIST_FIELDS,
+                fields=fields, conditions=conditions, params=params, limit=limit, after=after
+            )
+        except ValueError:
+            raise
+        except Exception as e:
+            print(f"Database error: {e}")
+            return [], None
 
-def get_locations(role):
-    try:
-        cur = conn.cursor()
-        if role == 'admin':
-            # Admin can see all locations
-            cur.execute("SELECT * FROM locations")
-        elif role == 'file_manager':
-            # File manager can only see standard security level locations
-            cur.execute("""
-                SELECT * FROM locations 
-                WHERE security_level = 'standard'
-            """)
-        else:
-            return []
-            
-        locations = cur.fetchall()
-        return [{
-            'location_id': loc[1],
-            'name': loc[2],
-            'type': loc[3],
-            'access_level': loc[4],
-            'geolocation': loc[5],
-            'contents': loc[6],
-            'status': loc[7],
-            'last_accessed': loc[8],
-            'security_level': loc[9]
-        } for loc in locations]
-    except Exception as e:
-        print(f"Database error: {e}")
-        return []
 
 def get_location_by_id(location_id, requesting_user_role):
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM locations WHERE location_id = ?", (location_id,))
-        loc = cur.fetchone()
-        
-        if not loc:
-            return None
+    with get_connection() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT * FROM locations WHERE location_id = ?", (location_id,))
+            loc = cur.fetchone()
             
-        # Role-based access control
-        if requesting_user_role == 'admin':
-            # Admin can see all location details
-            pass
-        elif requesting_user_role == 'file_manager':
-            # File manager can only see standard security level locations
-            if loc[9] != 'standard':  # loc[9] is security_level
+            if not loc:
                 return None
-        else:
+                
+            # Role-based access control
+            if requesting_user_role == 'admin':
+                # Admin can see all location details
+                pass
+            elif requesting_user_role == 'file_manager':
+                # File manager can only see standard security level locations
+                if loc[9] != 'standard':  # loc[9] is security_level
+                    return None
+            else:
+                return None
+                
+            return {
+                'location_id': loc[1],
+                'name': loc[2],
+                'type': loc[3],
+                'access_level': loc[4],
+                'geolocation': loc[5],
+                'contents': loc[6],
+                'status': loc[7],
+                'last_accessed': loc[8],
+                'security_level': loc[9]
+            }
+        except Exception as e:
+            print(f"Database error: {e}")
             return None
-            
-        return {
-            'location_id': loc[1],
-            'name': loc[2],
-            'type': loc[3],
-            'access_level': loc[4],
-            'geolocation': loc[5],
-            'contents': loc[6],
-            'status': loc[7],
-            'last_accessed': loc[8],
-            'security_level': loc[9]
-        }
-    except Exception as e:
-        print(f"Database error: {e}")
-        return None
 
 def log_audit(user_id, action, details):
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO audit_log (user_id, action, details)
-            VALUES (?, ?, ?)
-        """, (user_id, action, details))
-        conn.commit()
-    except Exception as e:
-        print(f"Audit logging error: {e}")
+    with get_connection() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO audit_log (user_id, action, details)
+                VALUES (?, ?, ?)
+            """, (user_id, action, details))
+            conn.commit()
+        except Exception as e:
+            print(f"Audit logging error: {e}")
 
 def verify_operation_access(user_id, user_role, operation_id=None):
-    if user_role == 'admin':
-        return True
-        
-    if operation_id:
-        cur = conn.cursor()
-        cur.execute("SELECT classified_level FROM operations WHERE operation_id = ?", (operation_id,))
-        result = cur.fetchone()
-        
-        if not result:
-            return False
+    with get_connection() as conn:
+        if user_role == 'admin':
+            return True
             
-        classified_level = result[0]
-        if classified_level == 'TOP_SECRET' and user_role != 'senior_agent':
-            return False
+        if operation_id:
+            cur = conn.cursor()
+            cur.execute("SELECT classified_level FROM operations WHERE operation_id = ?", (operation_id,))
+            result = cur.fetchone()
             
-    return user_role in ['file_manager', 'senior_agent']
+            if not result:
+                return False
+                
+            classified_level = result[0]
+            if classified_level == 'TOP_SECRET' and user_role != 'senior_agent':
+                return False
+                
+        return user_role in ['file_manager', 'senior_agent']
 
-def get_operations(user_id, user_role):
-    try:
-        if not verify_operation_access(user_id, user_role):
-            log_audit(user_id, "access_denied", f"Unauthorized operations list access attempt with role {user_role}")
-            return []
-            
-        cur = conn.cursor()
-        
-        if user_role == 'admin':
-            cur.execute("SELECT * FROM operations")
-        elif user_role == 'senior_agent':
-            cur.execute("SELECT * FROM operations")
-        else:
-            cur.execute("""
-                SELECT * FROM operations 
-                WHERE classified_level = 'standard'
-            """)
-        
-        operations = cur.fetchall()
-        log_audit(user_id, "list_operations", f"Retrieved operations list with role {user_role}")
-        
-        return [{
-            'operation_id': op[1],
-            'code_name': op[2],
-            'status': op[3],
-            'priority': op[4],
-            'start_date': op[5],
-            'end_date': op[6],
-            'description': op[7],
-            'involved_agents': json.loads(op[8]),
-            'target_location': op[9],
-            'classified_level': op[10]
-        } for op in operations]
-    except Exception as e:
-        print(f"Database error: {e}")
-        log_audit(user_id, "error", f"Error retrieving operations: {str(e)}")
-        return []
+OPERATION_LIST_COLUMNS = {
+    'operation_id': 'o.operation_id',
+    'code_name': 'o.code_name',
+    'status': 'o.status',
+    'priority': 'o.priority',
+    'start_date': 'o.start_date',
+    'end_date': 'o.end_date',
+    'description': 'o.description',
+    # Agent lists are aggregated in SQL, in the operation's own order
+    'involved_agents': """(SELECT group_concat(agent_number, ',')
+        FROM (SELECT agent_number FROM operation_agents oa
+              WHERE oa.operation_id = o.operation_id
+              ORDER BY oa.position))""",
+    'target_location': 'o.target_location',
+    'classified_level': 'o.classified_level',
+}
+# description is only sent when asked for; the detail view has it
+OPERATION_LIST_FIELDS = tuple(name for name in OPERATION_LIST_COLUMNS if name != 'description')
 
-def get_operation_by_id(operation_id, user_id, user_role):
-    try:
-        if not verify_operation_access(user_id, user_role, operation_id):
-            log_audit(user_id, "access_denied", f"Unauthorized access attempt to operation {operation_id} with role {user_role}")
-            return None
+def get_operations(user_id, user_role, agent_number=None, limit=None, after=None, fields=None, status=None):
+    """List the operations the role may see, optionally only those ``agent_number`` is on."""
+    with get_connection() as conn:
+        try:
+            if not verify_operation_access(user_id, user_role):
+                log_audit(user_id, "access_denied", f"Unauthorized operations list access attempt with role {user_role}")
+                return [], None
+                
+            cur = conn.cursor()
             
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM operations WHERE operation_id = ?", (operation_id,))
-        op = cur.fetchone()
-        
-        if not op:
-            log_audit(user_id, "not_found", f"Attempted to access non-existent operation {operation_id}")
-            return None
+            conditions = []
+            params = []
+            if user_role not in ('admin', 'senior_agent'):
+                conditions.append("o.classified_level = 'standard'")
+            if agent_number is not None:
+                # Served by idx_operation_agents_agent
+                conditions.append("o.operation_id IN (SELECT operation_id FROM operation_agents WHERE agent_number = ?)")
+                params.append(agent_number)
+            if status is not None:
+                conditions.append("o.status = ?")
+                params.append(status)
+
+            operations, next_after = fetch_page(
+                cur, "operations o", "o.operation_id", OPERATION_LIST_COLUMNS, OPERATION_LIST_FIELDS,
+                fields=fields, conditions=conditions, params=params, limit=limit, after=after
+            )
+            log_audit(user_id, "list_operations", f"Retrieved operations list with role {user_role}")
             
-        # Fetch related agent details with access control
-        involved_agents = json.loads(op[8])  # List of agent IDs
-        agent_details = []
-        for agent_id in involved_agents:
+            for op in operations:
+                if 'involved_agents' in op:
+                    op['involved_agents'] = op['involved_agents'].split(',') if op['involved_agents'] else []
+            return operations, next_after
+        except ValueError:
+            raise
+        except Exception as e:
+            print(f"Database error: {e}")
+            log_audit(user_id, "error", f"Error retrieving operations: {str(e)}")
+            return [], None
+
+
+def get_operation_by_id(operation_id, user_id, user_role):
+    with get_connection() as conn:
+        try:
+            cur = conn.cursor()
+            # Operation and its target location in one round trip; the location
+            # columns come back NULL if the user's role may not see it
             cur.execute("""
-                SELECT name, rank, clearance_level 
-                FROM agents 
-                WHERE agent_number = ?
-            """, (agent_id,))
-            agent = cur.fetchone()
-            if agent:
-                # Only include agent details based on user role
-                if user_role == 'admin' or agent[2] in ['standard', user_role]:
-                    agent_details.append({
-                        'id': agent_id,
-                        'name': agent[0],
-                        'rank': agent[1]
-                    })
-
-        # Fetch location details if available with access control
-        location_details = None
-        if op[9]:  # If target_location exists
+                SELECT o.*, l.name, l.type
+                FROM operations o
+                LEFT JOIN locations l
+                    ON l.location_id = o.target_location
+                    AND (? = 'admin' OR l.security_level IN ('standard', ?))
+                WHERE o.operation_id = ?
+            """, (user_role, user_role, operation_id))
+            op = cur.fetchone()
+
+            # Same rules as verify_operation_access(user_id, user_role, operation_id),
+            # checked against the row we already have instead of a second query
+            if not verify_operation_access(user_id, user_role) or (
+                user_role != 'admin' and (
+                    op is None or (op[10] == 'TOP_SECRET' and user_role != 'senior_agent')
+                )
+            ):
+                log_audit(user_id, "access_denied", f"Unauthorized access attempt to operation {operation_id} with role {user_role}")
+                return None
+            
+            if not op:
+                log_audit(user_id, "not_found", f"Attempted to access non-existent operation {operation_id}")
+                return None
+                
+            # Every involved agent the role may see, in the operation's own order
             cur.execute("""
-                SELECT name, type, security_level 
-                FROM locations 
-                WHERE location_id = ?
-            """, (op[9],))
-            loc = cur.fetchone()
-            if loc and (user_role == 'admin' or loc[2] in ['standard', user_role]):
+                SELECT a.agent_number, a.name, a.rank
+                FROM operation_agents oa
+                JOIN agents a ON a.agent_number = oa.agent_number
+                WHERE oa.operation_id = ?
+                AND (? = 'admin' OR a.clearance_level IN ('standard', ?))
+                ORDER BY oa.position
+            """, (operation_id, user_role, user_role))
+            agent_details = [
+                {
+                    'id': agent[0],
+                    'name': agent[1],
+                    'rank': agent[2]
+                }
+                for agent in cur.fetchall()
+            ]
+
+            location_details = None
+            if op[9] and op[12] is not None:  # Target location exists and is visible
                 location_details = {
                     'id': op[9],
-                    'name': loc[0],
-                    'type': loc[1]
+                    'name': op[12],
+                    'type': op[13]
                 }
+                
+            operation_data = {
+                'operation_id': op[1],
+                'code_name': op[2],
+                'status': op[3],
+                'priority': op[4],
+                'start_date': op[5],
+                'end_date': op[6],
+                'description': op[7],
+                'involved_agents': agent_details,
+                'target_location': location_details,
+                'classified_level': op[10]
+            }
             
-        operation_data = {
-            'operation_id': op[1],
-            'code_name': op[2],
-            'status': op[3],
-            'priority': op[4],
-            'start_date': op[5],
-            'end_date': op[6],
-            'description': op[7],
-            'involved_agents': agent_details,
-            'target_location': location_details,
-            'classified_level': op[10]
-        }
-        
-        # Add additional info based on clearance
-        if user_role == 'admin' or (user_role == 'senior_agent' and op[10] != 'TOP_SECRET'):
-            operation_data['additional_info'] = {
-                'timeline': [
-                    {
-                        'date': op[5],
-                        'event': 'Operation Initiated',
-                        'details': 'Initial briefing and team assembly',
-                        'location': 'Command Center Alpha',
-                        'participants': ['Mission Director', 'Field Team Lead', 'Intelligence Officer']
-                    },
-                    {
-                        'date': datetime.strptime(op[5], '%Y-%m-%d %H:%M:%S') + timedelta(hours=2),
-                        'event': 'Phase 1 - Intelligence Gathering',
-                        'details': 'Deployment of surveillance assets and initial reconnaissance',
-                        'location': 'Field Operation Zone',
-                        'participants': ['Surveillance Team', 'Intelligence Analysts']
-                    },
-                    {
-                        'date': datetime.strptime(op[5], '%Y-%m-%d %H:%M:%S') + timedelta(hours=24),
-                        'event': 'Phase 2 - Operation Execution',
-                        'details': 'Main operation phase with coordinated team actions',
-                        'location': 'Target Zone',
-                        'participants': ['Strike Team', 'Support Units', 'Medical Team']
-                    }
-                ],
-                'risk_assessment': {
-                    'threat_level': calculate_threat_level(op[4]),  # Based on priority
-                    'environmental_risks': [
-                        'Weather conditions affecting visibility',
-                        'Urban environment complications',
-                        'Civilian presence in operation zone'
-                    ],
-                    'countermeasures': [
-                        'Advanced surveillance systems',
-                        'Secure communication channels',
-                        'Emergency extraction protocols',
-                        'Medical evacuation routes'
+            # Add additional info based on clearance
+            if user_role == 'admin' or (user_role == 'senior_agent' and op[10] != 'TOP_SECRET'):
+                operation_data['additional_info'] = {
+                    'timeline': [
+                        {
+                            'date': op[5],
+                            'event': 'Operation Initiated',
+                            'details': 'Initial briefing and team assembly',
+                            'location': 'Command Center Alpha',
+                            'participants': ['Mission Director', 'Field Team Lead', 'Intelligence Officer']
+                        },
+                        {
+                            'date': datetime.strptime(op[5], '%Y-%m-%d %H:%M:%S') + timedelta(hours=2),
+                            'event': 'Phase 1 - Intelligence Gathering',
+                            'details': 'Deployment of surveillance assets and initial reconnaissance',
+                            'location': 'Field Operation Zone',
+                            'participants': ['Surveillance Team', 'Intelligence Analysts']
+                        },
+                        {
+                            'date': datetime.strptime(op[5], '%Y-%m-%d %H:%M:%S') + timedelta(hours=24),
+                            'event': 'Phase 2 - Operation Execution',
+                            'details': 'Main operation phase with coordinated team actions',
+                            'location': 'Target Zone',
+                            'participants': ['Strike Team', 'Support Units', 'Medical Team']
+                        }
                     ],
-                    'contingency_plans': [
-                        'Plan B: Alternative approach vectors',
-                        'Plan C: Emergency extraction procedures',
-                        'Communication failure protocols'
-                    ]
-                },
-                'resources': {
-                    'equipment': {
-                        'surveillance': ['Thermal imaging', 'Drone units', 'Signal interceptors'],
-                        'communication': ['Encrypted radios', 'Satellite uplinks', 'Emergency beacons'],
-                        'tactical': ['Standard issue gear', 'Special equipment based on operation type'],
-                        'medical': ['Field medical kits', 'Emergency response equipment']
+                    'risk_assessment': {
+                        'threat_level': calculate_threat_level(op[4]),  # Based on priority
+                        'environmental_risks': [
+                            'Weather conditions affecting visibility',
+                            'Urban environment complications',
+                            'Civilian presence in operation zone'
+                        ],
+                        'countermeasures': [
+                            'Advanced surveillance systems',
+                            'Secure communication channels',
+                            'Emergency extraction protocols',
+                            'Medical evacuation routes'
+                        ],
+                        'contingency_plans': [
+                            'Plan B: Alternative approach vectors',
+                            'Plan C: Emergency extraction procedures',
+                            'Communication failure protocols'
+                        ]
                     },
-                    'vehicles': {
-                        'ground': ['Tactical vehicles', 'Support vehicles'],
-                        'air': ['Surveillance drones', 'Emergency evacuation units'],
-                        'special': ['Mission-specific vehicles']
+                    'resources': {
+                        'equipment': {
+                            'surveillance': ['Thermal imaging', 'Drone units', 'Signal interceptors'],
+                            'communication': ['Encrypted radios', 'Satellite uplinks', 'Emergency beacons'],
+                            'tactical': ['Standard issue gear', 'Special equipment based on operation type'],
+                            'medical': ['Field medical kits', 'Emergency response equipment']
+                        },
+                        'vehicles': {
+                            'ground': ['Tactical vehicles', 'Support vehicles'],
+                            'air': ['Surveillance drones', 'Emergency evacuation units'],
+                            'special': ['Mission-specific vehicles']
+                        },
+                        'support_personnel': {
+                            'field_teams': ['Primary strike team', 'Secondary support team'],
+                            'technical_support': ['Communications experts', 'Surveillance operators'],
+                            'medical_support': ['Field medics', 'Emergency response team'],
+                            'logistics': ['Supply chain coordinators', 'Equipment managers']
+                        }
                     },
-                    'support_personnel': {
-                        'field_teams': ['Primary strike team', 'Secondary support team'],
-                        'technical_support': ['Communications experts', 'Surveillance operators'],
-                        'medical_support': ['Field medics', 'Emergency response team'],
-                        'logistics': ['Supply chain coordinators', 'Equipment managers']
+                    'success_metrics': {
+                        'primary_objectives': [
+                            'Mission completion within timeframe',
+                            'Minimal security breaches',
+                            'Asset protection maintained'
+                        ],
+                        'secondary_objectives': [
+                            'Intelligence gathering goals',
+                            'Resource efficiency targets',
+                            'Operational security maintenance'
+                        ],
+                        'performance_indicators': [
+                            'Response time metrics',
+                            'Resource utilization efficiency',
+                            'Communication effectiveness'
+                        ]
+                    },
+                    'security_protocols': {
+                        'communication': [
+                            'Encrypted channels only',
+                            'Regular frequency changes',
+                            'Emergency silence protocols'
+                        ],
+                        'information_handling': [
+                            'Need-to-know basis',
+                            'Compartmentalized information distribution',
+                            'Secure data disposal procedures'
+                        ],
+                        'personnel': [
+                            'Regular security clearance verification',
+                            'Real-time location tracking',
+                            'Emergency extraction procedures'
+                        ]
                     }
-                },
-                'success_metrics': {
-                    'primary_objectives': [
-                        'Mission completion within timeframe',
-                        'Minimal security breaches',
-                        'Asset protection maintained'
-                    ],
-                    'secondary_objectives': [
-                        'Intelligence gathering goals',
-                        'Resource efficiency targets',
-                        'Operational security maintenance'
-                    ],
-                    'performance_indicators': [
-                        'Response time metrics',
-                        'Resource utilization efficiency',
-                        'Communication effectiveness'
-                    ]
-                },
-                'security_protocols': {
-                    'communication': [
-                        'Encrypted channels only',
-                        'Regular frequency changes',
-                        'Emergency silence protocols'
-                    ],
-                    'information_handling': [
-                        'Need-to-know basis',
-                        'Compartmentalized information distribution',
-                        'Secure data disposal procedures'
-                    ],
-                    'personnel': [
-                        'Regular security clearance verification',
-                        'Real-time location tracking',
-                        'Emergency extraction procedures'
-                    ]
                 }
+                
+            log_audit(user_id, "view_operation", f"Accessed operation {operation_id}")
+            return operation_data
+                
+        except Exception as e:
+            print(f"Database error: {e}")
+            log_audit(user_id, "error", f"Error accessing operation {operation_id}: {str(e)}")
+            return None
+
+AUDIT_QUEUE_SIZE = 10000      # Max audit rows waiting to be written
+AUDIT_BATCH_SIZE = 200        # Flush once this many rows are queued...
+AUDIT_FLUSH_INTERVAL = 0.05   # ...or this many seconds after the first one
+AUDIT_PUT_TIMEOUT = 1.0       # How long an overflowing row waits for queue space before it is written directly
+
+AUDIT_INSERT = """
+    INSERT INTO audit_logs (username, role, timestamp, session_duration, stuff_accessed, action)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+class AuditLogWriter:
+    """
+    Background writer for the audit_logs table.
+
+    Rows are queued in memory and written by a single daemon thread in one
+    transaction per batch, so request handlers never wait on a commit. When the
+    queue is full the row waits up to AUDIT_PUT_TIMEOUT for space and is then
+    written directly rather than dropped; each such event is counted in
+    ``stats()['backpressure']``. Callers on an event loop thread never wait:
+    their overflowing rows are handed to a separate overflow thread.
+
+    Once a batch is committed its rows, with their ids, are published to
+    ``bus`` (if given and anyone is subscribed). Commit and publish happen
+    under one lock, so batches from the writer and overflow threads reach
+    the bus in id order.
+    """
+
+    def __init__(self, queue_size=AUDIT_QUEUE_SIZE, batch_size=AUDIT_BATCH_SIZE,
+                 flush_interval=AUDIT_FLUSH_INTERVAL, bus=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.bus = bus
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._written = 0
+        self._batches = 0
+        self._backpressure = 0
+        self._overflow = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit-log-overflow")
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, row):
+        """Queue one audit row. Returns False if the queue was full."""
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            pass
+
+        with self._lock:
+            self._backpressure += 1
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # A worker thread can afford to wait for the writer to catch up
+            self._put_or_write(row)
+        else:
+            # Never block the event loop on queue space, a pooled connection
+            # or a commit
+            self._overflow.submit(self._put_or_write, row)
+        return False
+
+    def _put_or_write(self, row):
+        try:
+            self._queue.put(row, timeout=AUDIT_PUT_TIMEOUT)
+        except queue.Full:
+            self._write([row])
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+        self.flush()
+
+    def _write(self, batch):
+        # Held until the batch is published so a later commit can never be
+        # published ahead of an earlier one
+        with self._write_lock:
+            with get_connection() as conn:
+                try:
+                    conn.executemany(AUDIT_INSERT, batch)
+                    # The batch is one write transaction, so its AUTOINCREMENT ids
+                    # are consecutive and end at last_insert_rowid()
+                    last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                    conn.commit()
+                    with self._lock:
+                        self._written += len(batch)
+                        self._batches += 1
+                except Exception as e:
+                    print(f"Error logging activity: {e}")
+                    return
+
+            if self.bus is not None and len(self.bus):
+                first_id = last_id - len(batch) + 1
+                self.bus.publish([{
+                    'id': first_id + i,
+                    'username': row[0],
+                    'role': row[1],
+                    'timestamp': row[2],
+                    'session_duration': row[3],
+                    'stuff_accessed': row[4],
+                    'action': row[5]
+                } for i, row in enumerate(batch)])
+
+    def flush(self):
+        """Write everything that is currently queued."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def stop(self, timeout=5):
+        """Stop the writer thread and flush the remaining rows."""
+        self._stop.set()
+        try:
+            # The overflow thread runs rows in order, so this waits for all of them
+            self._overflow.submit(lambda: None).result(timeout)
+        except RuntimeError:
+            # At interpreter exit the overflow thread has already been joined
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'written': self._written,
+                'batches': self._batches,
+                'backpressure': self._backpressure
             }
-            
-        log_audit(user_id, "view_operation", f"Accessed operation {operation_id}")
-        return operation_data
-            
-    except Exception as e:
-        print(f"Database error: {e}")
-        log_audit(user_id, "error", f"Error accessing operation {operation_id}: {str(e)}")
-        return None
+
+
+# Committed audit rows, pushed to live subscribers such as /logs/events
+audit_events = EventBus()
+
+audit_writer = AuditLogWriter(bus=audit_events)
+audit_writer.start()
+atexit.register(audit_writer.stop)
 
 def log_activity(username: str, role: str, action: str, stuff_accessed: str = None, session_duration: int = None):
     """
     Log user activity to audit_logs table.
+
+    The row is timestamped now and handed to the background audit writer,
+    which commits it with the rest of its batch.
     
     Args:
         username: The username performing the action
@@ -751,17 +1484,17 @@ def log_activity(username: str, role: str, action: str, stuff_accessed: str = No
         session_duration: Duration of the action in milliseconds (optional)
     """
     try:
-        cursor.execute("""
-            INSERT INTO audit_logs (username, role, timestamp, session_duration, stuff_accessed, action)
-            VALUES (?, ?, datetime('now'), ?, ?, ?)
-        """, (username, role, session_duration, stuff_accessed, action))
-        conn.commit()
+        # Same format as SQLite's datetime('now')
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        audit_writer.submit((username, role, timestamp, session_duration, stuff_accessed, action))
     except Exception as e:
         print(f"Error logging activity: {e}")
 
-def get_audit_logs(username: str = None, role: str = None, start_time: str = None, end_time: str = None, limit: int = 100):
+def get_audit_logs(username: str = None, role: str = None, start_time: str = None, end_time: str = None,
+                   limit: int = 100, cursor: tuple = None, after_id: int = None):
     """
-    Retrieve audit logs with optional filtering.
+    Retrieve audit logs with optional filtering, newest first, or oldest
+    first from a high-water mark when ``after_id`` is given.
     
     Args:
         username: Filter logs by username (optional)
@@ -769,172 +1502,217 @@ def get_audit_logs(username: str = None, role: str = None, start_time: str = Non
         start_time: Filter logs after this timestamp (optional)
         end_time: Filter logs before this timestamp (optional)
         limit: Maximum number of logs to return
+        cursor: (timestamp, id) of the last log on the previous page (optional)
+        after_id: Only logs with a greater id, in id order (optional)
+
+    Returns (logs, cursor for the next page or None). Rows are ordered by
+    (timestamp, id) so the cursor stays exact when timestamps repeat. With
+    ``after_id`` the next cursor is simply the last id returned; ids are
+    committed in increasing order, so a poller that keeps its last id reads
+    every row exactly once.
+
+    Database errors are raised rather than returned as an empty page, which
+    callers following the cursor would take for the end of the log.
     """
-    try:
-        query = "SELECT username, role, timestamp, session_duration, stuff_accessed, action FROM audit_logs"
-        conditions = []
-        params = []
-        
-        if username:
-            conditions.append("username = ?")
-            params.append(username)
-        if role:
-            conditions.append("role = ?")
-            params.append(role)
-        if start_time:
-            conditions.append("timestamp >= ?")
-            params.append(start_time)
-        if end_time:
-            conditions.append("timestamp <= ?")
-            params.append(end_time)
+    with get_connection() as conn:
+        try:
+            query = "SELECT id, username, role, timestamp, session_duration, stuff_accessed, action FROM audit_logs"
+            conditions = []
+            params = []
             
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
+            if username:
+                conditions.append("username = ?")
+                params.append(username)
+            if role:
+                conditions.append("role = ?")
+                params.append(role)
+            if start_time:
+                conditions.append("timestamp >= ?")
+                params.append(start_time)
+            if end_time:
+                conditions.append("timestamp <= ?")
+                params.append(end_time)
+            if after_id is not None:
+                conditions.append("id > ?")
+                params.append(after_id)
+            elif cursor:
+                conditions.append("(timestamp, id) < (?, ?)")
+                params.extend(cursor)
+                
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+                
+            # One extra row tells us whether there is a next page
+            if after_id is not None:
+                query += " ORDER BY id LIMIT ?"
+            else:
+                query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+            params.append(limit + 1)
             
-        query += " ORDER BY timestamp DESC LIMIT ?"
-        params.append(limit)
-        
-        cursor.execute(query, params)
-        logs = cursor.fetchall()
-        
-        return [{
-            'username': log[0],
-            'role': log[1],
-            'timestamp': log[2],
-            'session_duration': log[3],
-            'stuff_accessed': log[4],
-            'action': log[5]
-        } for log in logs]
-    except Exception as e:
-        print(f"Error retrieving logs: {e}")
-        return []
+            cur = conn.cursor()
+            cur.execute(query, params)
+            logs = cur.fetchall()
 
-def get_agents(role):
-    try:
-        cur = conn.cursor()
-        if role == 'admin':
-            # Admin can see all agents
-            cur.execute("SELECT * FROM agents")
-        elif role == 'file_manager':
-            # File manager can only see agents with clearance level file_manager or lower
-            cur.execute("""
-                SELECT * FROM agents 
-                WHERE clearance_level = 'file_manager'
-            """)
-        else:
-            return []
-            
-        agents = cur.fetchall()
-        return [{
-            'agent_number': agent[1],
-            'name': agent[2],
-            'rank': agent[3],
-            'status': agent[4],
-            'clearance_level': agent[5],
-            'last_mission': agent[6],
-            'photo_url': agent[7]
-        } for agent in agents]
-    except Exception as e:
-        print(f"Database error: {e}")
-        return []
+            if len(logs) <= limit:
+                next_cursor = None
+            elif after_id is not None:
+                next_cursor = logs[limit - 1][0]
+            else:
+                next_cursor = (logs[limit - 1][3], logs[limit - 1][0])
+            return [{
+                'id': log[0],
+                'username': log[1],
+                'role': log[2],
+                'timestamp': log[3],
+                'session_duration': log[4],
+                'stuff_accessed': log[5],
+                'action': log[6]
+            } for log in logs[:limit]], next_cursor
+        except Exception as e:
+            print(f"Error retrieving logs: {e}")
+            raise
 
-def init_test_data():
-    try:
-        import pyotp
-        # Use fixed TOTP secrets for testing
-        admin_totp_secret = "JBSWY3DPEHPK3PXP"  # Fixed test secret
-        user_totp_secret = "JBSWY3DPEHPK3PXQ"   # Fixed test secret
-        
-        # Add test users with properly hashed passwords and TOTP secrets
-        # Create admin users
-        create_user('admin', 'admin123', 'admin', admin_totp_secret)
-        create_user('admin2', 'admin123', 'admin', admin_totp_secret)  # Second admin with same TOTP
-        
-        # Then create regular user
-        create_user('user', 'user123', 'file_manager', user_totp_secret)
-        
-        # Print TOTP secrets for initial setup (in production, these would be securely transmitted to users)
-        print("\nTOTP Setup Information:")
-        print(f"Admin TOTP Secret: {admin_totp_secret}")
-        print(f"User TOTP Secret: {user_totp_secret}")
-        
-        # Add test files
-        cursor.execute("""
-            INSERT OR IGNORE INTO classified_files (file_id, filename, file_data, access_level)
-            VALUES 
-                ('DOC001', 'Top Secret Report 2025.txt', ?, 'admin'),
-                ('DOC002', 'Security Protocol Delta.txt', ?, 'file_manager'),
-                ('DOC003', 'Operation Nightwatch.txt', ?, 'file_manager'),
-                ('DOC004', 'Personnel Records.txt', ?, 'file_manager')
-        """, (
-            b"This is a top secret report. For admin eyes only.",
-            b"Security protocol documentation for file managers.",
-            b"Operation Nightwatch details and procedures.",
-            b"Confidential personnel records and data."
-        ))
-
-        # Add test agents
-        cursor.execute("""
-            INSERT OR IGNORE INTO agents 
-            (agent_number, name, rank, status, clearance_level, last_mission, photo_url)
-            VALUES
-                ('A001', 'John Smith', 'Senior Agent', 'Active', 'admin', 'Operation Phoenix', '/agents/a001.jpg'),
-                ('A002', 'Sarah Connor', 'Field Agent', 'Active', 'file_manager', 'Operation Delta', '/agents/a002.jpg'),
-                ('A003', 'James Wilson', 'Field Agent', 'On Leave', 'file_manager', 'Operation Echo', '/agents/a003.jpg'),
-                ('A004', 'Emily Chen', 'Senior Agent', 'Active', 'admin', 'Operation Sierra', '/agents/a004.jpg'),
-                ('A005', 'Michael Brown', 'Junior Agent', 'Training', 'file_manager', 'None', '/agents/a005.jpg')
-        """)
-
-        # Add test operations
-        cursor.execute("""
-            INSERT OR IGNORE INTO operations 
-            (operation_id, code_name, status, priority, start_date, end_date, description, involved_agents, target_location, classified_level)
-            VALUES
-                ('OP001', 'Phoenix Rising', 'Active', 'High', 
-                 '2025-10-01 08:00:00', NULL,
-                 'High-priority operation targeting major security threat. Details classified.',
-                 '["A001", "A004"]', 'LOC001', 'admin'),
-                
-                ('OP002', 'Silent Echo', 'Completed', 'Medium',
-                 '2025-09-15 14:30:00', '2025-09-30 18:45:00',
-                 'Intelligence gathering operation in urban environment.',
-                 '["A002", "A003"]', 'LOC004', 'standard'),
-                
-                ('OP003', 'Blue Dawn', 'Active', 'High',
-                 '2025-10-05 06:00:00', NULL,
-                 'Critical asset protection and surveillance operation.',
-                 '["A001", "A002", "A004"]', 'LOC003', 'admin'),
-                
-                ('OP004', 'Desert Storm', 'Suspended', 'Medium',
-                 '2025-08-20 10:00:00', NULL,
-                 'Resource security operation in remote location.',
-                 '["A003", "A005"]', 'LOC002', 'standard'),
+AGENT_LIST_COLUMNS = {
+    'agent_number': 'agent_number',
+    'name': 'name',
+    'rank': 'rank',
+    'status': 'status',
+    'clearance_level': 'clearance_level',
+    'last_mission': 'last_mission',
+    'photo_url': 'photo_url',
+}
+
+def get_agents(role, limit=None, after=None, fields=None, status=None):
+    with get_connection() as conn:
+        try:
+            cur = conn.cursor()
+            if role == 'admin':
+                # Admin can see all agents
+                conditions = []
+            elif role == 'file_manager':
+                # File manager can only see agents with clearance level file_manager or lower
+                conditions = ["clearance_level = 'file_manager'"]
+            else:
+                return [], None
+
+            params = []
+            if status is not None:
+                conditions.append("status = ?")
+                params.append(status)
                 
-                ('OP005', 'Crystal Shield', 'Active', 'Low',
-                 '2025-10-10 09:00:00', NULL,
-                 'Standard security protocol implementation and training.',
-                 '["A005"]', 'LOC005', 'standard')
-        """)
-
-        # Add test locations
-        cursor.execute("""
-            INSERT OR IGNORE INTO locations 
-            (location_id, name, type, access_level, geolocation, contents, status, security_level)
-            VALUES
-                ('LOC001', 'Sierra Safehouse', 'Weapon Cache', 'high', '40.7128° N, 74.0060° W', 
-                'Heavy weapons, ammunition, tactical gear', 'Active', 'high'),
-                ('LOC002', 'Delta Storage', 'Cash Stash', 'medium', '34.0522° N, 118.2437° W', 
-                'Emergency funds, cryptocurrency cold storage', 'Active', 'standard'),
-                ('LOC003', 'Echo Bunker', 'Safe Room', 'high', '51.5074° N, 0.1278° W', 
-                'Emergency supplies, communications equipment', 'Active', 'high'),
-                ('LOC004', 'Bravo Cache', 'Intel Stash', 'medium', '48.8566° N, 2.3522° E', 
-                'Documents, hard drives, encryption keys', 'Active', 'standard'),
-                ('LOC005', 'Alpha Point', 'Medical Cache', 'medium', '35.6762° N, 139.6503° E', 
-                'Emergency medical supplies, field surgery equipment', 'Active', 'standard')
-        """)
-        
-        conn.commit()
-    except Exception as e:
-        print(f"Error initializing test data: {e}")
+            return fetch_page(
+                cur, "agents", "agent_number", AGENT_LIST_COLUMNS, tuple(AGENT_LIST_COLUMNS),
+                fields=fields, conditions=conditions, params=params, limit=limit, after=after
+            )
+        except ValueError:
+            raise
+        except Exception as e:
+            print(f"Database error: {e}")
+            return [], None
+
+
+def init_test_data():
+    with get_connection() as conn:
+        try:
+            import pyotp
+            cursor = conn.cursor()
+            # Use fixed TOTP secrets for testing
+            admin_totp_secret = "JBSWY3DPEHPK3PXP"  # Fixed test secret
+            user_totp_secret = "JBSWY3DPEHPK3PXQ"   # Fixed test secret
+            
+            # Add test users with properly hashed passwords and TOTP secrets.
+            # The tables now persist across restarts, so skip users that already exist.
+            test_users = [
+                ('admin', 'admin123', 'admin', admin_totp_secret),
+                ('admin2', 'admin123', 'admin', admin_totp_secret),  # Second admin with same TOTP
+                ('user', 'user123', 'file_manager', user_totp_secret)
+            ]
+            for username, password, role, totp_secret in test_users:
+                if not get_user_by_username(username):
+                    create_user(username, password, role, totp_secret)
+            
+            # Print TOTP secrets for initial setup (in production, these would be securely transmitted to users)
+            print("\nTOTP Setup Information:")
+            print(f"Admin TOTP Secret: {admin_totp_secret}")
+            print(f"User TOTP Secret: {user_totp_secret}")
+            
+            # Add test files to the content-addressed store, skipping ones that
+            # already exist so their ETag and Last-Modified survive restarts
+            test_files = [
+                ('DOC001', 'Top Secret Report 2025.txt', b"This is a top secret report. For admin eyes only.", 'admin'),
+                ('DOC002', 'Security Protocol Delta.txt', b"Security protocol documentation for file managers.", 'file_manager'),
+                ('DOC003', 'Operation Nightwatch.txt', b"Operation Nightwatch details and procedures.", 'file_manager'),
+                ('DOC004', 'Personnel Records.txt', b"Confidential personnel records and data.", 'file_manager')
+            ]
+            for file_id, filename, content, access_level in test_files:
+                cursor.execute("SELECT 1 FROM classified_files WHERE file_id = ?", (file_id,))
+                if not cursor.fetchone():
+                    store_classified_file(file_id, filename, content, access_level)
+
+            # Add test agents
+            cursor.execute("""
+                INSERT OR IGNORE INTO agents 
+                (agent_number, name, rank, status, clearance_level, last_mission, photo_url)
+                VALUES
+                    ('A001', 'John Smith', 'Senior Agent', 'Active', 'admin', 'Operation Phoenix', '/agents/a001.jpg'),
+                    ('A002', 'Sarah Connor', 'Field Agent', 'Active', 'file_manager', 'Operation Delta', '/agents/a002.jpg'),
+                    ('A003', 'James Wilson', 'Field Agent', 'On Leave', 'file_manager', 'Operation Echo', '/agents/a003.jpg'),
+                    ('A004', 'Emily Chen', 'Senior Agent', 'Active', 'admin', 'Operation Sierra', '/agents/a004.jpg'),
+                    ('A005', 'Michael Brown', 'Junior Agent', 'Training', 'file_manager', 'None', '/agents/a005.jpg')
+            """)
+
+            # Add test operations
+            cursor.execute("""
+                INSERT OR IGNORE INTO operations 
+                (operation_id, code_name, status, priority, start_date, end_date, description, involved_agents, target_location, classified_level)
+                VALUES
+                    ('OP001', 'Phoenix Rising', 'Active', 'High', 
+                     '2025-10-01 08:00:00', NULL,
+                     'High-priority operation targeting major security threat. Details classified.',
+                     '["A001", "A004"]', 'LOC001', 'admin'),
+                    
+                    ('OP002', 'Silent Echo', 'Completed', 'Medium',
+                     '2025-09-15 14:30:00', '2025-09-30 18:45:00',
+                     'Intelligence gathering operation in urban environment.',
+                     '["A002", "A003"]', 'LOC004', 'standard'),
+                    
+                    ('OP003', 'Blue Dawn', 'Active', 'High',
+                     '2025-10-05 06:00:00', NULL,
+                     'Critical asset protection and surveillance operation.',
+                     '["A001", "A002", "A004"]', 'LOC003', 'admin'),
+                    
+                    ('OP004', 'Desert Storm', 'Suspended', 'Medium',
+                     '2025-08-20 10:00:00', NULL,
+                     'Resource security operation in remote location.',
+                     '["A003", "A005"]', 'LOC002', 'standard'),
+                    
+                    ('OP005', 'Crystal Shield', 'Active', 'Low',
+                     '2025-10-10 09:00:00', NULL,
+                     'Standard security protocol implementation and training.',
+                     '["A005"]', 'LOC005', 'standard')
+            """)
+            sync_operation_agents(cursor)
+
+            # Add test locations
+            cursor.execute("""
+                INSERT OR IGNORE INTO locations 
+                (location_id, name, type, access_level, geolocation, contents, status, security_level)
+                VALUES
+                    ('LOC001', 'Sierra Safehouse', 'Weapon Cache', 'high', '40.7128° N, 74.0060° W', 
+                    'Heavy weapons, ammunition, tactical gear', 'Active', 'high'),
+                    ('LOC002', 'Delta Storage', 'Cash Stash', 'medium', '34.0522° N, 118.2437° W', 
+                    'Emergency funds, cryptocurrency cold storage', 'Active', 'standard'),
+                    ('LOC003', 'Echo Bunker', 'Safe Room', 'high', '51.5074° N, 0.1278° W', 
+                    'Emergency supplies, communications equipment', 'Active', 'high'),
+                    ('LOC004', 'Bravo Cache', 'Intel Stash', 'medium', '48.8566° N, 2.3522° E', 
+                    'Documents, hard drives, encryption keys', 'Active', 'standard'),
+                    ('LOC005', 'Alpha Point', 'Medical Cache', 'medium', '35.6762° N, 139.6503° E', 
+                    'Emergency medical supplies, field surgery equipment', 'Active', 'standard')
+            """)
+            
+            conn.commit()
+        except Exception as e:
+            print(f"Error initializing test data: {e}")
 
 init_test_data()
+move_blobs_to_store()
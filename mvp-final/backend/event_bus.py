@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+# Events a subscriber may have waiting before it is cut off
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class Subscription:
+    """
+    One consumer's view of an EventBus. Events are delivered on the event
+    loop that created the subscription; ``get()`` returns them in publish
+    order, or None once the subscriber has fallen too far behind. A cut-off
+    subscriber should catch up from durable storage and subscribe again.
+    """
+
+    def __init__(self, loop, queue_size):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def _deliver(self, events):
+        # Runs on self.loop
+        if self.closed:
+            return
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Drop the backlog and tell the consumer to resync
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                self.queue.put_nowait(None)
+                self.closed = True
+                return
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class EventBus:
+    """
+    In-process fan-out from any thread to asyncio subscribers.
+
+    ``publish`` is thread-safe and never blocks: it hands the events to each
+    subscriber's loop with call_soon_threadsafe. With no subscribers it does
+    nothing.
+    """
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """Subscribe from inside a running event loop."""
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, events):
+        """Deliver a list of events to every subscriber."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, events)
+            except RuntimeError:
+                # The subscriber's loop has been closed
+                self.unsubscribe(subscription)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._subscribers)
@@ -0,0 +1,53 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from database import POOL_SIZE
+
+# One worker per pooled connection, so a DB call never queues twice
+DB_WORKERS = POOL_SIZE
+# pbkdf2 releases the GIL, so hashing scales with cores; keep it well below the
+# DB pool so a burst of logins cannot starve the read endpoints
+HASH_WORKERS = max(2, (os.cpu_count() or 2) // 2)
+# Reads from the on-disk file store while streaming downloads
+FILE_WORKERS = 8
+# Rate limit checks against a shared backend (e.g. SQLite); separate from the
+# DB pool so waiting on the rate limit lock never delays queries
+RATE_LIMIT_WORKERS = 4
+
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+file_executor = ThreadPoolExecutor(max_workers=FILE_WORKERS, thread_name_prefix="file-store")
+rate_limit_executor = ThreadPoolExecutor(max_workers=RATE_LIMIT_WORKERS, thread_name_prefix="rate-limit")
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database helper on the DB executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, partial(func, *args, **kwargs))
+
+
+async def run_hash(func, *args, **kwargs):
+    """Run password hashing/verification on its own bounded executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, partial(func, *args, **kwargs))
+
+
+async def run_file(func, *args, **kwargs):
+    """Run blocking file-store I/O on its own executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(file_executor, partial(func, *args, **kwargs))
+
+
+async def run_rate_limit(func, *args, **kwargs):
+    """Run a blocking rate limit backend call on its own executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(rate_limit_executor, partial(func, *args, **kwargs))
+
+
+def shutdown():
+    db_executor.shutdown(wait=True)
+    hash_executor.shutdown(wait=True)
+    file_executor.shutdown(wait=True)
+    rate_limit_executor.shutdown(wait=True)
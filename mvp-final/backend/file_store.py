@@ -0,0 +1,54 @@
+import hashlib
+import os
+import tempfile
+
+# Content-addressed object store: each distinct file body is written once, to
+# objects/<first 2 hex chars>/<sha256>, no matter how many rows point at it
+STORE_DIR = os.path.join("classified_files", "objects")
+
+
+def object_path(digest):
+    return os.path.join(STORE_DIR, digest[:2], digest)
+
+
+def put_chunks(chunks):
+    """
+    Write an iterable of byte chunks to the store, hashing as it goes.
+    Returns (sha256 hex digest, size). Content that is already stored is not
+    written a second time.
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    sha256 = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=STORE_DIR, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            for chunk in chunks:
+                sha256.update(chunk)
+                size += len(chunk)
+                tmp.write(chunk)
+
+        digest = sha256.hexdigest()
+        path = object_path(digest)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        return digest, size
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def put(data):
+    """Store a bytes object. Returns (sha256 hex digest, size)."""
+    return put_chunks([data])
+
+
+def read_chunk(digest, offset, size):
+    """Read up to ``size`` bytes of a stored object starting at ``offset``."""
+    with open(object_path(digest), "rb") as f:
+        f.seek(offset)
+        return f.read(size)
@@ -1,16 +1,21 @@
 import os
-import io
-from fastapi import FastAPI, Body, HTTPException, Header, Depends
-from fastapi.responses import StreamingResponse
+import json
+import asyncio
+from fastapi import FastAPI, Body, HTTPException, Header, Depends, Query
+from fastapi.responses import Response, StreamingResponse
 from typing import Optional, List
 from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
 import jwt
+import file_store
 from database import (
     get_classified_files, 
+    get_classified_file_info,
+    read_classified_file_chunk,
+    FILE_CHUNK_SIZE,
     verify_auth_token, 
-    get_user_by_token, 
     update_auth_token,
     verify_totp,
     get_agents,
@@ -19,15 +24,43 @@ from database import (
     get_location_by_id,
     get_operations,
     get_operation_by_id,
-    authenticate_user,
+    get_login_candidate,
+    record_login_attempt,
+    verify_password,
     get_audit_logs,
-    conn
+    load_user_by_token,
+    session_cache,
+    MAX_PAGE_SIZE
 )
 
-from database import log_activity
+from database import log_activity, audit_writer
+from audit_feed import follow_audit_logs
+import executors
+from executors import run_db, run_hash, run_file, run_rate_limit
 
 app = FastAPI()
 
+# Set IN_PROCESS_MONITOR=1 to run the security_monitor_v2 anomaly detector
+# inside the API, fed directly by the audit writer, instead of as its own process
+IN_PROCESS_MONITOR = os.environ.get("IN_PROCESS_MONITOR", "0") == "1"
+anomaly_task = None
+
+@app.on_event("startup")
+async def start_anomaly_detector():
+    global anomaly_task
+    if IN_PROCESS_MONITOR:
+        # Imported here so the API does not need scikit-learn unless this is on
+        import anomaly_consumer
+        anomaly_task = asyncio.create_task(anomaly_consumer.run_anomaly_detector())
+
+@app.on_event("shutdown")
+def flush_audit_logs():
+    if anomaly_task is not None:
+        anomaly_task.cancel()
+    # Let in-flight DB work finish, then write out any audit rows still queued
+    executors.shutdown()
+    audit_writer.stop()
+
 # CORS middleware configuration
 app.add_middleware(
     CORSMiddleware,
@@ -43,44 +76,72 @@ SECRET_KEY = "JBSWY3DPEHPK3PXP"
 
 # Rate limiting settings
 from fastapi import Request
+from fastapi.responses import JSONResponse
 from datetime import datetime, timedelta
-from collections import defaultdict
+from rate_limit import SlidingWindowLimiter, create_backend
 
-# Store IP: [(timestamp, endpoint), ...]
-rate_limit_store = defaultdict(list)
 RATE_LIMIT_DURATION = timedelta(minutes=15)  # Window duration
 MAX_REQUESTS = 100  # Max requests per window
 MAX_FAILED_LOGIN = 50  # Max failed login attempts
+# "memory" keeps counters per process; use "sqlite" when running several
+# uvicorn workers so they share one budget (and it survives restarts)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+
+# One counter pair per client IP; /login gets its own, tighter budget
+rate_limit_backend = create_backend(RATE_LIMIT_BACKEND)
+request_limiter = SlidingWindowLimiter(
+    MAX_REQUESTS, RATE_LIMIT_DURATION.total_seconds(), rate_limit_backend, scope="requests"
+)
+login_limiter = SlidingWindowLimiter(
+    MAX_FAILED_LOGIN, RATE_LIMIT_DURATION.total_seconds(), rate_limit_backend, scope="login"
+)
+
+def too_many_requests(limiter, client_ip, detail):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": detail},
+        headers={"Retry-After": str(limiter.retry_after(client_ip))}
+    )
+
+def rate_limit_unavailable():
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Login is temporarily unavailable. Please try again later."},
+        headers={"Retry-After": "1"}
+    )
+
+async def limiter_hit(limiter, client_ip):
+    """limiter.hit(client_ip), off the event loop if its backend does I/O. None if the backend failed."""
+    try:
+        if limiter.blocking:
+            return await run_rate_limit(limiter.hit, client_ip)
+        return limiter.hit(client_ip)
+    except Exception as e:
+        # e.g. "database is locked" from the SQLite backend
+        print(f"Rate limit backend error ({limiter.scope}): {e}")
+        return None
 
 async def rate_limit_middleware(request: Request, call_next):
     client_ip = request.client.host
-    now = datetime.utcnow()
     
-    # Clean up old entries
-    rate_limit_store[client_ip] = [
-        hit for hit in rate_limit_store[client_ip]
-        if now - hit[0] < RATE_LIMIT_DURATION
-    ]
+    # Check rate limit. This budget fails open: a broken rate limit store
+    # should not take the whole API down
+    if await limiter_hit(request_limiter, client_ip) is False:
+        return too_many_requests(request_limiter, client_ip, "Too many requests")
     
-    # Check rate limit
-    if len(rate_limit_store[client_ip]) >= MAX_REQUESTS:
-        raise HTTPException(status_code=429, detail="Too many requests")
-    
-    # Check failed login attempts for /login endpoint
+    # Check failed login attempts for /login endpoint. This budget is what
+    # stops password guessing, so it fails closed
     if request.url.path == "/login":
-        failed_attempts = sum(
-            1 for hit in rate_limit_store[client_ip]
-            if hit[1] == "/login" and now - hit[0] < RATE_LIMIT_DURATION
-        )
-        if failed_attempts >= MAX_FAILED_LOGIN:
-            raise HTTPException(
-                status_code=429, 
-                detail="Too many failed login attempts. Please try again later."
+        allowed = await limiter_hit(login_limiter, client_ip)
+        if allowed is None:
+            return rate_limit_unavailable()
+        if not allowed:
+            return too_many_requests(
+                login_limiter,
+                client_ip,
+                "Too many failed login attempts. Please try again later."
             )
     
-    # Add current request
-    rate_limit_store[client_ip].append((now, request.url.path))
-    
     response = await call_next(request)
     return response
 
@@ -95,18 +156,27 @@ class FileResponse(BaseModel):
     files: List[dict]
     username: str
     role: str
+    next_after: Optional[str] = None
 
 class AgentResponse(BaseModel):
     agents: List[dict]
     username: str
     role: str
+    next_after: Optional[str] = None
 
 class LocationResponse(BaseModel):
     locations: List[dict]
     username: str
     role: str
+    next_after: Optional[str] = None
+
+def parse_fields(fields):
+    """Split a comma-separated ?fields= value; None means the list's default columns."""
+    if not fields:
+        return None
+    return [name.strip() for name in fields.split(",") if name.strip()]
 
-def get_current_user(authorization: str = Header(None)):
+async def get_current_user(authorization: str = Header(None)):
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Invalid authentication token")
     
@@ -120,8 +190,10 @@ def get_current_user(authorization: str = Header(None)):
         except jwt.InvalidTokenError:
             raise HTTPException(status_code=401, detail="Invalid token format")
         
-        # Verify token in database
-        user = get_user_by_token(token)
+        # Verify token against the session cache; only a miss goes to the DB pool
+        user = session_cache.get(token)
+        if not user:
+            user = await run_db(load_user_by_token, token)
         if not user:
             raise HTTPException(status_code=401, detail="Token not found in database")
             
@@ -136,16 +208,26 @@ def get_current_user(authorization: str = Header(None)):
         raise HTTPException(status_code=401, detail="Authentication failed")
 
 @app.post("/login")
-def login(auth: AuthRequest):
+async def login(auth: AuthRequest):
     try:
-        # First verify username and password using database
-        user = authenticate_user(auth.username, auth.password)
+        # First verify username and password using database. The pbkdf2 check
+        # runs on the hashing pool so a burst of logins can't tie up the DB workers.
+        user = await run_db(get_login_candidate, auth.username)
+        if user:
+            try:
+                password_ok = await run_hash(verify_password, auth.password, user['password_hash'])
+            except Exception as e:
+                # e.g. the placeholder reset_user_credentials writes, which is not a hash;
+                # still counted as a failed attempt below
+                print(f"Authentication error: {e}")
+                password_ok = False
+            user = await run_db(record_login_attempt, user, password_ok)
         if not user:
             log_activity(auth.username, "unknown", "login_failed", "Invalid username or password")
             raise HTTPException(status_code=401, detail="Invalid credentials")
 
         # Then verify TOTP
-        if not verify_totp(auth.username, auth.totp_code):
+        if not await run_db(verify_totp, auth.username, auth.totp_code):
             log_activity(auth.username, user['role'], "login_failed", "Invalid TOTP code")
             raise HTTPException(status_code=401, detail="Invalid TOTP code")
 
@@ -161,7 +243,7 @@ def login(auth: AuthRequest):
         )
         
         # Update the user's current auth token in database
-        if update_auth_token(user['username'], token):
+        if await run_db(update_auth_token, user['username'], token):
             log_activity(user['username'], user['role'], "login_success", "Successfully logged in")
             return {
                 "token": token,
@@ -179,9 +261,20 @@ def login(auth: AuthRequest):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.get("/files")
-async def get_files(current_user: dict = Depends(get_current_user)):
+async def get_files(
+    current_user: dict = Depends(get_current_user),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
     try:
-        files = get_classified_files(current_user["role"])
+        try:
+            files, next_after = await run_db(
+                get_classified_files, current_user["role"],
+                limit=limit, after=after, fields=parse_fields(fields)
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         log_activity(
             current_user["username"],
             current_user["role"],
@@ -191,8 +284,11 @@ async def get_files(current_user: dict = Depends(get_current_user)):
         return FileResponse(
             files=files,
             username=current_user["username"],
-            role=current_user["role"]
+            role=current_user["role"],
+            next_after=next_after
         )
+    except HTTPException:
+        raise
     except Exception as e:
         log_activity(
             current_user["username"],
@@ -202,20 +298,56 @@ async def get_files(current_user: dict = Depends(get_current_user)):
         )
         raise HTTPException(status_code=500, detail="Error retrieving files")
 
+def parse_range(range_header, size):
+    """
+    Parse a single-range "bytes=..." header into an inclusive (start, end).
+    Returns None if the range can't be satisfied for a file of ``size`` bytes.
+    """
+    try:
+        unit, _, spec = range_header.partition("=")
+        if unit.strip() != "bytes" or "," in spec:
+            return None
+        first, _, last = spec.strip().partition("-")
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # "bytes=-N" means the last N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, end
+
+async def stream_file(file, start, end):
+    # Read one chunk at a time so memory stays flat whatever the file size
+    position = start
+    while position <= end:
+        size = min(FILE_CHUNK_SIZE, end - position + 1)
+        if file["content_hash"]:
+            chunk = await run_file(file_store.read_chunk, file["content_hash"], position, size)
+        else:
+            # Row not yet moved to the file store; read its BLOB
+            chunk = await run_db(read_classified_file_chunk, file["row_id"], position, size)
+        if not chunk:
+            break
+        position += len(chunk)
+        yield chunk
+
 @app.get("/files/{file_id}")
 @app.get("/get_file/{file_id}")  # Keep old endpoint for backwards compatibility
 @app.get("/files/{file_id}")
-async def get_file(file_id: str, user=Depends(get_current_user)):
+async def get_file(
+    file_id: str,
+    user=Depends(get_current_user),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None)
+):
     try:
-        cur = conn.cursor()
-        
         # First check if the file exists
-        cur.execute("""
-            SELECT filename, file_data, access_level 
-            FROM classified_files 
-            WHERE file_id = ?
-        """, (file_id,))
-        file = cur.fetchone()
+        file = await run_db(get_classified_file_info, file_id)
 
         if file is None:
             log_activity(
@@ -226,7 +358,9 @@ async def get_file(file_id: str, user=Depends(get_current_user)):
             )
             raise HTTPException(status_code=404, detail="File not found")
 
-        filename, file_data, access_level = file
+        filename = file["filename"]
+        access_level = file["access_level"]
+        size = file["size"]
         
         # Check user's role against file access level
         if user["role"] == "admin":
@@ -242,6 +376,45 @@ async def get_file(file_id: str, user=Depends(get_current_user)):
                 detail="You don't have permission to access this file"
             )
         
+        headers = {
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Accept-Ranges": "bytes"
+        }
+        if file["modified_at"]:
+            modified_at = datetime.strptime(file["modified_at"], '%Y-%m-%d %H:%M:%S')
+            headers["Last-Modified"] = format_datetime(modified_at.replace(tzinfo=timezone.utc), usegmt=True)
+        if file["content_hash"]:
+            etag = f'"{file["content_hash"]}"'
+            headers["ETag"] = etag
+
+            # Only answered after the access check above, so a 304 leaks nothing
+            if if_none_match and (
+                if_none_match.strip() == "*"
+                or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            ):
+                log_activity(
+                    user["username"],
+                    user["role"],
+                    "file_not_modified",
+                    f"Cached copy of file still current: {filename} (ID: {file_id})"
+                )
+                return Response(status_code=304, headers=headers)
+
+        status_code = 200
+        start, end = 0, size - 1
+        if range_header:
+            byte_range = parse_range(range_header, size)
+            if byte_range is None:
+                raise HTTPException(
+                    status_code=416,
+                    detail="Requested range not satisfiable",
+                    headers={"Content-Range": f"bytes */{size}"}
+                )
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+
         log_activity(
             user["username"],
             user["role"],
@@ -249,10 +422,13 @@ async def get_file(file_id: str, user=Depends(get_current_user)):
             f"Downloaded file: {filename} (ID: {file_id})"
         )
         return StreamingResponse(
-            io.BytesIO(file_data),
+            stream_file(file, start, end),
+            status_code=status_code,
             media_type="application/octet-stream",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+            headers=headers
         )
+    except HTTPException:
+        raise
     except Exception as e:
         log_activity(
             user["username"],
@@ -265,7 +441,7 @@ async def get_file(file_id: str, user=Depends(get_current_user)):
 @app.get("/agents/{agent_id}")
 async def get_agent_details(agent_id: str, current_user: dict = Depends(get_current_user)):
     try:
-        agent = get_agent_by_id(agent_id, current_user["role"])
+        agent = await run_db(get_agent_by_id, agent_id, current_user["role"])
         if not agent:
             log_activity(
                 current_user["username"],
@@ -298,9 +474,21 @@ async def get_agent_details(agent_id: str, current_user: dict = Depends(get_curr
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/locations")
-async def get_location_list(current_user: dict = Depends(get_current_user)):
+async def get_location_list(
+    current_user: dict = Depends(get_current_user),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    status: Optional[str] = None
+):
     try:
-        locations = get_locations(current_user["role"])
+        try:
+            locations, next_after = await run_db(
+                get_locations, current_user["role"],
+                limit=limit, after=after, fields=parse_fields(fields), status=status
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         log_activity(
             current_user["username"],
             current_user["role"],
@@ -310,8 +498,11 @@ async def get_location_list(current_user: dict = Depends(get_current_user)):
         return LocationResponse(
             locations=locations,
             username=current_user["username"],
-            role=current_user["role"]
+            role=current_user["role"],
+            next_after=next_after
         )
+    except HTTPException:
+        raise
     except Exception as e:
         log_activity(
             current_user["username"],
@@ -324,7 +515,7 @@ async def get_location_list(current_user: dict = Depends(get_current_user)):
 @app.get("/locations/{location_id}")
 async def get_location_details(location_id: str, current_user: dict = Depends(get_current_user)):
     try:
-        location = get_location_by_id(location_id, current_user["role"])
+        location = await run_db(get_location_by_id, location_id, current_user["role"])
         if not location:
             log_activity(
                 current_user["username"],
@@ -357,9 +548,21 @@ async def get_location_details(location_id: str, current_user: dict = Depends(ge
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/agents")
-async def get_agent_list(current_user: dict = Depends(get_current_user)):
+async def get_agent_list(
+    current_user: dict = Depends(get_current_user),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    status: Optional[str] = None
+):
     try:
-        agents = get_agents(current_user["role"])
+        try:
+            agents, next_after = await run_db(
+                get_agents, current_user["role"],
+                limit=limit, after=after, fields=parse_fields(fields), status=status
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         log_activity(
             current_user["username"],
             current_user["role"],
@@ -369,8 +572,11 @@ async def get_agent_list(current_user: dict = Depends(get_current_user)):
         return AgentResponse(
             agents=agents,
             username=current_user["username"],
-            role=current_user["role"]
+            role=current_user["role"],
+            next_after=next_after
         )
+    except HTTPException:
+        raise
     except Exception as e:
         log_activity(
             current_user["username"],
@@ -384,6 +590,32 @@ class OperationResponse(BaseModel):
     operations: List[dict]
     username: str
     role: str
+    next_after: Optional[str] = None
+
+# Rows fetched per database round trip while streaming /logs/stream
+LOG_STREAM_PAGE_SIZE = 1000
+
+def encode_log_cursor(cursor):
+    return f"{cursor[0]},{cursor[1]}" if cursor else None
+
+def decode_log_cursor(cursor):
+    """Parse a "timestamp,id" cursor from a previous /logs page."""
+    if not cursor:
+        return None
+    timestamp, _, log_id = cursor.rpartition(",")
+    try:
+        return timestamp, int(log_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid logs cursor")
+
+def require_admin_for_logs(current_user):
+    # Only admin can view logs
+    if current_user["role"] != "admin":
+        log_activity(current_user["username"], current_user["role"], "logs_access_denied", "Attempted to access logs without admin role")
+        raise HTTPException(
+            status_code=403,
+            detail="Only admin users can view logs"
+        )
 
 @app.get("/logs")
 async def get_logs(
@@ -392,23 +624,25 @@ async def get_logs(
     role: Optional[str] = None,
     start_time: Optional[str] = None,
     end_time: Optional[str] = None,
-    limit: int = 100
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    after_id: Optional[int] = Query(None, ge=0)
 ):
-    # Only admin can view logs
-    if current_user["role"] != "admin":
-        log_activity(current_user["username"], current_user["role"], "logs_access_denied", "Attempted to access logs without admin role")
-        raise HTTPException(
-            status_code=403,
-            detail="Only admin users can view logs"
-        )
+    require_admin_for_logs(current_user)
+    if cursor and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either cursor or after_id, not both")
+    position = decode_log_cursor(cursor)
     
     try:
-        logs = get_audit_logs(
+        logs, next_cursor = await run_db(
+            get_audit_logs,
             username=username,
             role=role,
             start_time=start_time,
             end_time=end_time,
-            limit=limit
+            limit=limit,
+            cursor=position,
+            after_id=after_id
         )
         
         # Log the successful retrieval of logs
@@ -417,7 +651,8 @@ async def get_logs(
             "role": role,
             "start_time": start_time,
             "end_time": end_time,
-            "limit": limit
+            "limit": limit,
+            "after_id": after_id
         }
         log_activity(
             current_user["username"],
@@ -426,9 +661,18 @@ async def get_logs(
             f"Retrieved {len(logs)} logs with filters: {filters}"
         )
         
+        if after_id is not None:
+            # Incremental feed: the caller keeps last_id and passes it back as after_id
+            return {
+                "logs": logs,
+                "total": len(logs),
+                "last_id": logs[-1]["id"] if logs else after_id,
+                "has_more": next_cursor is not None
+            }
         return {
             "logs": logs,
-            "total": len(logs)
+            "total": len(logs),
+            "next_cursor": encode_log_cursor(next_cursor)
         }
     except Exception as e:
         log_activity(
@@ -442,43 +686,118 @@ async def get_logs(
             detail=f"Error retrieving logs: {str(e)}"
         )
 
+async def stream_logs(current_user, filters, position):
+    """
+    Yield NDJSON lines, one page per DB round trip. Each page is fetched on
+    the DB executor and released before yielding, so no pooled connection is
+    held while the client reads and memory stays at one page.
+
+    The 200 has already been sent by the time a later page fails, so an
+    error ends the body with an {"error": ...} line instead; a body whose
+    last line is a log was exported in full.
+    """
+    try:
+        while True:
+            logs, position = await run_db(
+                get_audit_logs, limit=LOG_STREAM_PAGE_SIZE, cursor=position, **filters
+            )
+            if logs:
+                yield "".join(json.dumps(log) + "\n" for log in logs)
+            if position is None:
+                break
+    except Exception as e:
+        print(f"Error streaming logs: {e}")
+        log_activity(
+            current_user["username"],
+            current_user["role"],
+            "logs_error",
+            f"Error streaming logs: {str(e)}"
+        )
+        yield json.dumps({"error": "Error streaming logs, export incomplete"}) + "\n"
+
+@app.get("/logs/stream")
+async def export_logs(
+    current_user: dict = Depends(get_current_user),
+    username: Optional[str] = None,
+    role: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    cursor: Optional[str] = None
+):
+    require_admin_for_logs(current_user)
+    position = decode_log_cursor(cursor)
+
+    filters = {
+        "username": username,
+        "role": role,
+        "start_time": start_time,
+        "end_time": end_time
+    }
+    log_activity(
+        current_user["username"],
+        current_user["role"],
+        "logs_exported",
+        f"Streaming logs with filters: {filters}"
+    )
+    return StreamingResponse(stream_logs(current_user, filters, position), media_type="application/x-ndjson")
+
+# Seconds between SSE comments sent to keep idle connections open through proxies
+SSE_KEEPALIVE_INTERVAL = 15
+
+def sse_event(log):
+    return f"id: {log['id']}\ndata: {json.dumps(log)}\n\n"
+
+async def audit_event_stream(last_id):
+    async for log in follow_audit_logs(last_id, idle_timeout=SSE_KEEPALIVE_INTERVAL):
+        yield sse_event(log) if log is not None else ": keep-alive\n\n"
+
+@app.get("/logs/events")
+async def follow_logs(
+    current_user: dict = Depends(get_current_user),
+    after_id: Optional[int] = Query(None, ge=0),
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID")
+):
+    require_admin_for_logs(current_user)
+
+    # An explicit after_id wins; otherwise resume from the browser's Last-Event-ID
+    start_id = after_id if after_id is not None else last_event_id
+    log_activity(
+        current_user["username"],
+        current_user["role"],
+        "logs_followed",
+        f"Following live logs after id {start_id}"
+    )
+    return StreamingResponse(
+        audit_event_stream(start_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/monitor/status")
+async def get_monitor_status(current_user: dict = Depends(get_current_user)):
+    require_admin_for_logs(current_user)
+    if not IN_PROCESS_MONITOR:
+        return {"in_process": False}
+    import anomaly_consumer
+    return {"in_process": True, **anomaly_consumer.detector_status}
+
 @app.get("/operations")
 async def get_operation_list(
     current_user: dict = Depends(get_current_user),
-    authorization: str = Header(None)
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    status: Optional[str] = None
 ):
     try:
-        # Verify token and expiry
-        token = authorization.split(" ")[1]
+        # Get operations from database with username for audit logging
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            if datetime.utcnow() > datetime.fromtimestamp(payload["exp"]):
-                log_activity(
-                    current_user["username"],
-                    current_user["role"],
-                    "token_expired",
-                    "Attempted to access operations with expired token"
-                )
-                raise HTTPException(status_code=401, detail="Token has expired")
-            if payload["username"] != current_user["username"] or payload["role"] != current_user["role"]:
-                log_activity(
-                    current_user["username"],
-                    current_user["role"],
-                    "token_mismatch",
-                    "Token data mismatch when accessing operations"
-                )
-                raise HTTPException(status_code=401, detail="Token data mismatch")
-        except jwt.InvalidTokenError:
-            log_activity(
-                current_user["username"],
-                current_user["role"],
-                "invalid_token",
-                "Invalid token when accessing operations"
+            operations, next_after = await run_db(
+                get_operations, current_user["username"], current_user["role"],
+                limit=limit, after=after, fields=parse_fields(fields), status=status
             )
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        # Get operations from database with username for audit logging
-        operations = get_operations(current_user["username"], current_user["role"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         log_activity(
             current_user["username"],
@@ -490,7 +809,8 @@ async def get_operation_list(
         return OperationResponse(
             operations=operations,
             username=current_user["username"],
-            role=current_user["role"]
+            role=current_user["role"],
+            next_after=next_after
         )
     except HTTPException:
         raise
@@ -503,44 +823,71 @@ async def get_operation_list(
         )
         raise HTTPException(status_code=500, detail="Error retrieving operations")
 
-@app.get("/operations/{operation_id}")
-async def get_operation_details(
-    operation_id: str,
+@app.get("/agents/{agent_id}/operations")
+async def get_agent_operations(
+    agent_id: str,
     current_user: dict = Depends(get_current_user),
-    authorization: str = Header(None)
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    status: Optional[str] = None
 ):
     try:
-        # Verify token and expiry
-        token = authorization.split(" ")[1]
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            if datetime.utcnow() > datetime.fromtimestamp(payload["exp"]):
-                log_activity(
-                    current_user["username"],
-                    current_user["role"],
-                    "token_expired",
-                    f"Attempted to access operation {operation_id} with expired token"
-                )
-                raise HTTPException(status_code=401, detail="Token has expired")
-            if payload["username"] != current_user["username"] or payload["role"] != current_user["role"]:
-                log_activity(
-                    current_user["username"],
-                    current_user["role"],
-                    "token_mismatch",
-                    f"Token data mismatch when accessing operation {operation_id}"
-                )
-                raise HTTPException(status_code=401, detail="Token data mismatch")
-        except jwt.InvalidTokenError:
+        # Only answer for agents the role is allowed to see
+        agent = await run_db(get_agent_by_id, agent_id, current_user["role"])
+        if not agent:
             log_activity(
                 current_user["username"],
                 current_user["role"],
-                "invalid_token",
-                f"Invalid token when accessing operation {operation_id}"
+                "agent_not_found",
+                f"Attempted to list operations of non-existent or unauthorized agent: {agent_id}"
+            )
+            raise HTTPException(
+                status_code=404,
+                detail="Agent not found or you don't have permission to view this agent's details"
+            )
+
+        try:
+            operations, next_after = await run_db(
+                get_operations, current_user["username"], current_user["role"], agent_number=agent_id,
+                limit=limit, after=after, fields=parse_fields(fields), status=status
             )
-            raise HTTPException(status_code=401, detail="Invalid token")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
+        log_activity(
+            current_user["username"],
+            current_user["role"],
+            "agent_operations_listed",
+            f"Retrieved {len(operations)} operations for agent {agent_id}"
+        )
+
+        return OperationResponse(
+            operations=operations,
+            username=current_user["username"],
+            role=current_user["role"],
+            next_after=next_after
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_activity(
+            current_user["username"],
+            current_user["role"],
+            "operations_error",
+            f"Error retrieving operations for agent {agent_id}: {str(e)}"
+        )
+        raise HTTPException(status_code=500, detail="Error retrieving operations")
+
+@app.get("/operations/{operation_id}")
+async def get_operation_details(
+    operation_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    try:
         # Get operation with enhanced security and audit logging
-        operation = get_operation_by_id(
+        operation = await run_db(
+            get_operation_by_id,
             operation_id, 
             current_user["username"], 
             current_user["role"]
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# Trained model artifacts, one file per model name and training fingerprint
+MODEL_DIR = "models"
+
+
+def fingerprint(*parts):
+    """Stable SHA-256 of JSON-serializable training inputs (specs, params, versions)."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def data_hash(data):
+    """SHA-256 of a training matrix: its values, plus column names for a DataFrame."""
+    sha256 = hashlib.sha256()
+    if isinstance(data, pd.DataFrame):
+        sha256.update(json.dumps(list(map(str, data.columns))).encode())
+        data = data.to_numpy(dtype=float)
+    sha256.update(np.ascontiguousarray(data).tobytes())
+    return sha256.hexdigest()
+
+
+def artifact_path(name, key):
+    return os.path.join(MODEL_DIR, f"{name}-{key[:16]}.joblib")
+
+
+def save_model(name, key, model, scaler, **metadata):
+    """
+    Store a fitted model and scaler under ``name`` and training fingerprint
+    ``key``, with any extra metadata (schema version, data hash, ...).
+    Written uncompressed so load_model can memory-map the arrays.
+    """
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    artifact = {
+        'model': model,
+        'scaler': scaler,
+        'key': key,
+        'created_at': datetime.utcnow().isoformat(),
+        **metadata
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=MODEL_DIR, prefix=".model-")
+    os.close(fd)
+    try:
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, artifact_path(name, key))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return artifact
+
+
+def load_model(name, key):
+    """
+    Load the artifact stored for ``name`` and ``key``, or None if there is
+    none (or it can't be read). Large arrays are memory-mapped read-only
+    rather than copied into memory.
+    """
+    path = artifact_path(name, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        artifact = joblib.load(path, mmap_mode='r')
+    except Exception as e:
+        print(f"Error loading model artifact {path}: {e}")
+        return None
+    return artifact if artifact.get('key') == key else None
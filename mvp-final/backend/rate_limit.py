@@ -0,0 +1,183 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+RATE_LIMIT_DB = "rate_limits.db"
+
+
+def advance(state, now, window):
+    """Roll a [window_start, current_count, previous_count] state forward to ``now``."""
+    window_start = now - (now % window)
+    if state[0] != window_start:
+        # Anything older than the previous window no longer counts
+        previous = state[1] if window_start - state[0] == window else 0
+        state[0], state[1], state[2] = window_start, 0, previous
+    return state
+
+
+def estimate(state, now, window):
+    """Hits in the last ``window`` seconds, weighting the previous window by its overlap."""
+    overlap = 1 - (now - state[0]) / window
+    return state[2] * overlap + state[1]
+
+
+class MemoryRateLimitBackend:
+    """
+    Counters held in this process. Fast, but every worker process gets its own
+    budget and the counters are lost on restart.
+
+    Keys are kept in least-recently-used order; keys idle for two full windows
+    (whose counts can no longer matter) are evicted as new hits come in, and
+    ``max_keys`` caps memory if a flood of distinct clients arrives at once.
+    """
+
+    # hit() never waits on I/O, so it can run on the event loop
+    blocking = False
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._state = OrderedDict()  # (scope, key) -> [window_start, current_count, previous_count]
+        self._lock = threading.Lock()
+
+    def hit(self, scope, key, limit, window, now):
+        with self._lock:
+            state = self._state.get((scope, key))
+            if state is None:
+                state = self._state[(scope, key)] = [now - (now % window), 0, 0]
+            advance(state, now, window)
+            self._state.move_to_end((scope, key))
+
+            allowed = estimate(state, now, window) < limit
+            if allowed:
+                state[1] += 1
+
+            while self._state:
+                oldest = next(iter(self._state.values()))
+                if len(self._state) <= self.max_keys and now - oldest[0] < 2 * window:
+                    break
+                self._state.popitem(last=False)
+            return allowed
+
+    def __len__(self):
+        return len(self._state)
+
+
+class SQLiteRateLimitBackend:
+    """
+    Counters kept in a SQLite table in WAL mode, shared by every worker process
+    on the host and kept across restarts. Each hit is one short
+    ``BEGIN IMMEDIATE`` transaction, so concurrent workers serialize on the
+    read-modify-write of a key instead of racing it.
+    """
+
+    # hit() may wait on the database lock; run it off the event loop
+    blocking = True
+
+    def __init__(self, path=RATE_LIMIT_DB, cleanup_every=1000, timeout=1):
+        self.path = path
+        self.cleanup_every = cleanup_every
+        self.timeout = timeout
+        self._local = threading.local()
+        self._hits = 0
+
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                window_start REAL NOT NULL,
+                current_count INTEGER NOT NULL,
+                previous_count INTEGER NOT NULL,
+                PRIMARY KEY (scope, key)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limits_window ON rate_limits (scope, window_start)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; transactions are opened explicitly in hit()
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, scope, key, limit, window, now):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("""
+                SELECT window_start, current_count, previous_count
+                FROM rate_limits
+                WHERE scope = ? AND key = ?
+            """, (scope, key)).fetchone()
+            state = advance(list(row) if row else [now - (now % window), 0, 0], now, window)
+
+            allowed = estimate(state, now, window) < limit
+            if allowed:
+                state[1] += 1
+
+            conn.execute("""
+                INSERT INTO rate_limits (scope, key, window_start, current_count, previous_count)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (scope, key) DO UPDATE SET
+                    window_start = excluded.window_start,
+                    current_count = excluded.current_count,
+                    previous_count = excluded.previous_count
+            """, (scope, key, *state))
+
+            self._hits += 1
+            if self._hits % self.cleanup_every == 0:
+                # Drop keys idle for two windows; their counts can no longer matter
+                conn.execute(
+                    "DELETE FROM rate_limits WHERE scope = ? AND window_start < ?",
+                    (scope, now - 2 * window)
+                )
+            conn.execute("COMMIT")
+            return allowed
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window-counter rate limiter with fixed memory per key.
+
+    Each key keeps only the start of its current fixed window plus the hit
+    counts for that window and the one before it, so a check is O(1) no matter
+    how many requests a client has made. Where the counters live is up to the
+    backend; limiters sharing a backend are kept apart by ``scope``.
+    """
+
+    def __init__(self, limit, window, backend=None, scope="default", clock=time.time):
+        self.limit = limit
+        self.window = window
+        self.backend = backend if backend is not None else MemoryRateLimitBackend()
+        self.scope = scope
+        self.clock = clock
+
+    @property
+    def blocking(self):
+        """True if hit() can block on I/O (see the backend's ``blocking``)."""
+        return self.backend.blocking
+
+    def hit(self, key):
+        """Count one hit for ``key``. Returns False (without counting) if over the limit."""
+        return self.backend.hit(self.scope, key, self.limit, self.window, self.clock())
+
+    def retry_after(self, key):
+        """Seconds until the current window rolls over."""
+        now = self.clock()
+        return int(self.window - (now % self.window)) + 1
+
+
+def create_backend(name):
+    """Build a rate limit backend from its config name ("memory" or "sqlite")."""
+    if name == "memory":
+        return MemoryRateLimitBackend()
+    if name == "sqlite":
+        return SQLiteRateLimitBackend()
+    raise ValueError(f"Unknown rate limit backend: {name}")
@@ -1,168 +1,391 @@
 import pandas as pd
 import numpy as np
+import sklearn
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 import requests
 import json
+import os
 import pyotp
 import time
-from datetime import datetime, timedelta
+import queue
+import threading
+from datetime import datetime
 import sqlite3
+import credentials_stamp
+import model_registry
+import synthetic_data
 
 # Configuration
 API_URL = "http://localhost:8000"
 ADMIN_TOKEN = None
-CHECK_INTERVAL = 30  # seconds between checks
+RECONNECT_DELAY = 5  # seconds to wait before reconnecting to the log stream
+STREAM_READ_TIMEOUT = 60  # the server sends a keep-alive every 15 s
 SESSION_SIZE = 10   # events per session
 ANOMALY_THRESHOLD = -0.5
+CHECKPOINT_FILE = "security_monitor_v2.checkpoint"  # id of the last log processed
 
 # Database connection
 conn = sqlite3.connect("secure.db", check_same_thread=False)
 cursor = conn.cursor()
 
-def generate_baseline_sessions():
-    """Generate baseline normal behavior patterns"""
-    baseline_sessions = []
-    
-    # Normal admin behavior patterns
-    normal_patterns = [
-        # Pattern 1: Regular log review
-        {
-            'actions': ['login_success', 'logs_retrieved', 'logs_retrieved', 'logs_retrieved', 
-                       'file_accessed', 'file_accessed', 'agent_accessed', 'location_accessed', 
-                       'operation_accessed', 'logout'],
-            'durations': [100, 200, 200, 200, 300, 300, 250, 250, 300, 100],
-            'hour_range': (9, 17)  # Business hours
-        },
-        # Pattern 2: Security audit
-        {
-            'actions': ['login_success', 'logs_retrieved', 'user_checked', 'user_checked',
-                       'file_accessed', 'location_accessed', 'agent_accessed', 'operation_accessed',
-                       'logs_retrieved', 'logout'],
-            'durations': [100, 300, 200, 200, 250, 250, 250, 300, 200, 100],
-            'hour_range': (9, 17)
-        },
-        # Pattern 3: Operation monitoring
-        {
-            'actions': ['login_success', 'operation_accessed', 'operation_accessed', 'agent_accessed',
-                       'location_accessed', 'file_accessed', 'logs_retrieved', 'user_checked',
-                       'operation_accessed', 'logout'],
-            'durations': [100, 400, 400, 300, 300, 250, 200, 200, 400, 100],
-            'hour_range': (9, 17)
-        }
-    ]
-    
-    # Generate 100 sessions for each pattern
-    for pattern in normal_patterns:
-        for _ in range(100):
-            hour = np.random.randint(pattern['hour_range'][0], pattern['hour_range'][1])
-            base_time = datetime.now().replace(hour=hour, minute=0, second=0)
-            
-            session = []
-            current_time = base_time
-            
-            for action, duration in zip(pattern['actions'], pattern['durations']):
-                # Add some randomness to durations (±20%)
-                random_duration = int(duration * np.random.uniform(0.8, 1.2))
-                
-                session.append({
-                    'username': 'admin',
-                    'role': 'admin',
-                    'timestamp': current_time.isoformat(),
-                    'session_duration': random_duration,
-                    'stuff_accessed': f"endpoint:/{action.split('_')[0]}",
-                    'action': action
-                })
-                current_time += timedelta(seconds=random_duration)
-            
-            baseline_sessions.append(session)
-    
-    return baseline_sessions
+BASELINE_SESSIONS_PER_PATTERN = 100
 
-def extract_session_features(session):
-    """Extract features from a session of events"""
-    df = pd.DataFrame(session)
-    
-    # Convert timestamp to datetime
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    # Time-based features
-    time_diffs = df['timestamp'].diff().dropna()
-    
-    # Action-based features
-    action_counts = df['action'].value_counts()
-    
-    # Enhanced login pattern detection
-    failed_logins = sum(df['action'] == 'login_failed')
-    successful_logins = sum(df['action'] == 'login_success')
-    failed_then_success = sum(
-        (df['action'] == 'login_failed') & 
-        (df['action'].shift(-1) == 'login_success')
+# Normal admin behavior patterns
+BASELINE_PATTERNS = [
+    # Pattern 1: Regular log review
+    {
+        'sequence': ['login_success', 'logs_retrieved', 'logs_retrieved', 'logs_retrieved', 
+                   'file_accessed', 'file_accessed', 'agent_accessed', 'location_accessed', 
+                   'operation_accessed', 'logout'],
+        'durations': [100, 200, 200, 200, 300, 300, 250, 250, 300, 100],
+        'hour_range': (9, 17),  # Business hours
+        'role': 'admin',
+        'users': ['admin'],
+        'sessions_per_day': BASELINE_SESSIONS_PER_PATTERN
+    },
+    # Pattern 2: Security audit
+    {
+        'sequence': ['login_success', 'logs_retrieved', 'user_checked', 'user_checked',
+                   'file_accessed', 'location_accessed', 'agent_accessed', 'operation_accessed',
+                   'logs_retrieved', 'logout'],
+        'durations': [100, 300, 200, 200, 250, 250, 250, 300, 200, 100],
+        'hour_range': (9, 17),
+        'role': 'admin',
+        'users': ['admin'],
+        'sessions_per_day': BASELINE_SESSIONS_PER_PATTERN
+    },
+    # Pattern 3: Operation monitoring
+    {
+        'sequence': ['login_success', 'operation_accessed', 'operation_accessed', 'agent_accessed',
+                   'location_accessed', 'file_accessed', 'logs_retrieved', 'user_checked',
+                   'operation_accessed', 'logout'],
+        'durations': [100, 400, 400, 300, 300, 250, 200, 200, 400, 100],
+        'hour_range': (9, 17),
+        'role': 'admin',
+        'users': ['admin'],
+        'sessions_per_day': BASELINE_SESSIONS_PER_PATTERN
+    }
+]
+
+BASELINE_SEED = 42  # fixed so the same spec always yields the same baseline
+
+def generate_baseline_frame(seed=BASELINE_SEED):
+    """Baseline normal behavior as one event frame (see synthetic_data)"""
+    # Each duration is jittered by ±20% and the next action starts when it ends
+    return synthetic_data.generate(BASELINE_PATTERNS, seed=seed)
+
+# Column order of the feature frame the model is trained and scored on
+FEATURE_COLUMNS = [
+    'mean_time_between_actions', 'std_time_between_actions', 'total_duration',
+    'mean_duration', 'std_duration', 'unique_actions', 'login_count',
+    'failed_login_count', 'failed_then_success', 'file_access_count',
+    'rapid_file_accesses', 'file_download_burst', 'logs_access_count',
+    'operation_access_count', 'hour_of_day', 'is_business_hours', 'rapid_actions',
+    'suspicious_sequences', 'failed_login_ratio', 'file_access_frequency'
+]
+
+def sessions_to_frame(sessions):
+    """
+    Flatten {key: [event, ...]} (or a list of sessions) into one columnar
+    frame with a 'session' column, events kept in their original order.
+    """
+    items = sessions.items() if isinstance(sessions, dict) else enumerate(sessions)
+    keys, timestamps, actions, durations = [], [], [], []
+    for key, session in items:
+        for event in session:
+            keys.append(key)
+            timestamps.append(event['timestamp'])
+            actions.append(event['action'])
+            durations.append(event.get('session_duration'))
+    return pd.DataFrame({
+        'session': keys,
+        'timestamp': timestamps,
+        'action': actions,
+        'session_duration': pd.array(durations, dtype='Float64').astype(float),
+    })
+
+def _segment_mean_std(values, segment, n):
+    """Per-segment mean and sample std (ddof=1) of values; NaN where undefined."""
+    count = np.bincount(segment, minlength=n)
+    total = np.bincount(segment, weights=values, minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        sq = np.bincount(segment, weights=(values - mean[segment]) ** 2, minlength=n)
+        std = np.sqrt(sq / (count - 1))
+    std[count < 2] = np.nan
+    return mean, std, count
+
+def extract_batch_features(frame):
+    """
+    Features for many sessions at once, one row per session (indexed by the
+    'session' column) with the same values extract_session_features gives.
+
+    ``frame`` is as built by sessions_to_frame: each session's events are
+    contiguous and in order. Every feature is computed with whole-column
+    NumPy operations, so the cost is a handful of passes over the events no
+    matter how many sessions there are.
+    """
+    session_keys = frame['session'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, session_keys[1:] != session_keys[:-1]])
+    n = len(starts)
+    length = np.diff(np.r_[starts, len(frame)])
+    segment = np.repeat(np.arange(n), length)
+
+    ts = pd.to_datetime(frame['timestamp'], format='ISO8601').to_numpy().astype('datetime64[ns]').view('int64')
+
+    # Action flags are worked out once per distinct action, then broadcast
+    codes, uniques = pd.factorize(frame['action'])
+    uniques = pd.Series(uniques)
+    def flag(mask):
+        return np.asarray(mask, dtype=bool)[codes]
+    is_failed = flag(uniques == 'login_failed')
+    is_success = flag(uniques == 'login_success')
+    is_file = flag(uniques.str.contains('file'))
+    is_logs = flag(uniques.str.contains('logs'))
+    is_operation = flag(uniques.str.contains('operation'))
+    is_logs_retrieved = flag(uniques == 'logs_retrieved')
+
+    def count(mask):
+        return np.bincount(segment[mask], minlength=n)
+
+    # Consecutive pairs inside the same session
+    same = segment[1:] == segment[:-1]
+    pair_segment = segment[1:][same]
+    gaps = (ts[1:] - ts[:-1])[same] / 1e9
+    gap_mean, gap_std, gap_count = _segment_mean_std(gaps, pair_segment, n)
+    gap_std[gap_count < 2] = 0
+    rapid_actions = np.bincount(pair_segment[gaps < 1], minlength=n)
+    failed_then_success = np.bincount(pair_segment[(is_failed[:-1] & is_success[1:])[same]], minlength=n)
+    suspicious_sequences = np.bincount(
+        pair_segment[(is_logs_retrieved[:-1] & is_logs_retrieved[1:])[same]], minlength=n
     )
-    
-    # Enhanced file access pattern detection
-    file_accesses = df[df['action'].str.contains('file', na=False)]
-    file_access_times = pd.to_datetime(file_accesses['timestamp'])
-    file_time_diffs = file_access_times.diff().dropna()
-    rapid_file_accesses = sum(file_time_diffs.dt.total_seconds() < 5)  # Files accessed within 5 seconds
-    
-    # Detect file download bursts
-    if len(file_time_diffs) > 1:
-        file_download_burst = any(td < pd.Timedelta(seconds=10) for td in file_time_diffs)
-    else:
-        file_download_burst = False
-    
-    features = {
-        'mean_time_between_actions': time_diffs.mean().total_seconds(),
-        'std_time_between_actions': time_diffs.std().total_seconds() if len(time_diffs) > 1 else 0,
-        'total_duration': df['session_duration'].sum(),
-        'mean_duration': df['session_duration'].mean(),
-        'std_duration': df['session_duration'].std(),
-        'unique_actions': len(action_counts),
+
+    # Consecutive file accesses inside the same session
+    file_segment = segment[is_file]
+    file_same = file_segment[1:] == file_segment[:-1]
+    file_pair_segment = file_segment[1:][file_same]
+    file_gaps = np.diff(ts[is_file])[file_same] / 1e9
+    file_gap_count = np.bincount(file_pair_segment, minlength=n)
+    rapid_file_accesses = np.bincount(file_pair_segment[file_gaps < 5], minlength=n)
+    file_burst = np.bincount(file_pair_segment[file_gaps < 10], minlength=n) > 0
+    file_download_burst = (file_burst & (file_gap_count > 1)).astype(int)
+
+    durations = frame['session_duration'].to_numpy(dtype=float)
+    known = ~np.isnan(durations)
+    total_duration = np.bincount(segment[known], weights=durations[known], minlength=n)
+    mean_duration, std_duration, _ = _segment_mean_std(durations[known], segment[known], n)
+
+    unique_actions = np.bincount(np.unique(segment.astype(np.int64) * len(uniques) + codes) // len(uniques), minlength=n)
+
+    failed_logins = count(is_failed)
+    successful_logins = count(is_success)
+    attempts = failed_logins + successful_logins
+    file_accesses = count(is_file)
+    hour = pd.DatetimeIndex(ts[starts]).hour.to_numpy()
+
+    features = pd.DataFrame({
+        'mean_time_between_actions': gap_mean,
+        'std_time_between_actions': gap_std,
+        'total_duration': total_duration,
+        'mean_duration': mean_duration,
+        'std_duration': std_duration,
+        'unique_actions': unique_actions,
         'login_count': successful_logins,
         'failed_login_count': failed_logins,
         'failed_then_success': failed_then_success,
-        'file_access_count': sum(df['action'].str.contains('file')),
+        'file_access_count': file_accesses,
         'rapid_file_accesses': rapid_file_accesses,
-        'file_download_burst': int(file_download_burst),
-        'logs_access_count': sum(df['action'].str.contains('logs')),
-        'operation_access_count': sum(df['action'].str.contains('operation')),
-        'hour_of_day': df['timestamp'].iloc[0].hour,
-        'is_business_hours': 1 if 9 <= df['timestamp'].iloc[0].hour <= 17 else 0,
-        'rapid_actions': sum(time_diffs.dt.total_seconds() < 1),
-        'suspicious_sequences': sum(
-            (df['action'] == 'logs_retrieved') & 
-            (df['action'].shift(-1) == 'logs_retrieved')
-        ),
-        'failed_login_ratio': failed_logins / (successful_logins + failed_logins) if (successful_logins + failed_logins) > 0 else 0,
-        'file_access_frequency': len(file_accesses) / len(df) if len(df) > 0 else 0
-    }
-    
+        'file_download_burst': file_download_burst,
+        'logs_access_count': count(is_logs),
+        'operation_access_count': count(is_operation),
+        'hour_of_day': hour,
+        'is_business_hours': ((hour >= 9) & (hour <= 17)).astype(int),
+        'rapid_actions': rapid_actions,
+        'suspicious_sequences': suspicious_sequences,
+        'failed_login_ratio': np.divide(failed_logins, attempts, out=np.zeros(n), where=attempts > 0),
+        'file_access_frequency': file_accesses / length,
+    }, index=pd.Index(session_keys[starts], name='session'))
     return features
 
-def train_model():
+def extract_session_features(session):
+    """Extract features from a session of events"""
+    return extract_batch_features(sessions_to_frame([session])).iloc[0].to_dict()
+
+class RunningStats:
+    """Welford's online count, mean and sample variance."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def std(self):
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+class SessionAccumulator:
+    """
+    One user's in-progress session, folded into running totals as events
+    arrive. add() is O(1) and features() gives the same values as
+    extract_session_features on the events added so far, at any time,
+    without keeping or re-reading the events themselves.
+    """
+
+    def __init__(self):
+        self.events = 0
+        self.first_time = None
+        self.last_time = None
+        self.last_file_time = None
+        self.last_action = None
+        self.gaps = RunningStats()
+        self.durations = RunningStats()
+        self.total_duration = 0.0
+        self.actions = set()
+        self.login_count = 0
+        self.failed_login_count = 0
+        self.failed_then_success = 0
+        self.file_access_count = 0
+        self.file_gaps = 0
+        self.rapid_file_accesses = 0
+        self.file_gap_under_10s = False
+        self.logs_access_count = 0
+        self.operation_access_count = 0
+        self.rapid_actions = 0
+        self.suspicious_sequences = 0
+
+    def add(self, event):
+        timestamp = event['timestamp']
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        action = event['action']
+
+        if self.last_time is None:
+            self.first_time = timestamp
+        else:
+            gap = (timestamp - self.last_time).total_seconds()
+            self.gaps.add(gap)
+            if gap < 1:
+                self.rapid_actions += 1
+        self.last_time = timestamp
+
+        duration = event.get('session_duration')
+        if duration is not None:
+            self.durations.add(duration)
+            self.total_duration += duration
+
+        self.actions.add(action)
+        if action == 'login_success':
+            self.login_count += 1
+            if self.last_action == 'login_failed':
+                self.failed_then_success += 1
+        elif action == 'login_failed':
+            self.failed_login_count += 1
+        elif action == 'logs_retrieved' and self.last_action == 'logs_retrieved':
+            self.suspicious_sequences += 1
+
+        if 'file' in action:
+            self.file_access_count += 1
+            if self.last_file_time is not None:
+                file_gap = (timestamp - self.last_file_time).total_seconds()
+                self.file_gaps += 1
+                if file_gap < 5:
+                    self.rapid_file_accesses += 1
+                if file_gap < 10:
+                    self.file_gap_under_10s = True
+            self.last_file_time = timestamp
+        if 'logs' in action:
+            self.logs_access_count += 1
+        if 'operation' in action:
+            self.operation_access_count += 1
+
+        self.last_action = action
+        self.events += 1
+
+    def __len__(self):
+        return self.events
+
+    def features(self):
+        attempts = self.login_count + self.failed_login_count
+        hour = self.first_time.hour
+        return {
+            'mean_time_between_actions': self.gaps.mean if self.gaps.count else np.nan,
+            'std_time_between_actions': self.gaps.std() if self.gaps.count > 1 else 0,
+            'total_duration': self.total_duration,
+            'mean_duration': self.durations.mean if self.durations.count else np.nan,
+            'std_duration': self.durations.std(),
+            'unique_actions': len(self.actions),
+            'login_count': self.login_count,
+            'failed_login_count': self.failed_login_count,
+            'failed_then_success': self.failed_then_success,
+            'file_access_count': self.file_access_count,
+            'rapid_file_accesses': self.rapid_file_accesses,
+            'file_download_burst': int(self.file_gaps > 1 and self.file_gap_under_10s),
+            'logs_access_count': self.logs_access_count,
+            'operation_access_count': self.operation_access_count,
+            'hour_of_day': hour,
+            'is_business_hours': 1 if 9 <= hour <= 17 else 0,
+            'rapid_actions': self.rapid_actions,
+            'suspicious_sequences': self.suspicious_sequences,
+            'failed_login_ratio': self.failed_login_count / attempts if attempts > 0 else 0,
+            'file_access_frequency': self.file_access_count / self.events if self.events else 0
+        }
+
+MODEL_NAME = "security_monitor_v2"
+# Bump whenever FEATURE_COLUMNS, a feature's definition or the baseline
+# generator changes, so stored models trained the old way are not reused
+FEATURE_SCHEMA_VERSION = 2
+MODEL_PARAMS = {'contamination': 0.1, 'random_state': 42, 'n_estimators': 100}
+
+def train_model(baseline_features=None):
     """Train Isolation Forest on baseline data"""
-    baseline_sessions = generate_baseline_sessions()
-    
-    # Extract features from baseline sessions
-    baseline_features = pd.DataFrame([
-        extract_session_features(session) 
-        for session in baseline_sessions
-    ])
+    if baseline_features is None:
+        # Extract features from all baseline sessions in one batch
+        baseline_features = extract_batch_features(generate_baseline_frame())
     
     # Scale features
     scaler = StandardScaler()
     scaled_features = scaler.fit_transform(baseline_features)
     
     # Train Isolation Forest
-    model = IsolationForest(
-        contamination=0.1,
-        random_state=42,
-        n_estimators=100
-    )
+    model = IsolationForest(**MODEL_PARAMS)
     model.fit(scaled_features)
     
-    print(f"Model trained on {len(baseline_sessions)} baseline sessions")
+    print(f"Model trained on {len(baseline_features)} baseline sessions")
+    return model, scaler
+
+def baseline_fingerprint():
+    """Identifies everything that determines the trained model"""
+    return model_registry.fingerprint(
+        FEATURE_SCHEMA_VERSION, FEATURE_COLUMNS, BASELINE_PATTERNS,
+        BASELINE_SESSIONS_PER_PATTERN, BASELINE_SEED, MODEL_PARAMS, sklearn.__version__
+    )
+
+def load_or_train_model():
+    """
+    Load the stored model for the current baseline, or train and store it
+    if the baseline (or anything else in baseline_fingerprint) has changed.
+    """
+    key = baseline_fingerprint()
+    artifact = model_registry.load_model(MODEL_NAME, key)
+    if artifact is not None:
+        print(f"Loaded model {key[:16]} trained at {artifact['created_at']}")
+        return artifact['model'], artifact['scaler']
+
+    baseline_features = extract_batch_features(generate_baseline_frame())
+    model, scaler = train_model(baseline_features)
+    model_registry.save_model(
+        MODEL_NAME, key, model, scaler,
+        feature_schema_version=FEATURE_SCHEMA_VERSION,
+        feature_columns=FEATURE_COLUMNS,
+        training_data_hash=model_registry.data_hash(baseline_features),
+        training_sessions=len(baseline_features)
+    )
     return model, scaler
 
 def admin_login():
@@ -194,25 +417,62 @@ def admin_login():
         print(f"Error during admin login: {e}")
         return False
 
-def get_logs():
-    """Fetch latest logs"""
+def follow_logs(after_id):
+    """
+    Yield logs with an id greater than after_id as the server pushes them
+    over /logs/events. Reconnects from the last id seen if the stream drops.
+    """
+    while True:
+        try:
+            with requests.get(
+                f"{API_URL}/logs/events",
+                params={"after_id": after_id},
+                headers={"Authorization": f"Bearer {ADMIN_TOKEN}"},
+                stream=True,
+                timeout=(5, STREAM_READ_TIMEOUT)
+            ) as response:
+                if response.status_code == 401:
+                    admin_login()
+                elif response.status_code != 200:
+                    print(f"Error opening log stream: {response.text}")
+                else:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line and line.startswith("data:"):
+                            log = json.loads(line[5:])
+                            after_id = log["id"]
+                            yield log
+        except requests.RequestException as e:
+            print(f"Log stream interrupted: {e}")
+        time.sleep(RECONNECT_DELAY)
+
+def get_latest_log_id():
+    """Id of the newest log, used as the starting point when there is no checkpoint"""
     try:
         response = requests.get(
             f"{API_URL}/logs",
-            headers={
-                "Authorization": f"Bearer {ADMIN_TOKEN}",
-                "Content-Type": "application/json"
-            }
+            params={"limit": 1},
+            headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}
         )
-        if response.status_code == 200:
-            return response.json()["logs"]
-        elif response.status_code == 401:
-            if admin_login():  # Try to login again
-                return get_logs()  # Retry the request
-        return []
+        if response.status_code == 200 and response.json()["logs"]:
+            return response.json()["logs"][0]["id"]
     except Exception as e:
-        print(f"Error fetching logs: {e}")
-        return []
+        print(f"Error fetching latest log id: {e}")
+    return 0
+
+def load_checkpoint():
+    """Return the last processed log id, or None if the monitor has never run"""
+    try:
+        with open(CHECKPOINT_FILE) as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+def save_checkpoint(last_id):
+    # Write then rename, so a crash never leaves a half-written checkpoint
+    tmp_path = CHECKPOINT_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(last_id))
+    os.replace(tmp_path, CHECKPOINT_FILE)
 
 def reset_user_credentials(username):
     """Reset user's credentials and invalidate their token"""
@@ -227,6 +487,8 @@ def reset_user_credentials(username):
             WHERE username = ?
         """, (username,))
         conn.commit()
+        # Make the API processes drop their cached sessions for the old token
+        credentials_stamp.touch_stamp()
         print(f"⚠️ SECURITY ACTION: Reset credentials for user: {username}")
     except Exception as e:
         print(f"Error resetting credentials: {e}")
@@ -246,7 +508,7 @@ def reset_security_monitoring(username):
         
         # Clear any active sessions for the user
         if username in current_sessions:
-            current_sessions[username] = []
+            current_sessions[username] = SessionAccumulator()
         
         # Log the reset action
         log_activity(
@@ -304,94 +566,67 @@ def reset_all():
         print(f"Error resetting security monitoring system: {e}")
         return False
 
-def check_for_anomalies(model, scaler, current_sessions):
-    """Check sessions for anomalous behavior"""
-    for username, session in current_sessions.items():
-        if len(session) >= SESSION_SIZE:
-            # Extract features from the session
-            features = extract_session_features(session)
-            features_df = pd.DataFrame([features])
-            
-            # Scale features
-            scaled_features = scaler.transform(features_df)
-            
-            # Get anomaly score
-            score = model.decision_function(scaled_features)[0]
-            
-            print(f"Analyzing session for {username} (score: {score:.3f})")
-            
-            # Immediate lockout conditions (bypass anomaly score)
-            should_lockout = False
-            lockout_reason = []
-
-            # 1. Failed login patterns
-            if features['failed_login_count'] >= 3:
-                should_lockout = True
-                lockout_reason.append("Multiple failed login attempts detected")
-            
-            # 2. Failed then successful login pattern
-            if features['failed_then_success'] > 0:
-                should_lockout = True
-                lockout_reason.append("Successful login after failed attempts - possible credential stuffing")
-            
-            # 3. Rapid file access patterns
-            if features['rapid_file_accesses'] >= 3:
-                should_lockout = True
-                lockout_reason.append("Suspicious rapid file access pattern")
-            
-            # 4. File download bursts
-            if features['file_download_burst'] == 1:
-                should_lockout = True
-                lockout_reason.append("Suspicious file download burst detected")
-
-            # 5. High failed login ratio
-            if features['failed_login_ratio'] > 0.4:  # More than 40% failed logins
-                should_lockout = True
-                lockout_reason.append("High ratio of failed logins")
-
-            # 6. Excessive file access frequency
-            if features['file_access_frequency'] > 0.5:  # More than 50% of actions are file accesses
-                should_lockout = True
-                lockout_reason.append("Unusually high file access frequency")
-            
-            # Check for anomalies or immediate lockout conditions
-            if should_lockout or score < ANOMALY_THRESHOLD:
-                print(f"🚨 SECURITY ALERT for {username}'s session!")
-                
-                suspicious_patterns = []
-                
-                # Add immediate lockout reasons if any
-                if lockout_reason:
-                    suspicious_patterns.extend(lockout_reason)
-                
-                # Additional checks for specific suspicious patterns
-                # 1. Rapid successive actions
-                if features['rapid_actions'] > 3:
-                    suspicious_patterns.append("Unusually rapid action sequences")
-                
-                # 2. Off-hours activity
-                if not features['is_business_hours']:
-                    suspicious_patterns.append("Activity outside business hours")
-                
-                # 3. Excessive log retrievals
-                if features['logs_access_count'] > 5:
-                    suspicious_patterns.append("Excessive log access")
-                
-                # 4. Unusual action patterns
-                if features['suspicious_sequences'] > 2:
-                    suspicious_patterns.append("Suspicious action sequences")
-                
-                if suspicious_patterns:
-                    print("Detected suspicious patterns:")
-                    for pattern in suspicious_patterns:
-                        print(f"- {pattern}")
-                    print("\nTaking protective actions...")
-                    reset_user_credentials(username)
-            
-            # Clear the processed session
-            current_sessions[username] = []
-            
-    return current_sessions
+# Any of these locks the account out whatever the anomaly score is.
+# Each rule takes the feature frame and returns a boolean column.
+LOCKOUT_RULES = [
+    (lambda f: f['failed_login_count'] >= 3, "Multiple failed login attempts detected"),
+    (lambda f: f['failed_then_success'] > 0, "Successful login after failed attempts - possible credential stuffing"),
+    (lambda f: f['rapid_file_accesses'] >= 3, "Suspicious rapid file access pattern"),
+    (lambda f: f['file_download_burst'] == 1, "Suspicious file download burst detected"),
+    (lambda f: f['failed_login_ratio'] > 0.4, "High ratio of failed logins"),  # More than 40% failed logins
+    (lambda f: f['file_access_frequency'] > 0.5, "Unusually high file access frequency"),  # More than 50% of actions are file accesses
+]
+
+# Extra patterns reported for sessions that are already flagged
+SUSPICIOUS_RULES = [
+    (lambda f: f['rapid_actions'] > 3, "Unusually rapid action sequences"),
+    (lambda f: f['is_business_hours'] == 0, "Activity outside business hours"),
+    (lambda f: f['logs_access_count'] > 5, "Excessive log access"),
+    (lambda f: f['suspicious_sequences'] > 2, "Suspicious action sequences"),
+]
+
+def score_sessions(model, scaler, sessions, reset_credentials=reset_user_credentials):
+    """
+    Score a batch of completed sessions, given as (username, SessionAccumulator)
+    pairs, and lock out the users whose session is flagged.
+
+    All sessions are scaled and scored with one transform/decision_function
+    call, and every rule is evaluated as a column over the whole batch; only
+    flagged sessions are handled one by one. reset_credentials is called for
+    each user that gets locked out; the in-process detector passes the API's
+    pooled database.reset_user_credentials instead of this module's connection.
+    """
+    if not sessions:
+        return
+    usernames = [username for username, _ in sessions]
+    features = pd.DataFrame([session.features() for _, session in sessions], columns=FEATURE_COLUMNS)
+    scores = model.decision_function(scaler.transform(features))
+
+    lockout = np.column_stack([rule(features).to_numpy() for rule, _ in LOCKOUT_RULES])
+    suspicious = np.column_stack([rule(features).to_numpy() for rule, _ in SUSPICIOUS_RULES])
+    flagged = lockout.any(axis=1) | (scores < ANOMALY_THRESHOLD)
+
+    for i, username in enumerate(usernames):
+        print(f"Analyzing session for {username} (score: {scores[i]:.3f})")
+        if not flagged[i]:
+            continue
+
+        print(f"🚨 SECURITY ALERT for {username}'s session!")
+        suspicious_patterns = (
+            [reason for hit, (_, reason) in zip(lockout[i], LOCKOUT_RULES) if hit] +
+            [reason for hit, (_, reason) in zip(suspicious[i], SUSPICIOUS_RULES) if hit]
+        )
+        if suspicious_patterns:
+            print("Detected suspicious patterns:")
+            for pattern in suspicious_patterns:
+                print(f"- {pattern}")
+            print("\nTaking protective actions...")
+            reset_credentials(username)
+
+def read_logs(after_id, logs):
+    """Reader thread: put every log from follow_logs on the logs queue."""
+    for log in follow_logs(after_id):
+        logs.put(log)
 
 def main():
     """Main monitoring loop"""
@@ -402,43 +637,55 @@ def main():
         print("Failed to perform initial admin login")
         return
     
-    # Train the model
-    print("Training anomaly detection model...")
-    model, scaler = train_model()
+    # Load the stored model, training it only if the baseline has changed
+    print("Loading anomaly detection model...")
+    model, scaler = load_or_train_model()
     
     # Keep track of sessions per user
     current_sessions = {}
-    last_check_time = datetime.now()
+    ready = []     # completed (username, session) pairs not yet scored
+
+    # Resume after the last log we processed; on first run, start from now
+    last_log_id = load_checkpoint()
+    if last_log_id is None:
+        last_log_id = get_latest_log_id()
+        save_checkpoint(last_log_id)
+
+    # The stream is read on its own thread so this loop can tell when it has
+    # caught up with everything the server has pushed so far
+    logs = queue.Queue()
+    threading.Thread(target=read_logs, args=(last_log_id, logs), name="log-stream", daemon=True).start()
     
     print("\n✅ Monitoring system initialized. Watching for suspicious activities...\n")
     
     while True:
         try:
-            # Get latest logs
-            logs = get_logs()
-            current_time = datetime.now()
-            
-            # Process new logs
-            for log in logs:
-                username = log['username']
-                if username not in current_sessions:
-                    current_sessions[username] = []
-                
-                # Add event to user's current session
-                current_sessions[username].append(log)
+            log = logs.get()
+            last_log_id = log['id']
+            username = log['username']
+            if username not in current_sessions:
+                current_sessions[username] = SessionAccumulator()
             
-            # Check for anomalies in completed sessions
-            current_sessions = check_for_anomalies(model, scaler, current_sessions)
+            # Fold the event into the user's current session
+            current_sessions[username].add(log)
+            if len(current_sessions[username]) >= SESSION_SIZE:
+                ready.append((username, current_sessions[username]))
+                current_sessions[username] = SessionAccumulator()
             
-            # Sleep until next check
-            time.sleep(CHECK_INTERVAL)
+            # Score once the backlog is drained: when idle that is as soon as a
+            # session completes, under load one model call covers every user
+            # whose session completed meanwhile
+            if ready and logs.empty():
+                batch, ready = ready, []
+                score_sessions(model, scaler, batch)
+                save_checkpoint(last_log_id)
             
         except KeyboardInterrupt:
             print("\n👋 Stopping security monitoring...")
             break
         except Exception as e:
             print(f"Error in monitoring loop: {e}")
-            time.sleep(CHECK_INTERVAL)
+            time.sleep(RECONNECT_DELAY)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
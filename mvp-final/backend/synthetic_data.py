@@ -0,0 +1,301 @@
+"""
+Columnar synthetic activity generator.
+
+A dataset is described by a list of pattern specs (plain dicts). Each
+pattern produces sessions for every user on every day:
+
+    'role'               role name for every event
+    'users'              list of user names
+    'days'               days to cover, starting at ``start`` (default 1)
+    'sessions_per_day'   int, or (choices, probabilities) drawn per user-day;
+                         a 2-item list works too
+    'hour_range'         (lo, hi): sessions start in [lo, hi) o'clock
+
+Actions come from either a fixed 'sequence' or a Markov chain:
+
+    'sequence'           list of actions, the same for every session
+    'start'              {action: probability} for the first action
+    'transitions'        {action: {next_action: probability}}
+    'end'                action forced as the last one (e.g. 'logout')
+    'events_per_session' int, (lo, hi) drawn in [lo, hi), or {'poisson': lam}
+
+Event timing, one of:
+
+    'durations'          per-position seconds for a 'sequence'; each is
+                         jittered by +/- 'duration_jitter' (a fraction) and
+                         written as 'session_duration', and the next event
+                         starts when the previous one ends
+    'event_interval'     seconds between consecutive events
+    neither              each event at a uniform time within 'hour_range'
+
+Extra numeric columns, drawn once per session unless 'per_event':
+
+    'columns'            {name: {'dist': 'normal', 'mean': m, 'std': s}
+                          or {'dist': 'poisson', 'lam': l},
+                          optional 'integer', 'clip': (lo, hi),
+                          'jitter': j (uniform integer noise per event),
+                          'min': m (applied after jitter), 'per_event'}
+
+Everything is drawn with whole-array NumPy calls, a chunk of sessions at a
+time, so the cost per event is a few array operations regardless of size.
+The output for a seed is reproducible for the same patterns and chunk size.
+"""
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Sessions generated per chunk; bounds memory when writing large datasets
+CHUNK_SESSIONS = 100_000
+
+
+def _draw_counts(rng, spec, size):
+    """Per-item counts from an int, a (lo, hi) range or {'poisson': lam}."""
+    if isinstance(spec, dict):
+        return rng.poisson(spec['poisson'], size)
+    if isinstance(spec, (tuple, list)):
+        return rng.integers(spec[0], spec[1], size)
+    return np.full(size, spec, dtype=np.int64)
+
+
+def _sessions_per_day(pattern):
+    """'sessions_per_day' as an int or a (choices, probabilities) tuple."""
+    per_day = pattern.get('sessions_per_day', 1)
+    if isinstance(per_day, (tuple, list)):
+        # Lists too, e.g. patterns loaded from JSON
+        if len(per_day) != 2 or len(per_day[0]) != len(per_day[1]):
+            raise ValueError(
+                f"'sessions_per_day' must be an int or (choices, probabilities) "
+                f"of equal length, got {per_day!r}"
+            )
+        return tuple(per_day)
+    return per_day
+
+
+def _draw_column(rng, spec, n_sessions, segment):
+    """Values for one extra numeric column, one per event."""
+    size = len(segment) if spec.get('per_event') else n_sessions
+    if spec['dist'] == 'normal':
+        values = rng.normal(spec['mean'], spec['std'], size)
+    elif spec['dist'] == 'poisson':
+        values = rng.poisson(spec['lam'], size)
+    else:
+        raise ValueError(f"Unknown distribution '{spec['dist']}'")
+    if spec.get('integer'):
+        values = values.astype(np.int64)
+    if 'clip' in spec:
+        values = np.clip(values, *spec['clip'])
+    if not spec.get('per_event'):
+        values = values[segment]
+    if spec.get('jitter'):
+        values = values + rng.integers(-spec['jitter'], spec['jitter'] + 1, len(segment))
+    if 'min' in spec:
+        values = np.maximum(values, spec['min'])
+    return values
+
+
+def _markov_actions(rng, pattern, states, lengths):
+    """Action codes (indices into ``states``) for sessions of the given lengths."""
+    index = {action: i for i, action in enumerate(states)}
+    start = np.zeros(len(states))
+    for action, p in pattern['start'].items():
+        start[index[action]] = p
+    transitions = np.zeros((len(states), len(states)))
+    for action, row in pattern['transitions'].items():
+        for next_action, p in row.items():
+            transitions[index[action], index[next_action]] = p
+    start_cdf = np.cumsum(start / start.sum())
+    # Actions with no outgoing transitions repeat themselves
+    stuck = transitions.sum(axis=1) == 0
+    transitions[stuck, stuck] = 1
+    transition_cdf = np.cumsum(transitions / transitions.sum(axis=1, keepdims=True), axis=1)
+
+    offsets = np.cumsum(lengths) - lengths
+    codes = np.empty(lengths.sum(), dtype=np.int64)
+    # One vectorized step per position: every session still that long
+    # draws its next action from the row of its current one
+    alive = np.flatnonzero(lengths > 0)
+    current = np.searchsorted(start_cdf, rng.random(len(alive)), side='right')
+    current = np.minimum(current, len(states) - 1)
+    position = 0
+    while len(alive):
+        codes[offsets[alive] + position] = current
+        position += 1
+        keep = lengths[alive] > position
+        alive, current = alive[keep], current[keep]
+        cdf = transition_cdf[current]
+        current = (rng.random(len(alive))[:, None] >= cdf).sum(axis=1)
+        current = np.minimum(current, len(states) - 1)
+
+    if pattern.get('end'):
+        last = offsets[lengths > 0] + lengths[lengths > 0] - 1
+        codes[last] = index[pattern['end']]
+    return codes
+
+
+def pattern_actions(pattern):
+    """Every action a pattern can emit."""
+    if 'sequence' in pattern:
+        return list(pattern['sequence'])
+    actions = list(pattern['start'])
+    for action, row in pattern['transitions'].items():
+        actions += [action, *row]
+    if pattern.get('end'):
+        actions.append(pattern['end'])
+    return actions
+
+
+def _pattern_chunk(rng, pattern, user_days, day_starts, states, first_session):
+    """Events for the given (user index, day index) pairs of one pattern."""
+    users, days = user_days
+    per_day = _sessions_per_day(pattern)
+    if isinstance(per_day, tuple):
+        counts = rng.choice(per_day[0], size=len(users), p=per_day[1])
+    else:
+        counts = np.full(len(users), per_day, dtype=np.int64)
+    session_user = np.repeat(users, counts)
+    session_day = np.repeat(days, counts)
+    n_sessions = len(session_user)
+
+    if 'sequence' in pattern:
+        lengths = np.full(n_sessions, len(pattern['sequence']), dtype=np.int64)
+    else:
+        lengths = _draw_counts(rng, pattern['events_per_session'], n_sessions)
+    segment = np.repeat(np.arange(n_sessions), lengths)
+    offsets = np.cumsum(lengths) - lengths
+    position = np.arange(len(segment)) - offsets[segment]
+
+    if 'sequence' in pattern:
+        index = {action: i for i, action in enumerate(states)}
+        codes = np.array([index[a] for a in pattern['sequence']], dtype=np.int64)[position]
+    else:
+        codes = _markov_actions(rng, pattern, states, lengths)
+
+    lo, hi = pattern['hour_range']
+    day_start = day_starts[session_day]
+    columns = {}
+    if 'durations' in pattern:
+        jitter = pattern.get('duration_jitter', 0.2)
+        base = np.asarray(pattern['durations'], dtype=float)[position]
+        durations = (base * rng.uniform(1 - jitter, 1 + jitter, len(segment))).astype(np.int64)
+        elapsed = np.cumsum(durations) - durations
+        elapsed -= elapsed[offsets][segment]
+        session_start = day_start + rng.integers(lo * 60, hi * 60, n_sessions) * 60
+        seconds = session_start[segment] + elapsed
+        columns['session_duration'] = durations
+    elif pattern.get('event_interval') is not None:
+        session_start = day_start + rng.integers(lo * 60, hi * 60, n_sessions) * 60
+        seconds = session_start[segment] + position * pattern['event_interval']
+    else:
+        seconds = day_start[segment] + rng.integers(lo * 3600, hi * 3600, len(segment))
+
+    for name, spec in pattern.get('columns', {}).items():
+        columns[name] = _draw_column(rng, spec, n_sessions, segment)
+
+    return {
+        'session': first_session + segment,
+        'user': session_user[segment],
+        'timestamp': seconds,
+        'action': codes,
+        **columns
+    }
+
+
+def generate_chunks(patterns, seed=None, start=None, chunk_sessions=CHUNK_SESSIONS):
+    """
+    Yield the dataset described by ``patterns`` as DataFrames of roughly
+    ``chunk_sessions`` sessions each, with columns session, user, role,
+    timestamp, action and any generated numeric columns. user, role and
+    action are categoricals with the same categories in every chunk.
+    """
+    rng = np.random.default_rng(seed)
+    if start is None:
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = np.datetime64(pd.Timestamp(start).replace(tzinfo=None), 's')
+
+    user_names = pd.unique(pd.Series([u for p in patterns for u in p['users']], dtype=object))
+    roles = pd.unique(pd.Series([p['role'] for p in patterns], dtype=object))
+    states = list(pd.unique(pd.Series([a for p in patterns for a in pattern_actions(p)], dtype=object)))
+    user_index = {user: i for i, user in enumerate(user_names)}
+    role_index = {role: i for i, role in enumerate(roles)}
+
+    next_session = 0
+    for pattern in patterns:
+        users = np.array([user_index[u] for u in pattern['users']], dtype=np.int64)
+        days = pattern.get('days', 1)
+        day_starts = np.arange(days, dtype=np.int64) * 86400
+        per_day = _sessions_per_day(pattern)
+        most_per_day = max(per_day[0]) if isinstance(per_day, tuple) else per_day
+        block = max(1, chunk_sessions // max(1, most_per_day))
+
+        # User-days in (day, user) order, a block at a time
+        user_day_count = days * len(users)
+        for lo in range(0, user_day_count, block):
+            flat = np.arange(lo, min(lo + block, user_day_count))
+            chunk = _pattern_chunk(
+                rng, pattern, (users[flat % len(users)], flat // len(users)),
+                day_starts, states, next_session
+            )
+            n = len(chunk['session'])
+            if n == 0:
+                continue
+            next_session = chunk['session'][-1] + 1
+            frame = pd.DataFrame({
+                'session': chunk.pop('session'),
+                'user': pd.Categorical.from_codes(chunk.pop('user'), categories=user_names),
+                'role': pd.Categorical.from_codes(
+                    np.full(n, role_index[pattern['role']]), categories=roles
+                ),
+                'timestamp': start + chunk.pop('timestamp').astype('timedelta64[s]'),
+                'action': pd.Categorical.from_codes(chunk.pop('action'), categories=states),
+                **chunk
+            })
+            yield frame
+
+
+def generate(patterns, seed=None, start=None):
+    """The whole dataset described by ``patterns`` as one DataFrame."""
+    chunks = list(generate_chunks(patterns, seed=seed, start=start))
+    if not chunks:
+        return pd.DataFrame(columns=['session', 'user', 'role', 'timestamp', 'action'])
+    return pd.concat(chunks, ignore_index=True)
+
+
+def write_dataset(path, patterns, seed=None, start=None, chunk_sessions=CHUNK_SESSIONS, columns=None):
+    """
+    Stream the dataset to ``path`` a chunk at a time, as Parquet if the
+    path ends in .parquet (needs pyarrow) and CSV otherwise. ``columns``
+    selects and orders the columns written. Returns the number of rows.
+    """
+    chunks = generate_chunks(patterns, seed=seed, start=start, chunk_sessions=chunk_sessions)
+    rows = 0
+    tmp_path = path + ".tmp"
+    try:
+        if path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            writer = None
+            try:
+                for frame in chunks:
+                    table = pa.Table.from_pandas(frame[columns] if columns else frame, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp_path, table.schema)
+                    writer.write_table(table)
+                    rows += len(frame)
+            finally:
+                if writer is not None:
+                    writer.close()
+        else:
+            with open(tmp_path, "w", newline="") as f:
+                header = True
+                for frame in chunks:
+                    (frame[columns] if columns else frame).to_csv(f, index=False, header=header)
+                    header = False
+                    rows += len(frame)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return rows
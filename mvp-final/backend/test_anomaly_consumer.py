@@ -0,0 +1,38 @@
+import asyncio
+import contextlib
+import io
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import anomaly_consumer
+
+
+def test_detector_restarts_after_a_crash_and_reports_it(monkeypatch):
+    runs = []
+
+    async def crashing_run(progress):
+        runs.append(progress['last_id'])
+        progress['last_id'] = (progress['last_id'] or 0) + 1
+        raise ValueError("model file is corrupt")
+
+    monkeypatch.setattr(anomaly_consumer, 'detect_anomalies', crashing_run)
+    monkeypatch.setattr(anomaly_consumer, 'RESTART_BACKOFF_MIN', 0.01)
+    monkeypatch.setattr(anomaly_consumer, 'detector_status', dict(anomaly_consumer.detector_status))
+
+    async def scenario():
+        task = asyncio.create_task(anomaly_consumer.run_anomaly_detector())
+        await asyncio.sleep(0.2)
+        status = dict(anomaly_consumer.detector_status)
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        return status
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        status = asyncio.run(scenario())
+
+    assert status['state'] == 'restarting'
+    assert status['restarts'] >= 2
+    assert status['last_error'] == "model file is corrupt"
+    # Each restart resumes after the last log the previous run saw
+    assert runs[:3] == [None, 1, 2]
+    assert anomaly_consumer.detector_status['state'] == 'stopped'
@@ -0,0 +1,42 @@
+import asyncio
+import contextlib
+import io
+import sqlite3
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import database
+    from audit_feed import follow_audit_logs
+
+
+def test_rows_committed_by_another_process_are_replayed():
+    async def scenario():
+        with database.get_connection() as conn:
+            start = conn.execute("SELECT COALESCE(MAX(id), 0) FROM audit_logs").fetchone()[0]
+
+        feed = follow_audit_logs(last_id=start)
+        received = []
+
+        async def consume():
+            async for log in feed:
+                received.append(log['action'])
+                if len(received) == 3:
+                    return
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.2)
+
+        database.log_activity('feed-test', 'admin', 'first')
+        await asyncio.sleep(0.2)
+        # A second worker process commits straight to the database; nothing
+        # is published on this process's bus for it
+        other = sqlite3.connect(database.DB_PATH)
+        other.execute(database.AUDIT_INSERT, ('feed-test', 'admin', '2025-01-01 00:00:00', None, None, 'second'))
+        other.commit()
+        other.close()
+        database.log_activity('feed-test', 'admin', 'third')
+
+        await asyncio.wait_for(consumer, 5)
+        await feed.aclose()
+        return received
+
+    assert asyncio.run(scenario()) == ['first', 'second', 'third']
@@ -0,0 +1,90 @@
+import contextlib
+import hashlib
+import io
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import database
+
+# Seeded by init_test_data; DOC001 is admin-only
+SECRET_REPORT = b"This is a top secret report. For admin eyes only."
+
+
+def test_range_requests(client_for):
+    client = client_for('admin', 'admin')
+
+    response = client.get('/files/DOC001')
+    assert response.status_code == 200
+    assert response.content == SECRET_REPORT
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Content-Length'] == str(len(SECRET_REPORT))
+
+    response = client.get('/files/DOC001', headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 206
+    assert response.content == SECRET_REPORT[:10]
+    assert response.headers['Content-Range'] == f"bytes 0-9/{len(SECRET_REPORT)}"
+    assert response.headers['Content-Length'] == '10'
+
+    # Open-ended and suffix ranges, and an end past the last byte
+    response = client.get('/files/DOC001', headers={'Range': 'bytes=40-'})
+    assert response.status_code == 206
+    assert response.content == SECRET_REPORT[40:]
+    response = client.get('/files/DOC001', headers={'Range': 'bytes=-5'})
+    assert response.content == SECRET_REPORT[-5:]
+    assert response.headers['Content-Range'] == f"bytes 44-48/{len(SECRET_REPORT)}"
+    response = client.get('/files/DOC001', headers={'Range': 'bytes=45-1000'})
+    assert response.content == SECRET_REPORT[45:]
+
+
+def test_unsatisfiable_ranges_are_416(client_for):
+    client = client_for('admin', 'admin')
+    for header in ('bytes=100-', 'bytes=9-3', 'bytes=0-1,5-9', 'lines=0-1', 'bytes=a-b'):
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = client.get('/files/DOC001', headers={'Range': header})
+        assert response.status_code == 416, header
+        assert response.headers['Content-Range'] == f"bytes */{len(SECRET_REPORT)}"
+
+
+def test_range_over_a_file_still_in_the_database(client_for):
+    # Rows from before the file store keep their content in file_data
+    content = b"0123456789" * 10
+    with database.get_connection() as conn:
+        conn.execute(
+            "INSERT INTO classified_files (file_id, filename, file_data, access_level) VALUES (?, ?, ?, ?)",
+            ('DOC-LEGACY', 'legacy.txt', content, 'admin')
+        )
+        conn.commit()
+
+    client = client_for('admin', 'admin')
+    response = client.get('/files/DOC-LEGACY', headers={'Range': 'bytes=25-54'})
+    assert response.status_code == 206
+    assert response.content == content[25:55]
+    assert response.headers['Content-Range'] == 'bytes 25-54/100'
+
+
+def test_conditional_requests(client_for):
+    client = client_for('admin', 'admin')
+    response = client.get('/files/DOC001')
+    etag = response.headers['ETag']
+    assert etag == f'"{hashlib.sha256(SECRET_REPORT).hexdigest()}"'
+    assert response.headers['Last-Modified'].endswith(' GMT')
+
+    for header in (etag, f"W/{etag}", f'"stale", {etag}', '*'):
+        response = client.get('/files/DOC001', headers={'If-None-Match': header})
+        assert response.status_code == 304, header
+        assert response.content == b''
+        assert response.headers['ETag'] == etag
+
+    response = client.get('/files/DOC001', headers={'If-None-Match': '"stale"'})
+    assert response.status_code == 200
+    assert response.content == SECRET_REPORT
+
+
+def test_not_modified_is_only_answered_after_the_access_check(client_for):
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.create_user('downloads-test', 'downloads123', 'file_manager', 'JBSWY3DPEHPK3PXQ')
+    client = client_for('downloads-test', 'file_manager')
+    etag = f'"{hashlib.sha256(SECRET_REPORT).hexdigest()}"'
+
+    response = client.get('/files/DOC001', headers={'If-None-Match': etag})
+    assert response.status_code == 403
+    assert 'ETag' not in response.headers
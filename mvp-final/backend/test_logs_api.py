@@ -0,0 +1,98 @@
+import contextlib
+import io
+import json
+import sqlite3
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import database
+    import main
+
+
+def add_logs(username, count, timestamp='2025-01-01 00:00:00'):
+    """count audit rows for username, all with the same timestamp; returns their ids."""
+    with database.get_connection() as conn:
+        ids = [
+            conn.execute(database.AUDIT_INSERT, (username, 'admin', timestamp, None, None, f"action {n}")).lastrowid
+            for n in range(count)
+        ]
+        conn.commit()
+    return ids
+
+
+def test_cursor_pages_are_exact_when_timestamps_repeat(client_for):
+    ids = add_logs('logs-cursor-test', 7)
+    client = client_for('admin', 'admin')
+
+    seen = []
+    cursor = None
+    while True:
+        params = {'username': 'logs-cursor-test', 'limit': 3}
+        if cursor:
+            params['cursor'] = cursor
+        body = client.get('/logs', params=params).json()
+        assert body['total'] == len(body['logs']) <= 3
+        seen += [log['id'] for log in body['logs']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    # Newest first, every row exactly once
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_after_id_reads_new_rows_once_in_id_order(client_for):
+    first = add_logs('logs-after-test', 3)
+    client = client_for('admin', 'admin')
+
+    body = client.get('/logs', params={'username': 'logs-after-test', 'after_id': 0, 'limit': 2}).json()
+    assert [log['id'] for log in body['logs']] == first[:2]
+    assert body['last_id'] == first[1] and body['has_more'] is True
+
+    body = client.get('/logs', params={'username': 'logs-after-test', 'after_id': body['last_id']}).json()
+    assert [log['id'] for log in body['logs']] == first[2:]
+    assert body['has_more'] is False
+
+    # Nothing new: last_id stays where the caller already is
+    body = client.get('/logs', params={'username': 'logs-after-test', 'after_id': first[-1]}).json()
+    assert body['logs'] == [] and body['last_id'] == first[-1]
+
+    second = add_logs('logs-after-test', 2, timestamp='2020-01-01 00:00:00')
+    body = client.get('/logs', params={'username': 'logs-after-test', 'after_id': first[-1]}).json()
+    assert [log['id'] for log in body['logs']] == second
+
+
+def test_bad_log_queries_are_rejected(client_for):
+    client = client_for('admin', 'admin')
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert client.get('/logs', params={'cursor': '2025-01-01 00:00:00,1', 'after_id': 1}).status_code == 400
+        assert client.get('/logs', params={'cursor': 'not-a-cursor'}).status_code == 400
+        assert client.get('/logs', params={'after_id': -1}).status_code == 422
+
+        database.create_user('logs-test', 'logs123', 'file_manager', 'JBSWY3DPEHPK3PXQ')
+        assert client_for('logs-test', 'file_manager').get('/logs').status_code == 403
+
+
+def test_stream_ends_with_an_error_record_when_a_page_fails(client_for, monkeypatch):
+    ids = add_logs('logs-stream-test', 5)
+    monkeypatch.setattr(main, 'LOG_STREAM_PAGE_SIZE', 2)
+    pages = []
+
+    def failing_second_page(**kwargs):
+        if pages:
+            raise sqlite3.OperationalError("database is locked")
+        pages.append(database.get_audit_logs(**kwargs))
+        return pages[-1]
+
+    monkeypatch.setattr(main, 'get_audit_logs', failing_second_page)
+    client = client_for('admin', 'admin')
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = client.get('/logs/stream', params={'username': 'logs-stream-test'})
+    assert response.status_code == 200
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [log['id'] for log in lines[:-1]] == sorted(ids, reverse=True)[:2]
+    assert 'error' in lines[-1] and 'id' not in lines[-1]
+
+    monkeypatch.setattr(main, 'get_audit_logs', database.get_audit_logs)
+    response = client.get('/logs/stream', params={'username': 'logs-stream-test'})
+    assert [json.loads(line)['id'] for line in response.text.splitlines()] == sorted(ids, reverse=True)
@@ -0,0 +1,66 @@
+import contextlib
+import io
+
+import pytest
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import database
+
+
+def walk(fetch, limit):
+    """Follow next_after from the first page to the last; returns the pages."""
+    pages = []
+    after = None
+    while True:
+        rows, after = fetch(limit=limit, after=after)
+        pages.append(rows)
+        if after is None:
+            return pages
+
+
+def test_keyset_pages_cover_every_row_once():
+    everything, next_after = database.get_agents('admin')
+    assert next_after is None
+    assert len(everything) >= 5
+
+    pages = walk(lambda **page: database.get_agents('admin', **page), limit=2)
+    assert [len(rows) for rows in pages[:-1]] == [2] * (len(pages) - 1)
+    assert [row for rows in pages for row in rows] == everything
+
+    # A page that ends exactly on the last row has no next page
+    rows, next_after = database.get_agents('admin', limit=len(everything))
+    assert rows == everything and next_after is None
+
+
+def test_fields_pick_columns_and_always_keep_the_key():
+    rows, _ = database.get_agents('admin', limit=3, fields=['name', 'status'])
+    assert all(list(row) == ['agent_number', 'name', 'status'] for row in rows)
+
+    rows, _ = database.get_classified_files('admin', fields=['size', 'file_id', 'size'])
+    assert all(list(row) == ['file_id', 'size'] for row in rows)
+
+    with pytest.raises(ValueError, match='Unknown fields: password_hash'):
+        database.get_agents('admin', fields=['name', 'password_hash'])
+
+
+def test_list_endpoints_page_and_select_fields(client_for):
+    client = client_for('admin', 'admin')
+
+    response = client.get('/agents', params={'limit': 2, 'fields': 'agent_number,name'})
+    assert response.status_code == 200
+    body = response.json()
+    assert [list(agent) for agent in body['agents']] == [['agent_number', 'name']] * 2
+    assert body['next_after'] == body['agents'][-1]['agent_number']
+
+    response = client.get('/agents', params={'limit': 2, 'after': body['next_after']})
+    assert response.json()['agents'][0]['agent_number'] > body['next_after']
+
+    # Unpaged requests still get every row, as the frontend expects
+    response = client.get('/locations')
+    assert response.json()['next_after'] is None
+    assert len(response.json()['locations']) >= 5
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = client.get('/files', params={'fields': 'file_data'})
+    assert response.status_code == 400
+    assert client.get('/agents', params={'limit': 0}).status_code == 422
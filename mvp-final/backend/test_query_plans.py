@@ -0,0 +1,109 @@
+"""
+EXPLAIN QUERY PLAN checks for the hot queries in database.py.
+
+Each helper is run with SQLite's trace callback on its pooled connection,
+so the plans checked are those of the SQL the helper actually sends. A
+query must use the expected index and must neither scan a whole table nor
+sort through a temporary B-tree.
+"""
+import contextlib
+import io
+import re
+
+import pytest
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import database
+
+# "SCAN audit_logs" is a full table scan; "SCAN audit_logs USING INDEX ..."
+# walks an index in order (fine under a LIMIT); "SCAN (subquery-1)" reads
+# an already-bounded subquery result
+FULL_SCAN = re.compile(r"^SCAN (?!\()\S+( AS \S+)?$")
+
+
+def traced_plans(call):
+    """[(sql, [plan detail, ...]), ...] for every SELECT ``call`` runs."""
+    database.session_cache.clear()
+    with database.get_connection() as conn:
+        statements = []
+        conn.set_trace_callback(statements.append)
+        try:
+            call()
+        finally:
+            conn.set_trace_callback(None)
+        return [
+            (sql, [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)])
+            for sql in statements
+            if sql.lstrip().upper().startswith("SELECT")
+        ]
+
+
+def assert_indexed(call, *indexes):
+    plans = traced_plans(call)
+    assert plans, "no SELECT was run"
+    details = [detail for _, plan in plans for detail in plan]
+    for sql, plan in plans:
+        for detail in plan:
+            assert not FULL_SCAN.match(detail), f"full table scan in {plan} for {sql}"
+            assert "TEMP B-TREE" not in detail, f"temp B-tree sort in {plan} for {sql}"
+    for index in indexes:
+        assert any(index in detail for detail in details), f"{index} not used: {details}"
+
+
+def test_token_lookup_uses_covering_index():
+    assert_indexed(lambda: database.get_user_by_token("no-such-token"), "COVERING INDEX idx_users_auth_token")
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"cursor": ("2025-01-01T00:00:00", 10)},
+    {"start_time": "2025-01-01T00:00:00", "end_time": "2025-12-31T00:00:00"},
+])
+def test_audit_logs_by_timestamp(kwargs):
+    assert_indexed(lambda: database.get_audit_logs(limit=10, **kwargs), "idx_audit_logs_timestamp")
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"cursor": ("2025-01-01T00:00:00", 10)},
+])
+def test_audit_logs_by_username_and_timestamp(kwargs):
+    assert_indexed(
+        lambda: database.get_audit_logs(username="admin", limit=10, **kwargs),
+        "idx_audit_logs_username_timestamp"
+    )
+
+
+def test_audit_logs_after_id_uses_primary_key():
+    assert_indexed(lambda: database.get_audit_logs(limit=10, after_id=5), "INTEGER PRIMARY KEY")
+
+
+def test_operations_filtered_by_classified_level():
+    assert_indexed(
+        lambda: database.get_operations(1, "file_manager"),
+        "idx_operations_classified_id", "idx_operation_agents_position"
+    )
+
+
+def test_operations_for_agent_use_reverse_lookup():
+    assert_indexed(
+        lambda: database.get_operations(1, "file_manager", agent_number="A001"),
+        "idx_operation_agents_agent"
+    )
+
+
+@pytest.mark.parametrize("call, index", [
+    (lambda: database.get_agents("file_manager"), "idx_agents_clearance_number"),
+    (lambda: database.get_locations("file_manager"), "idx_locations_security_id"),
+    (lambda: database.get_classified_files("file_manager"), "idx_classified_files_access_id"),
+    (lambda: database.get_operations(1, "file_manager", after="OP001"), "idx_operations_classified_id"),
+])
+def test_list_pages_use_level_key_indexes(call, index):
+    assert_indexed(call, index)
+
+
+def test_operation_by_id_fetches_agents_in_position_order():
+    assert_indexed(
+        lambda: database.get_operation_by_id("OP001", 1, "file_manager"),
+        "idx_operation_agents_position"
+    )
@@ -0,0 +1,38 @@
+import contextlib
+import io
+import sqlite3
+import threading
+
+from fastapi.testclient import TestClient
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import main
+
+
+class BrokenBackend:
+    """Stands in for a SQLite backend whose database stays locked."""
+    blocking = True
+
+    def __init__(self):
+        self.threads = []
+
+    def hit(self, scope, key, limit, window, now):
+        self.threads.append(threading.current_thread().name)
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_backend_errors_fail_open_except_for_login(monkeypatch):
+    backend = BrokenBackend()
+    monkeypatch.setattr(main.request_limiter, 'backend', backend)
+    monkeypatch.setattr(main.login_limiter, 'backend', backend)
+
+    # Not used as a context manager: shutdown would stop the shared executors
+    client = TestClient(main.app)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert client.get('/files').status_code == 401
+        response = client.post('/login', json={'username': 'user', 'password': 'x', 'totp_code': '0'})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    # Blocking backends are only ever called from the rate limit executor
+    assert backend.threads and all(name.startswith('rate-limit') for name in backend.threads)
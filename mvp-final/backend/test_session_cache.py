@@ -0,0 +1,70 @@
+import contextlib
+import io
+
+import pyotp
+from fastapi.testclient import TestClient
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import database
+    import main
+    import security_monitor_v2
+
+USER = {'username': 'user', 'password': 'user123', 'totp_secret': 'JBSWY3DPEHPK3PXQ'}
+
+
+def login(client, user):
+    response = client.post('/login', json={
+        'username': user['username'],
+        'password': user['password'],
+        'totp_code': pyotp.TOTP(user['totp_secret']).now()
+    })
+    assert response.status_code == 200, response.text
+    return {'Authorization': f"Bearer {response.json()['token']}"}
+
+
+def test_monitor_lockout_revokes_cached_session():
+    # Not used as a context manager: shutdown would stop the shared executors
+    client = TestClient(main.app)
+    headers = login(client, USER)
+    assert client.get('/files', headers=headers).status_code == 200
+    hits = database.session_cache.stats()['hits']
+    assert client.get('/files', headers=headers).status_code == 200
+    assert database.session_cache.stats()['hits'] > hits
+
+    # The standalone monitor resets credentials over its own connection
+    security_monitor_v2.reset_user_credentials(USER['username'])
+
+    assert client.get('/files', headers=headers).status_code == 401
+
+
+def test_lookup_racing_an_invalidation_is_not_cached():
+    cache = database.SessionCache()
+    user = {'id': 1, 'username': 'someone', 'role': 'standard'}
+    generation = cache.generation()
+    cache.invalidate_user('someone')
+    cache.put('token', user, generation)
+    assert cache.get('token') is None
+
+    cache.put('token', user, cache.generation())
+    assert cache.get('token') == user
+
+
+def test_login_after_credential_reset_is_a_counted_failure():
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.create_user('reset-test', 'reset123', 'file_manager', USER['totp_secret'])
+        security_monitor_v2.reset_user_credentials('reset-test')
+
+    client = TestClient(main.app)
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = client.post('/login', json={
+            'username': 'reset-test',
+            'password': 'reset123',
+            'totp_code': pyotp.TOTP(USER['totp_secret']).now()
+        })
+
+    assert response.status_code == 401
+    with database.get_connection() as conn:
+        attempts = conn.execute(
+            "SELECT failed_login_attempts FROM users WHERE username = 'reset-test'"
+        ).fetchone()[0]
+    assert attempts == 1
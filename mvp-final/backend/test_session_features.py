@@ -0,0 +1,116 @@
+import contextlib
+import io
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import security_monitor_v2 as monitor
+
+ACTIONS = [
+    'login_success', 'login_failed', 'file_download', 'file_upload', 'logs_retrieved',
+    'logs_access_denied', 'view_operation', 'list_operations', 'list_agents', 'logout'
+]
+# Gaps in seconds, chosen around the rapid (<1 s), file (<5 s) and burst (<10 s) thresholds
+GAPS = [0.2, 0.7, 1.5, 3, 6, 12, 45, 600]
+
+
+def reference_session_features(session):
+    """
+    The original one-DataFrame-per-session implementation, kept as the
+    reference the vectorized versions are checked against.
+    """
+    df = pd.DataFrame(session)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    time_diffs = df['timestamp'].diff().dropna()
+    action_counts = df['action'].value_counts()
+
+    failed_logins = sum(df['action'] == 'login_failed')
+    successful_logins = sum(df['action'] == 'login_success')
+    failed_then_success = sum(
+        (df['action'] == 'login_failed') &
+        (df['action'].shift(-1) == 'login_success')
+    )
+
+    file_accesses = df[df['action'].str.contains('file', na=False)]
+    file_access_times = pd.to_datetime(file_accesses['timestamp'])
+    file_time_diffs = file_access_times.diff().dropna()
+    rapid_file_accesses = sum(file_time_diffs.dt.total_seconds() < 5)
+    if len(file_time_diffs) > 1:
+        file_download_burst = any(td < pd.Timedelta(seconds=10) for td in file_time_diffs)
+    else:
+        file_download_burst = False
+
+    return {
+        'mean_time_between_actions': time_diffs.mean().total_seconds(),
+        'std_time_between_actions': time_diffs.std().total_seconds() if len(time_diffs) > 1 else 0,
+        'total_duration': df['session_duration'].sum(),
+        'mean_duration': df['session_duration'].mean(),
+        'std_duration': df['session_duration'].std(),
+        'unique_actions': len(action_counts),
+        'login_count': successful_logins,
+        'failed_login_count': failed_logins,
+        'failed_then_success': failed_then_success,
+        'file_access_count': sum(df['action'].str.contains('file')),
+        'rapid_file_accesses': rapid_file_accesses,
+        'file_download_burst': int(file_download_burst),
+        'logs_access_count': sum(df['action'].str.contains('logs')),
+        'operation_access_count': sum(df['action'].str.contains('operation')),
+        'hour_of_day': df['timestamp'].iloc[0].hour,
+        'is_business_hours': 1 if 9 <= df['timestamp'].iloc[0].hour <= 17 else 0,
+        'rapid_actions': sum(time_diffs.dt.total_seconds() < 1),
+        'suspicious_sequences': sum(
+            (df['action'] == 'logs_retrieved') &
+            (df['action'].shift(-1) == 'logs_retrieved')
+        ),
+        'failed_login_ratio': failed_logins / (successful_logins + failed_logins) if (successful_logins + failed_logins) > 0 else 0,
+        'file_access_frequency': len(file_accesses) / len(df) if len(df) > 0 else 0
+    }
+
+
+def random_sessions(count, events=(1, 15), seed=0):
+    """Sessions of random audit events, including single-event ones and missing durations."""
+    rng = random.Random(seed)
+    sessions = []
+    for _ in range(count):
+        timestamp = datetime(2025, 1, 1) + timedelta(seconds=rng.randrange(7 * 86400))
+        session = []
+        for _ in range(rng.randint(*events)):
+            session.append({
+                'timestamp': timestamp.isoformat(sep=' ', timespec='microseconds'),
+                'action': rng.choice(ACTIONS),
+                'session_duration': None if rng.random() < 0.2 else rng.randint(1, 600)
+            })
+            timestamp += timedelta(seconds=rng.choice(GAPS))
+        sessions.append(session)
+    return sessions
+
+
+def assert_features_match(actual, expected):
+    for column in monitor.FEATURE_COLUMNS:
+        # Gap means and stds may differ by under a microsecond, which pandas
+        # rounds its Timedelta results to
+        np.testing.assert_allclose(
+            float(actual[column]), float(expected[column]), rtol=0, atol=1e-5, equal_nan=True,
+            err_msg=column
+        )
+
+
+def test_batch_features_match_reference():
+    sessions = random_sessions(300)
+    batch = monitor.extract_batch_features(monitor.sessions_to_frame(sessions))
+    assert list(batch.columns) == monitor.FEATURE_COLUMNS
+    assert len(batch) == len(sessions)
+    for i, session in enumerate(sessions):
+        assert_features_match(batch.loc[i], reference_session_features(session))
+
+
+def test_accumulator_matches_reference():
+    for session in random_sessions(300, seed=1):
+        accumulator = monitor.SessionAccumulator()
+        for event in session:
+            accumulator.add(event)
+        assert len(accumulator) == len(session)
+        assert_features_match(accumulator.features(), reference_session_features(session))
@@ -11,15 +11,28 @@ detector = InsiderThreatDetector()
 analytics = RealTimeAnalytics(detector)
 demo = DemoScenarios(analytics)
 
+# One baseline per role in the training data, trained in parallel; each
+# role's model is loaded the first time activity for that role is scored
+ROLE_MODEL_DIR = "role_models"
+DEFAULT_ROLE = "analyst"
+
 training_data = generate_user_data()
-detector.train_role_baseline("analyst", training_data)
+detector.train_all_roles(training_data, model_dir=ROLE_MODEL_DIR)
 
 @app.route('/analyze_activity', methods = ['POST'])
 def analyze_activity():
     '''endpoint for real-time activity analysis'''
     activity_log = request.json
     activity_df = pd.DataFrame(activity_log)
-    result = detector.detect_anomaly(activity_df, role_name = "analyst")
+    # Events without a role are scored against the default one
+    activity_df['role'] = activity_df['role'].fillna(DEFAULT_ROLE) if 'role' in activity_df else DEFAULT_ROLE
+
+    result = {}
+    try:
+        for role_name, role_activity in activity_df.groupby('role', sort=False):
+            result.update(detector.detect_anomaly(role_activity, role_name = role_name))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(result)
 
 @app.route('/demo/threat', methods = ['GET'])
@@ -29,7 +42,7 @@ def demo_threat():
     demo_user_data.loc[0, 'session_duration'] = 10
     demo_user_data.loc[0, 'files_accessed'] = 25
     demo_user_data.loc[0, 'timestamp'] = demo_user_data.loc[0, 'timestamp'].replace(hour=23)
-    results = detector.detect_anomaly(demo_user_data.head(1), role_name = "analyst")
+    results = detector.detect_anomaly(demo_user_data.head(1), role_name = DEFAULT_ROLE)
 
     return jsonify({'scenario': 'insider_threat', 'results': results})
 
@@ -0,0 +1,86 @@
+"""
+Scaling benchmark for InsiderThreatDetector.extract_features.
+
+Generates users x events rows of shuffled analyst activity with the
+backend's synthetic_data generator and times extract_features on it. Up to
+OLD_LOOP_MAX_USERS users the old one-filter-per-user loop is timed too and
+its output compared; beyond that it grows quadratically and is skipped.
+
+    python bench_extract_features.py [events] [users ...]
+
+Defaults to 100 events for 1,000, 10,000 and 100,000 users (10M rows,
+about 1.3 GB peak memory at the largest size).
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from dual_layer_profiling import InsiderThreatDetector
+from user_data_generation import synthetic_data
+
+OLD_LOOP_MAX_USERS = 2000
+
+
+def per_user_features(user_data):
+    """The old extract_features: filter the frame and parse timestamps once per user."""
+    features = []
+    user_ids = []
+    for user in user_data['user'].unique():
+        user_df = user_data[user_data['user'] == user]
+        avg_session_time = user_df['session_duration'].mean()
+        files_per_session = user_df['files_accessed'].mean()
+        login_frequency = len(user_df[user_df['action'] == 'login'])
+        hours = pd.to_datetime(user_df['timestamp']).dt.hour
+        work_hour_ratio = len(hours[(hours >= 9) & (hours <= 17)]) / len(hours)
+        features.append([avg_session_time, files_per_session, login_frequency, work_hour_ratio])
+        user_ids.append(user)
+    return np.array(features), user_ids
+
+
+def activity(users, events):
+    """users x events rows of analyst activity across the whole day, shuffled."""
+    actions = {'login': 0.2, 'read': 0.8}
+    pattern = {
+        'role': 'analyst',
+        'users': [f"user_{i:06d}" for i in range(users)],
+        'hour_range': (0, 24),
+        'events_per_session': events,
+        'start': actions,
+        'transitions': {'login': actions, 'read': actions},
+        'columns': {
+            'session_duration': {'dist': 'normal', 'mean': 45, 'std': 15, 'per_event': True},
+            'files_accessed': {'dist': 'poisson', 'lam': 3, 'per_event': True},
+        }
+    }
+    data = synthetic_data.generate([pattern], seed=0)
+    data['user'] = data['user'].astype(str)
+    data['action'] = data['action'].astype(str)
+    return data.sample(frac=1, random_state=0)
+
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    sizes = [int(n) for n in sys.argv[2:]] or [1000, 10000, 100000]
+
+    print(f"{'users':>8} {'rows':>10} {'old loop':>10} {'groupby':>9}")
+    for users in sizes:
+        data = activity(users, events)
+
+        start = time.perf_counter()
+        features, user_ids = InsiderThreatDetector().extract_features(data)
+        new = time.perf_counter() - start
+
+        old = "-"
+        if users <= OLD_LOOP_MAX_USERS:
+            start = time.perf_counter()
+            expected, expected_ids = per_user_features(data)
+            old = f"{time.perf_counter() - start:.1f} s"
+            assert list(user_ids) == list(expected_ids) and np.allclose(features, expected)
+
+        print(f"{users:8d} {len(data):10d} {old:>10} {new:7.2f} s", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,30 +4,88 @@ from sklearn.model_selection import ParameterGrid
 
 import pandas as pd
 import numpy as np
+import os
+import tempfile
+import time
+import joblib
+from joblib import Parallel, delayed
+
+
+def _fit_candidate_group(features_scaled, candidates):
+    '''fits the first of (grid index, params) candidates that differ only in contamination, and scores all of them'''
+    fitted_index, params = candidates[0]
+    model = IsolationForest(random_state=42, **params)
+    model.fit(features_scaled)
+
+    # decision_function is score_samples minus offset_, and only offset_
+    # depends on contamination (computed here the way IsolationForest.fit does)
+    samples = model.score_samples(features_scaled)
+    scores = []
+    for index, params in candidates:
+        contamination = params.get('contamination', 'auto')
+        offset = -0.5 if contamination == 'auto' else np.percentile(samples, 100.0 * contamination)
+        scores.append((index, params, (samples - offset).mean()))
+    return scores, fitted_index, model
+
+
+def _train_role(role_name, role_data, path):
+    '''trains one role's baseline (as train_role_baseline does) in a worker and stores it at path'''
+    detector = InsiderThreatDetector()
+    detector.train_role_baseline(role_name, role_data)
+    artifact = {'model': detector.role_models[role_name], 'scaler': detector.role_scalers[role_name]}
+
+    # Written to a temp file and renamed, so a reader never sees a partial model
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.role-')
+    os.close(fd)
+    try:
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return role_name, path
+
 
 class InsiderThreatDetector:
     def __init__(self):
          self.role_models = {}
          self.role_scalers = {}
+         self.role_paths = {}    # stored models not loaded yet, see _role_model
+
+    def _role_model(self, role_name):
+        '''model and scaler for a role, loaded from its stored file on first use'''
+        if role_name not in self.role_models:
+            # Detectors pickled before role_paths existed don't have it
+            path = getattr(self, 'role_paths', {}).get(role_name)
+            if path is None:
+                raise ValueError(f"No trained model found for role '{role_name}'")
+            artifact = joblib.load(path, mmap_mode='r')
+            self.role_models[role_name] = artifact['model']
+            self.role_scalers[role_name] = artifact['scaler']
+        return self.role_models[role_name], self.role_scalers[role_name]
         
     def extract_features(self, user_data):
-        features = []
-        user_ids = []
-        
-        for user in user_data['user'].unique():
-            user_df = user_data[user_data['user']==user]
-            
-            avg_session_time = user_df['session_duration'].mean()
-            files_per_session = user_df['files_accessed'].mean()
-            login_frequency = len(user_df[user_df['action']=='login'])
-            
-            hours = pd.to_datetime(user_df['timestamp']).dt.hour
-            work_hour_ratio = len(hours[(hours>=9) & (hours<=17)])/len(hours)
-            
-            features.append([avg_session_time, files_per_session, login_frequency, work_hour_ratio])
-            user_ids.append(user)
-            
-        return np.array(features), user_ids
+        '''one row of [avg_session_time, files_per_session, login_frequency, work_hour_ratio] per user, in order of first appearance'''
+
+        # Timestamps are parsed once for all users, and every feature is a
+        # per-user mean or sum computed in a single groupby pass
+        hours = pd.to_datetime(user_data['timestamp']).dt.hour
+        columns = pd.DataFrame({
+            'user': user_data['user'].to_numpy(),
+            'session_duration': user_data['session_duration'].to_numpy(),
+            'files_accessed': user_data['files_accessed'].to_numpy(),
+            'login': (user_data['action'] == 'login').to_numpy(),
+            'work_hour': ((hours >= 9) & (hours <= 17)).to_numpy(),
+        })
+        per_user = columns.groupby('user', sort=False, observed=True).agg(
+            avg_session_time=('session_duration', 'mean'),
+            files_per_session=('files_accessed', 'mean'),
+            login_frequency=('login', 'sum'),
+            work_hour_ratio=('work_hour', 'mean'),
+        )
+
+        return per_user.to_numpy(dtype=float), per_user.index.tolist()
 
     def train_role_baseline(self, role_name, role_data, contamination=0.1):
         features, _ = self.extract_features(role_data)
@@ -42,10 +100,47 @@ class InsiderThreatDetector:
         
         return model
 
-    def fine_tune_role_model(self, role_name, new_data, param_grid=None):
-        '''fine tunes the existing model by retraining it with updated parameters or data'''
+    def train_all_roles(self, data, model_dir="role_models", n_jobs=-1):
+        '''trains a baseline for every role in data['role'], each in its own worker process
 
-        if role_name not in self.role_models:
+        each role's model is stored in model_dir and only loaded when that role is first
+        scored, so memory grows with the roles actually in use rather than all of them'''
+
+        os.makedirs(model_dir, exist_ok=True)
+        trained = Parallel(n_jobs=n_jobs)(
+            delayed(_train_role)(role_name, role_data, os.path.join(model_dir, f"{role_name}.joblib"))
+            for role_name, role_data in data.groupby('role', sort=False, observed=True)
+        )
+        for role_name, path in trained:
+            # Retrained roles are reloaded from their new file on next use
+            self.role_models.pop(role_name, None)
+            self.role_scalers.pop(role_name, None)
+            self.role_paths[role_name] = path
+
+        return [role_name for role_name, _ in trained]
+
+    def load_roles(self, model_dir="role_models"):
+        '''registers the role models stored in model_dir by train_all_roles, without loading them'''
+        if not os.path.isdir(model_dir):
+            return []
+        roles = []
+        for name in sorted(os.listdir(model_dir)):
+            if name.endswith('.joblib'):
+                role_name = name[:-len('.joblib')]
+                self.role_paths[role_name] = os.path.join(model_dir, name)
+                roles.append(role_name)
+        return roles
+
+    def fine_tune_role_model(self, role_name, new_data, param_grid=None, n_jobs=-1, time_budget=None):
+        '''fine tunes the existing model by retraining it with updated parameters or data
+
+        candidates are fitted in parallel worker processes (n_jobs, -1 for every core);
+        with time_budget (seconds) set, the search stops once it is spent and returns the
+        best candidate scored so far. without a budget the result is the same as fitting
+        every candidate in grid order.'''
+
+        # Only check the role is known; the stored model itself is never used here
+        if role_name not in self.role_models and role_name not in getattr(self, 'role_paths', {}):
             raise ValueError(f"No trained model found for role '{role_name}'")
 
         features_old, _ = self.extract_features(new_data)
@@ -59,19 +154,36 @@ class InsiderThreatDetector:
                 'max_samples': ['auto', 256, 512]
             }
 
+        # Candidates that differ only in contamination grow the same trees, so
+        # each group is fitted once and the rest of it scored from that fit
+        groups = {}
+        for index, params in enumerate(ParameterGrid(param_grid)):
+            forest_params = tuple(sorted((k, v) for k, v in params.items() if k != 'contamination'))
+            groups.setdefault(forest_params, []).append((index, params))
+
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        results = Parallel(n_jobs=n_jobs, return_as='generator_unordered')(
+            delayed(_fit_candidate_group)(features_scaled, candidates) for candidates in groups.values()
+        )
+
         best_model = None
-        best_score = -np.inf
+        best_key = None     # (score, -grid index): ties go to the earliest candidate, as in grid order
         best_params = None
+        for scores, fitted_index, model in results:
+            for index, params, avg_score in scores:
+                if best_key is None or (avg_score, -index) > best_key:
+                    best_key = (avg_score, -index)
+                    best_params = params
+                    # Dominated candidates' models are dropped as soon as they arrive
+                    best_model = model if index == fitted_index else None
+            if deadline is not None and time.monotonic() > deadline:
+                results.close()
+                break
 
-        for params in ParameterGrid(param_grid):
-            model = IsolationForest(random_state=42, **params)
-            model.fit(features_scaled)
-
-            avg_score = model.decision_function(features_scaled).mean()
-            if avg_score > best_score:
-                best_score = avg_score
-                best_model = model
-                best_params = params
+        if best_model is None:
+            # The winner shared its trees with a candidate of another contamination
+            best_model = IsolationForest(random_state=42, **best_params)
+            best_model.fit(features_scaled)
 
         self.role_models[role_name] = best_model
         self.role_scalers[role_name] = scaler
@@ -80,12 +192,15 @@ class InsiderThreatDetector:
 
     def detect_anomaly(self, user_activity, role_name):
         
-        if role_name not in self.role_models:
-            raise ValueError(f"No trained model found for role '{role_name}'")
+        self._role_model(role_name)
         
         features, user_ids = self.extract_features(user_activity)
-        scaler = self.role_scalers[role_name]
-        model = self.role_models[role_name]
+        return self.score_features(features, user_ids, role_name)
+
+    def score_features(self, features, user_ids, role_name):
+        '''scores precomputed feature rows (as extract_features returns them) against a role model'''
+
+        model, scaler = self._role_model(role_name)
         
         features_scaled = scaler.transform(features)
         predictions = model.predict(features_scaled)
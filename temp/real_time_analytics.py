@@ -1,4 +1,5 @@
 import json
+from collections import deque
 import numpy as np
 import pandas as pd
 import joblib
@@ -7,6 +8,42 @@ from dual_layer_profiling import InsiderThreatDetector
 from user_data_generation import generate_user_data
 
 
+class RollingActivityStats:
+    """
+    Running sums over a user's last `window` events, giving the same four
+    features InsiderThreatDetector.extract_features computes from them.
+    Each event is added (and the oldest one dropped) in constant time.
+    """
+
+    def __init__(self, window=10):
+        self.recent = deque(maxlen=window)
+        self.events_seen = 0
+        self.duration_sum = 0.0
+        self.files_sum = 0.0
+        self.login_count = 0
+        self.work_hour_count = 0
+
+    def _totals(self, event, sign):
+        duration, files, is_login, is_work_hour = event
+        self.duration_sum += sign * duration
+        self.files_sum += sign * files
+        self.login_count += sign * is_login
+        self.work_hour_count += sign * is_work_hour
+
+    def add(self, timestamp, action, duration, files):
+        hour = pd.Timestamp(timestamp).hour
+        event = (duration, files, int(action == 'login'), int(9 <= hour <= 17))
+        if len(self.recent) == self.recent.maxlen:
+            self._totals(self.recent[0], -1)
+        self.recent.append(event)
+        self._totals(event, 1)
+        self.events_seen += 1
+
+    def features(self):
+        n = len(self.recent)
+        return [self.duration_sum / n, self.files_sum / n, self.login_count, self.work_hour_count / n]
+
+
 class RealTimeAnalytics:
     def __init__(self, detector):
         self.detector = detector
@@ -33,40 +70,32 @@ class RealTimeAnalytics:
 
         timestamp = log_entry.get('timestamp', datetime.now())
 
-        # FIX: Initialize as list, not dict
+        # Features over the last 10 events are kept up to date per event
         if user not in self.active_sessions:
-            self.active_sessions[user] = []
+            self.active_sessions[user] = RollingActivityStats(window=10)
 
-        self.active_sessions[user].append({
-            'timestamp': timestamp,
-            'action': action,
-            'session_duration': log_entry.get('duration', 0),
-            'files_accessed': log_entry.get('files', 0)
-        })
+        stats = self.active_sessions[user]
+        stats.add(timestamp, action, log_entry.get('duration', 0), log_entry.get('files', 0))
 
         # check anomalies every 5 events
-        if len(self.active_sessions[user]) % 5 == 0:
+        if stats.events_seen % 5 == 0:
             return self.evaluate_session(user)
 
         # Return last known risk score for non-evaluation events
         last_score = self.last_risk_scores.get(user, 0)
         return {'status': 'monitoring', 'risk_score': float(last_score),
-                'events_until_eval': 5 - (len(self.active_sessions[user]) % 5)}
+                'events_until_eval': 5 - (stats.events_seen % 5)}
 
     def evaluate_session(self, user):
-        # Get recent activity
-        recent_activity = self.active_sessions[user][-10:]
+        stats = self.active_sessions.get(user)
 
         # Check if we have any data
-        if not recent_activity:
+        if stats is None or not stats.recent:
             return {'status': 'error', 'message': 'No activity data available'}
 
-        # Create DataFrame and add 'user' column required by detector
-        activity_df = pd.DataFrame(recent_activity)
-        activity_df['user'] = user
-
-        # detect_anomaly returns a dict like: {user: {"Anomaly_Status": bool, "Scores": float}}
-        results = self.detector.detect_anomaly(activity_df, 'analyst')
+        # Score the running features directly; no DataFrame is rebuilt.
+        # Returns a dict like: {user: {"Anomaly_Status": bool, "Scores": float}}
+        results = self.detector.score_features(np.array([stats.features()]), [user], 'analyst')
 
         # Extract the result for this user
         if user in results:
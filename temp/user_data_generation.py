@@ -1,26 +1,103 @@
-import pandas as pd
-import numpy as np
+import importlib.util
+import os
 from datetime import datetime, timedelta
 
-def generate_user_data():
-    users = ['chew', 'tia', 'bose', 'dk']
-    roles = ['analyst']*4
-    actions = ['login', 'file_access', 'data_query', 'report_generate', 'logout']
-    
-    normal_data = []
-    
-    for i,user in enumerate(users):
-        for day in range(30):
-            daily_actions = np.random.poisson(15)
-            
-            for _ in range(daily_actions):
-                timestamp = datetime.now() - timedelta(days=day) + timedelta(hours = np.random.uniform(8,18))
-                action = np.random.choice(actions, p = [0.1,0.4,0.3,0.1,0.1])
-                normal_data.append({
-                    'user': user, 'role' : roles[i], 'timestamp': timestamp, 'action': action,
-                    'session_duration': np.random.normal(45, 15),  # minutes
-                    'files_accessed': np.random.poisson(3),
-                    'anomaly': False
-                })
+# The shared synthetic data generator lives with the backend; load that file
+# by path instead of putting the whole backend directory on sys.path. Other
+# temp scripts import synthetic_data from here rather than loading it again
+SYNTHETIC_DATA_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'mvp-final', 'backend', 'synthetic_data.py'
+)
+_spec = importlib.util.spec_from_file_location('synthetic_data', SYNTHETIC_DATA_PATH)
+synthetic_data = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(synthetic_data)
 
-    return pd.DataFrame(normal_data)
+# Four analysts, ~15 actions a day each for 30 days, at any time from 8 AM to
+# 6 PM. (The old loop added 8-18 hours to the time the script ran, so outside
+# a midnight run its "work hours" drifted into the evening and night.)
+USER_DATA_DAYS = 30
+USER_DATA_PATTERN = {
+    'role': 'analyst',
+    'users': ['chew', 'tia', 'bose', 'dk'],
+    'days': USER_DATA_DAYS,
+    'hour_range': (8, 18),
+    'events_per_session': {'poisson': 15},
+    # Independent draws: every action has the same next-action distribution
+    'start': {'login': 0.1, 'file_access': 0.4, 'data_query': 0.3, 'report_generate': 0.1, 'logout': 0.1},
+    'transitions': {
+        action: {'login': 0.1, 'file_access': 0.4, 'data_query': 0.3, 'report_generate': 0.1, 'logout': 0.1}
+        for action in ['login', 'file_access', 'data_query', 'report_generate', 'logout']
+    },
+    'columns': {
+        'session_duration': {'dist': 'normal', 'mean': 45, 'std': 15, 'per_event': True},  # minutes
+        'files_accessed': {'dist': 'poisson', 'lam': 3, 'per_event': True},
+    }
+}
+
+# Baseline for the analyst model (see generate_baseline_csv.py): 50 users over
+# 10 days, 1-2 sessions a day in work hours, plus a few early and late logins
+BASELINE_USERS = [f"user_{i:03d}" for i in range(50)]
+BASELINE_DAYS = 10
+BASELINE_SESSION_COLUMNS = {
+    # Normal session duration 25-55 minutes (mean ~40), jittered per activity
+    'session_duration': {'dist': 'normal', 'mean': 40, 'std': 8, 'integer': True,
+                         'clip': (25, 55), 'jitter': 5, 'min': 20},
+    # Normal files accessed 2-10 (mean ~6), jittered per activity
+    'files_accessed': {'dist': 'normal', 'mean': 6, 'std': 2, 'integer': True,
+                       'clip': (2, 10), 'jitter': 2, 'min': 1},
+}
+# Early and late logins per user-day. The old generator appended 5% of the
+# normal rows again at 8 AM and another 5% at 6 PM, i.e. 5% of 1.3 sessions
+# of 5.5 events on average per user-day
+BASELINE_EDGE_RATE = 0.05 * 1.3 * 5.5
+BASELINE_EDGE_COLUMNS = {
+    'session_duration': {'dist': 'normal', 'mean': 40, 'std': 8, 'integer': True},
+    'files_accessed': {'dist': 'normal', 'mean': 6, 'std': 2, 'integer': True},
+}
+BASELINE_PATTERNS = [
+    {
+        'role': 'analyst',
+        'users': BASELINE_USERS,
+        'days': BASELINE_DAYS,
+        'sessions_per_day': ([1, 2], [0.7, 0.3]),
+        'hour_range': (9, 17),
+        'events_per_session': (3, 9),
+        'event_interval': 300,
+        'start': {'login': 1.0},
+        'transitions': {
+            action: {'read': 0.4, 'edit': 0.3, 'open': 0.2, 'download': 0.1}
+            for action in ['login', 'read', 'edit', 'open', 'download']
+        },
+        'end': 'logout',
+        'columns': BASELINE_SESSION_COLUMNS,
+    },
+    # Edge cases within normal behavior: early birds at 8 AM, late workers at 6 PM
+    {
+        'role': 'analyst',
+        'users': BASELINE_USERS,
+        'days': BASELINE_DAYS,
+        'sessions_per_day': ([0, 1], [1 - BASELINE_EDGE_RATE, BASELINE_EDGE_RATE]),
+        'hour_range': (8, 9),
+        'sequence': ['login'],
+        'event_interval': 0,
+        'columns': BASELINE_EDGE_COLUMNS,
+    },
+    {
+        'role': 'analyst',
+        'users': BASELINE_USERS,
+        'days': BASELINE_DAYS,
+        'sessions_per_day': ([0, 1], [1 - BASELINE_EDGE_RATE, BASELINE_EDGE_RATE]),
+        'hour_range': (18, 19),
+        'sequence': ['login'],
+        'event_interval': 0,
+        'columns': BASELINE_EDGE_COLUMNS,
+    },
+]
+BASELINE_COLUMNS = ['user', 'role', 'timestamp', 'session_duration', 'files_accessed', 'action']
+
+
+def generate_user_data(seed=None):
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=USER_DATA_DAYS - 1)
+    data = synthetic_data.generate([USER_DATA_PATTERN], seed=seed, start=start)
+    data['anomaly'] = False
+    return data[['user', 'role', 'timestamp', 'action', 'session_duration', 'files_accessed', 'anomaly']]